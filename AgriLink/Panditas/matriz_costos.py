@@ -0,0 +1,107 @@
+import json
+import os
+import sys
+import time
+
+import networkx as nx
+import numpy as np
+
+# =========================================================================
+# Matriz de costos Asociación x Mercado (etapa de panda.py o script suelto)
+# =========================================================================
+# Toda ruta Asociación -> Producto -> Capital ... Capital -> Mercado pasa por la
+# red troncal, así que basta un Dijkstra por Capital (no uno por par) para
+# conocer el transporte de cualquier Asociación a cualquier Mercado:
+#
+#   transporte[a, m] = troncal[capital(a), capital(m)] + peso(capital(m), m)
+#
+# El precio del producto no se guarda en la matriz porque depende del descuento
+# vigente: el backend lo suma al consultar. Archivos generados:
+#   Matriz_Costos.npz                  matriz float32 comprimida (inf = sin ruta)
+#   Matriz_Costos_asociaciones.tsv     fila -> asociación, producto, modo
+#   Matriz_Costos_mercados.txt         columna -> mercado
+#   Matriz_Costos_meta.json            forma, sha1 del GraphML de origen, fecha
+# modo "descuento": la arista legítima Producto -> Capital(departamento) lleva el
+# precio con descuento; "fijo": la asociación no tiene departamento y la celda ya
+# incluye el precio de adquisición más barato (sin descuento).
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PREFIJO = "Matriz_Costos"
+
+# La huella del GraphML la calcula el mismo código que usa el backend para validar la matriz
+sys.path.append(os.path.join(SCRIPT_DIR, "..", "backend"))
+from huella_archivo import sha1_archivo  # noqa: E402
+
+
+def calcular_matriz_costos(G):
+    """Devuelve (transporte float32 [asociaciones x mercados], filas, mercados)."""
+    capitales = sorted(str(n) for n, data in G.nodes(data=True) if data.get('tipo') == 'Capital')
+    indice_capital = {c: i for i, c in enumerate(capitales)}
+    troncal = G.subgraph(capitales)
+
+    # 1. Un Dijkstra por capital sobre la red troncal
+    distancias = np.full((len(capitales), len(capitales)), np.inf)
+    for c in capitales:
+        for destino, d in nx.single_source_dijkstra_path_length(troncal, c, weight='peso').items():
+            distancias[indice_capital[c], indice_capital[destino]] = d
+
+    # 2. Capital de distribución de cada mercado (la más barata si hubiera varias)
+    mercados = sorted(str(n) for n, data in G.nodes(data=True) if data.get('tipo') == 'Mercado')
+    hasta_mercado = np.full((len(capitales), len(mercados)), np.inf)
+    for j, m in enumerate(mercados):
+        for c in G.predecessors(m):
+            if c in indice_capital:
+                hasta_mercado[indice_capital[c], j] = G[c][m].get('peso', 0)
+    # costo_capital[c, m]: de la capital c al mercado m
+    costo_capital = np.min(distancias[:, :, None] + hasta_mercado[None, :, :], axis=1)
+
+    # 3. Filas: cada asociación hereda la fila de su capital legítima
+    asociaciones = sorted(str(n) for n, data in G.nodes(data=True) if data.get('tipo') == 'Asociacion')
+    transporte = np.full((len(asociaciones), len(mercados)), np.inf, dtype=np.float32)
+    filas = []
+    for i, a in enumerate(asociaciones):
+        producto = next((v for v in G.successors(a) if G.nodes[v].get('tipo') == 'Producto'), None)
+        capital = G.nodes[a].get('departamento')
+        if producto is None:
+            filas.append((a, "", "sin_producto"))
+        elif capital is None:
+            # El grafo de consulta no se modifica: vale cualquier capital con su precio original
+            for c in G.successors(producto):
+                if c in indice_capital:
+                    transporte[i] = np.minimum(transporte[i], G[producto][c].get('peso', 0) + costo_capital[indice_capital[c]])
+            filas.append((a, producto, "fijo"))
+        elif capital in indice_capital and G.has_edge(producto, capital):
+            transporte[i] = costo_capital[indice_capital[capital]]
+            filas.append((a, producto, "descuento"))
+        else:
+            filas.append((a, producto, "sin_capital"))
+    return transporte, filas, mercados
+
+
+def guardar_matriz_costos(G, carpeta, ruta_graphml=None):
+    inicio = time.perf_counter()
+    transporte, filas, mercados = calcular_matriz_costos(G)
+    np.savez_compressed(os.path.join(carpeta, f"{PREFIJO}.npz"), transporte=transporte)
+    with open(os.path.join(carpeta, f"{PREFIJO}_asociaciones.tsv"), "w", encoding="utf-8") as f:
+        for fila in filas:
+            f.write("\t".join(fila) + "\n")
+    with open(os.path.join(carpeta, f"{PREFIJO}_mercados.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(mercados) + "\n")
+    meta = {
+        "forma": list(transporte.shape),
+        "tipo": str(transporte.dtype),
+        "graphml_sha1": sha1_archivo(ruta_graphml) if ruta_graphml else None,
+        "creado": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "pares_con_ruta": int(np.isfinite(transporte).sum()),
+    }
+    with open(os.path.join(carpeta, f"{PREFIJO}_meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    print(f"Matriz de costos {transporte.shape[0]} x {transporte.shape[1]} guardada en {carpeta} "
+          f"({meta['pares_con_ruta']} pares con ruta, {time.perf_counter() - inicio:.1f} s)")
+    return meta
+
+
+if __name__ == "__main__":
+    carpeta = os.path.join(SCRIPT_DIR, "Proyecto_Grafo_Archivos")
+    ruta = sys.argv[1] if len(sys.argv) > 1 else os.path.join(carpeta, "Grafo_Proyecto_Actualizado.graphml")
+    guardar_matriz_costos(nx.read_graphml(ruta), os.path.dirname(os.path.abspath(ruta)), ruta)
@@ -4,6 +4,7 @@ import networkx as nx
 import matplotlib.pyplot as plt
 from matplotlib.lines import Line2D
 import random # Necesario para la asignación aleatoria
+from matriz_costos import guardar_matriz_costos
 
 # Obtener la carpeta donde está este script - ESTO ARREGLA TODOS LOS PROBLEMAS
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -280,6 +281,10 @@ metrics_df.to_excel(metrics_path, index=False)
 graph_path = os.path.join(output_folder, "Grafo_Proyecto_Actualizado.graphml")
 nx.write_graphml(G, graph_path)
 
+# 11.1 Matriz de costos Asociación x Mercado (un Dijkstra por capital; ver matriz_costos.py).
+# Se calcula sobre el GraphML recién escrito para usar exactamente el grafo que carga el backend.
+guardar_matriz_costos(nx.read_graphml(graph_path), output_folder, graph_path)
+
 # 12. Crear informe en archivo .txt con referencia a Dijkstra y resumen de métricas
 report_path = os.path.join(output_folder, "Informe_Grafo_Proyecto.txt")
 with open(report_path, "w", encoding="utf-8") as f:
@@ -1,11 +1,52 @@
+import threading
+import uuid
 from datetime import datetime, timedelta
+import config
+from agrupador_escrituras import AgrupadorEscrituras
+from repositorio import Contadores, Tabla
+from repositorio_sqlite import BaseSQLite, ContadoresSQLite, TablaSQLite
+
+# Estados de pedido que no cuentan como venta (no suman ingresos ni unidades vendidas)
+ESTADOS_SIN_VENTA = {"cancelado"}
+ESTADOS_PEDIDO = ("pendiente", "completado", "cancelado")
 
 class AgricultorService:
-    def __init__(self):
-        self.agricultores = self._inicializar_agricultores()
-        self.productos = self._inicializar_productos()
-        self.pedidos = self._inicializar_pedidos()
-        self.resenas = self._inicializar_resenas()
+    def __init__(self, backend: str = config.BACKEND_DATOS, ruta_sqlite: str = config.RUTA_SQLITE):
+        # Backend de persistencia: tablas en memoria del proceso o SQLite compartido
+        if backend == "sqlite":
+            self.base = BaseSQLite(ruta_sqlite)
+            crear_tabla = lambda nombre, indices=(): TablaSQLite(self.base, nombre, indices)
+            crear_contadores = lambda nombre: ContadoresSQLite(self.base, nombre)
+        elif backend == "memoria":
+            self.base = None
+            crear_tabla = Tabla
+            crear_contadores = Contadores
+        else:
+            raise ValueError(f"Backend de datos desconocido: {backend!r} (use 'memoria' o 'sqlite')")
+        self.backend = backend
+        # En memoria, las escrituras que tocan varias tablas (fila + resumen) se serializan aquí
+        self._lock_memoria = threading.RLock()
+
+        # Tablas indexadas: clave primaria + índices secundarios por los campos de consulta
+        self.agricultores = crear_tabla("agricultores")
+        self.productos = crear_tabla("productos", indices=("agricultor_id", "categoria", "activo"))
+        self.pedidos = crear_tabla("pedidos", indices=("agricultor_id", "estado", ("agricultor_id", "estado"),
+                                                       "clave_idempotencia"))
+        self.resenas = crear_tabla("resenas", indices=("agricultor_id",))
+
+        # Los datos de ejemplo solo se cargan si la tabla está vacía (una sola vez con SQLite)
+        self.agricultores.sembrar(self._inicializar_agricultores())
+        self.productos.sembrar(self._inicializar_productos())
+        self.pedidos.sembrar(self._inicializar_pedidos())
+        self.resenas.sembrar(self._inicializar_resenas())
+
+        # Agregados del panel por agricultor: se recorren los pedidos/reseñas una sola
+        # vez al crear la tabla y desde entonces solo se actualizan con incrementos
+        self.resumenes = crear_contadores("resumen_agricultor")
+        self.resumenes.sembrar(self._agregados_iniciales)
+
+        # Ingreso de pedidos: los que llegan a la vez se confirman juntos (group commit)
+        self._ingreso_pedidos = AgrupadorEscrituras("pedidos", self._registrar_pedidos)
     
     def _inicializar_agricultores(self):
         return [
@@ -75,43 +116,270 @@ class AgricultorService:
     
     # OPERACIONES CRUD PURAS
     def obtener_agricultores(self):
-        return self.agricultores
+        return self.agricultores.todos()
     
     def obtener_agricultor(self, agricultor_id: int):
-        #QuickFind:
-        if not hasattr(self, '_agricultores_uf'):
-            # Inicializar QuickFind una sola vez
-            self._agricultores_uf = {}
-            for agricultor in self.agricultores:
-                self._agricultores_uf[agricultor['id']] = agricultor
+        return self.agricultores.obtener(agricultor_id)
     
-        return self._agricultores_uf.get(agricultor_id)
+    def crear_agricultor(self, datos: dict):
+        agricultor = {
+            "fecha_registro": datetime.now().strftime("%Y-%m-%d"),
+            "rating": 0.0,
+            **datos,
+            "id": None,  # El id siempre lo asigna la secuencia de la tabla
+        }
+        return self.agricultores.insertar(agricultor)
     
     def actualizar_agricultor(self, agricultor_id: int, datos: dict):
-        agricultor = self.obtener_agricultor(agricultor_id)
-        if agricultor:
-            agricultor.update(datos)
-            return agricultor
-        return None
+        return self.agricultores.actualizar(agricultor_id, datos)
     
-    def obtener_productos(self, agricultor_id: int = None):
-        if agricultor_id:
-            return [p for p in self.productos if p['agricultor_id'] == agricultor_id]
-        return self.productos
+    def obtener_productos(self, agricultor_id: int = None, categoria: str = None, activo: bool = None):
+        return self.productos.buscar(agricultor_id=agricultor_id, categoria=categoria, activo=activo)
     
     def crear_producto(self, datos: dict):
-        nuevo_id = max([p['id'] for p in self.productos]) + 1
-        producto = {"id": nuevo_id, **datos}
-        self.productos.append(producto)
-        return producto
+        return self.productos.insertar({**datos, "id": None})
     
     def obtener_pedidos_agricultor(self, agricultor_id: int, estado: str = None):
-        pedidos = [p for p in self.pedidos if p['agricultor_id'] == agricultor_id]
-        if estado:
-            pedidos = [p for p in pedidos if p['estado'] == estado]
-        return pedidos
+        return self.pedidos.buscar(agricultor_id=agricultor_id, estado=estado)
+    
+    def obtener_pedido_por_clave(self, clave: str):
+        pedidos = self.pedidos.buscar(clave_idempotencia=clave)
+        return pedidos[0] if pedidos else None
     
     def obtener_resenas_agricultor(self, agricultor_id: int):
-        return [r for r in self.resenas if r['agricultor_id'] == agricultor_id]
+        return self.resenas.buscar(agricultor_id=agricultor_id)
+    
+    def _transaccion(self):
+        """Escritura de varias tablas: una transacción en SQLite, una sección crítica en memoria."""
+        return self.base.transaccion() if self.base is not None else self._lock_memoria
+    
+    def crear_resena(self, datos: dict):
+        """La reseña creada, o {"error", "motivo"} (invalido / no_encontrado) sin escribir nada."""
+        rating = datos.get("rating")
+        if isinstance(rating, bool) or not isinstance(rating, (int, float)) or not 1 <= rating <= 5:
+            return {"error": "'rating' debe ser un número entre 1 y 5", "motivo": "invalido"}
+        if self.obtener_agricultor(datos.get("agricultor_id")) is None:
+            return {"error": "Agricultor no encontrado", "motivo": "no_encontrado"}
+        resena = {"fecha": datetime.now().strftime("%Y-%m-%d"), **datos, "id": None}
+        deltas = self._deltas_resena(resena)
+        with self._transaccion():
+            resena = self.resenas.insertar(resena)
+            self.resumenes.incrementar(resena["agricultor_id"], deltas)
+        return resena
+    
+    def crear_pedidos(self, solicitudes: list):
+        """
+        Ingreso de pedidos con reserva de stock. Cada solicitud es
+        {"cliente", "productos": [{"producto_id", "cantidad"}]} y se acepta o se
+        rechaza entera: su stock se descuenta de forma atómica por producto (sin
+        sobreventa con varios hilos o procesos), el precio unitario sale del
+        producto y el total se calcula. Devuelve, en el mismo orden, el pedido
+        creado o {"error", "motivo"} con motivo invalido, no_encontrado o
+        stock_insuficiente.
+
+        Cada pedido lleva una "clave_idempotencia" (la del cliente o una
+        generada aquí): si ya existe un pedido con esa clave se devuelve ese
+        pedido (con "repetido": True) sin reservar de nuevo, así un reintento
+        no duplica. Si el lote no se confirma a tiempo, el resultado de cada
+        pedido es {"motivo": "en_proceso", "clave_idempotencia"}: el lote puede
+        confirmarse igual, y se consulta o reintenta con esa clave.
+        """
+        solicitudes = [{**s, "clave_idempotencia": s.get("clave_idempotencia") or uuid.uuid4().hex}
+                       if isinstance(s, dict) else s for s in solicitudes]
+        try:
+            return self._ingreso_pedidos.enviar(solicitudes)
+        except TimeoutError:
+            return [{"mensaje": "El pedido se está registrando; consulte o reintente con su clave_idempotencia",
+                     "motivo": "en_proceso", "clave_idempotencia": s.get("clave_idempotencia")}
+                    if isinstance(s, dict) else {"error": "Pedido inválido", "motivo": "invalido"}
+                    for s in solicitudes]
+    
+    def _registrar_pedidos(self, solicitudes: list):
+        # Lo ejecuta solo el escritor del agrupador: un lote = una transacción
+        resultados = [self._validar_solicitud(s) for s in solicitudes]
+        validas = [i for i, r in enumerate(resultados) if "error" not in r]
+        with self._transaccion():
+            # Reintentos: una clave ya registrada (o repetida en el lote) no reserva de nuevo
+            por_clave, repetidos, pendientes = {}, [], []
+            for i in validas:
+                clave = resultados[i]["clave_idempotencia"]
+                existente = self.obtener_pedido_por_clave(clave) if clave not in por_clave else None
+                if existente is not None:
+                    resultados[i] = {**existente, "repetido": True}
+                elif clave in por_clave:
+                    repetidos.append((i, por_clave[clave]))
+                else:
+                    por_clave[clave] = i
+                    pendientes.append(i)
+
+            reservas = self.productos.reservar_lote(
+                [resultados[i]["lineas"] for i in pendientes], "stock", {"activo": True})
+            nuevos = []
+            for i, (productos, faltantes) in zip(pendientes, reservas):
+                if faltantes:
+                    resultados[i] = self._rechazo_stock(faltantes, resultados[i]["lineas"])
+                    continue
+                lineas = [{"producto_id": pid, "cantidad": cantidad, "precio_unitario": productos[pid]["precio"]}
+                          for pid, cantidad in resultados[i]["lineas"].items()]
+                nuevos.append((i, {
+                    "cliente": resultados[i]["cliente"],
+                    "agricultor_id": resultados[i]["agricultor_id"],
+                    "productos": lineas,
+                    "estado": "pendiente",
+                    "total": round(sum(l["cantidad"] * l["precio_unitario"] for l in lineas), 2),
+                    "fecha_pedido": datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "clave_idempotencia": resultados[i]["clave_idempotencia"],
+                    "id": None,
+                }))
+            reservadas = [resultados[i]["lineas"] for i, _ in nuevos]
+            try:
+                insertados = self.pedidos.insertar_muchos([pedido for _, pedido in nuevos])
+            except Exception:
+                if self.base is None:
+                    # En memoria no hay rollback: se devuelve el stock ya reservado
+                    self.productos.liberar_lote(reservadas, "stock")
+                raise
+
+            # Un incremento por agricultor con la suma del lote, no uno por pedido
+            deltas_por_agricultor = {}
+            for (i, _), pedido in zip(nuevos, insertados):
+                resultados[i] = pedido
+                deltas = deltas_por_agricultor.setdefault(pedido["agricultor_id"], {})
+                for clave, delta in self._deltas_pedido(pedido, 1).items():
+                    deltas[clave] = deltas.get(clave, 0) + delta
+            for agricultor_id, deltas in deltas_por_agricultor.items():
+                self.resumenes.incrementar(agricultor_id, deltas)
+        for i, primero in repetidos:
+            resultados[i] = resultados[primero] if "error" in resultados[primero] else {**resultados[primero], "repetido": True}
+        return resultados
+    
+    def _validar_solicitud(self, solicitud):
+        if not isinstance(solicitud, dict) or not isinstance(solicitud.get("productos"), list) or not solicitud["productos"]:
+            return {"error": "Cada pedido necesita 'productos': [{\"producto_id\", \"cantidad\"}]", "motivo": "invalido"}
+        clave = solicitud.get("clave_idempotencia")
+        if not isinstance(clave, str) or len(clave) > 128:
+            return {"error": "'clave_idempotencia' debe ser un texto de hasta 128 caracteres", "motivo": "invalido"}
+        lineas = {}
+        for linea in solicitud["productos"]:
+            try:
+                producto_id, cantidad = int(linea["producto_id"]), linea["cantidad"]
+            except (KeyError, TypeError, ValueError):
+                return {"error": "Cada línea necesita 'producto_id' y 'cantidad'", "motivo": "invalido"}
+            if isinstance(cantidad, bool) or not isinstance(cantidad, (int, float)) or cantidad <= 0:
+                return {"error": f"Cantidad inválida para el producto {producto_id}", "motivo": "invalido"}
+            lineas[producto_id] = lineas.get(producto_id, 0) + cantidad
+
+        # Un pedido es de un solo agricultor (el de sus productos). El dueño de un
+        # producto no cambia, así que basta leerlo antes de reservar.
+        agricultores = set()
+        for producto_id in lineas:
+            producto = self.productos.obtener(producto_id)
+            if producto is None:
+                return {"error": f"Producto {producto_id} no encontrado", "motivo": "no_encontrado"}
+            agricultores.add(producto["agricultor_id"])
+        if len(agricultores) > 1:
+            return {"error": "Todos los productos de un pedido deben ser del mismo agricultor", "motivo": "invalido"}
+        agricultor_id = agricultores.pop()
+        if solicitud.get("agricultor_id") not in (None, agricultor_id):
+            return {"error": f"Los productos no son del agricultor {solicitud['agricultor_id']}", "motivo": "invalido"}
+        return {"cliente": solicitud.get("cliente"), "agricultor_id": agricultor_id, "lineas": lineas,
+                "clave_idempotencia": clave}
+    
+    def _rechazo_stock(self, faltantes: dict, lineas: dict):
+        detalle = [{"producto_id": pid, "solicitado": lineas[pid], "disponible": disponible}
+                   for pid, disponible in faltantes.items()]
+        if any(d["disponible"] is None for d in detalle):
+            return {"error": "Producto no disponible (inactivo o inexistente)", "motivo": "no_encontrado",
+                    "faltantes": detalle}
+        return {"error": "Stock insuficiente", "motivo": "stock_insuficiente", "faltantes": detalle}
+    
+    def actualizar_estado_pedido(self, pedido_id: int, estado: str):
+        """
+        El pedido actualizado, None si no existe o {"error", "motivo"}: invalido
+        si el estado no es válido, stock_insuficiente / no_encontrado si un
+        pedido cancelado se reactiva y ya no hay stock para reservarlo.
+        Cancelar devuelve al stock las unidades del pedido y salir de
+        cancelado las reserva de nuevo, en la misma transacción.
+        """
+        if estado not in ESTADOS_PEDIDO:
+            return {"error": f"'estado' debe ser uno de {', '.join(ESTADOS_PEDIDO)}", "motivo": "invalido"}
+        # Leer y escribir en el mismo paso (y en la misma transacción que el resumen
+        # y el stock): con varios hilos, dos cambios de estado simultáneos restarían
+        # el mismo estado anterior y el resumen se desviaría
+        with self._transaccion():
+            actual = self.pedidos.obtener(pedido_id)
+            if actual is None:
+                return None
+            lineas = self._unidades_pedido(actual)
+            if actual["estado"] == "cancelado" and estado != "cancelado" and lineas:
+                _, faltantes = self.productos.reservar_lote([lineas], "stock", {"activo": True})[0]
+                if faltantes:
+                    return self._rechazo_stock(faltantes, lineas)
+            anterior, pedido = self.pedidos.actualizar_con_anterior(pedido_id, {"estado": estado})
+            if anterior["estado"] != "cancelado" and estado == "cancelado" and lineas:
+                self.productos.liberar_lote([lineas], "stock")
+            if anterior["estado"] != estado:
+                # Se resta el pedido con su estado anterior y se suma con el nuevo
+                deltas = self._deltas_pedido(anterior, -1)
+                for clave, delta in self._deltas_pedido(pedido, 1).items():
+                    deltas[clave] = deltas.get(clave, 0) + delta
+                self.resumenes.incrementar(pedido["agricultor_id"], {k: v for k, v in deltas.items() if v})
+        return pedido
+    
+    def _unidades_pedido(self, pedido: dict):
+        """{producto_id: cantidad} de las líneas del pedido."""
+        unidades = {}
+        for linea in pedido.get("productos", []):
+            unidades[linea["producto_id"]] = unidades.get(linea["producto_id"], 0) + linea.get("cantidad", 0)
+        return unidades
+    
+    # AGREGADOS DEL PANEL DEL AGRICULTOR
+    def _deltas_pedido(self, pedido: dict, signo: int):
+        estado = pedido.get("estado")
+        deltas = {"pedidos": signo, f"pedidos:{estado}": signo}
+        if estado not in ESTADOS_SIN_VENTA:
+            deltas["ingresos"] = signo * (pedido.get("total") or 0)
+            for linea in pedido.get("productos", []):
+                clave = f"unidades:{linea['producto_id']}"
+                deltas[clave] = deltas.get(clave, 0) + signo * linea.get("cantidad", 0)
+        return deltas
+    
+    def _deltas_resena(self, resena: dict):
+        return {"resenas": 1, "rating_suma": resena.get("rating") or 0}
+    
+    def _agregados_iniciales(self):
+        agregados = {}
+        for pedido in self.pedidos.todos():
+            grupo = agregados.setdefault(pedido["agricultor_id"], {})
+            for clave, delta in self._deltas_pedido(pedido, 1).items():
+                grupo[clave] = grupo.get(clave, 0) + delta
+        for resena in self.resenas.todos():
+            grupo = agregados.setdefault(resena["agricultor_id"], {})
+            for clave, delta in self._deltas_resena(resena).items():
+                grupo[clave] = grupo.get(clave, 0) + delta
+        return agregados
+    
+    def obtener_resumen_agricultor(self, agricultor_id: int):
+        """Panel del agricultor leído de los agregados (sin recorrer el historial)."""
+        if self.obtener_agricultor(agricultor_id) is None:
+            return None
+        valores = self.resumenes.leer(agricultor_id)
+        total_resenas = int(valores.get("resenas", 0))
+        pedidos_por_estado = {}
+        unidades_por_producto = {}
+        for clave, valor in valores.items():
+            if clave.startswith("pedidos:") and valor:
+                pedidos_por_estado[clave.split(":", 1)[1]] = int(valor)
+            elif clave.startswith("unidades:") and valor:
+                unidades_por_producto[clave.split(":", 1)[1]] = int(valor) if float(valor).is_integer() else valor
+        return {
+            "agricultor_id": agricultor_id,
+            "rating_promedio": round(valores["rating_suma"] / total_resenas, 2) if total_resenas else None,
+            "total_resenas": total_resenas,
+            "total_pedidos": int(valores.get("pedidos", 0)),
+            "pedidos_por_estado": pedidos_por_estado,
+            "ingresos_totales": round(valores.get("ingresos", 0), 2),
+            "unidades_vendidas_por_producto": unidades_por_producto,
+        }
 
 agricultor_service = AgricultorService()
\ No newline at end of file
@@ -0,0 +1,79 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+from instrumentacion import metricas
+
+
+class AgrupadorEscrituras:
+    """
+    "Group commit": los hilos que escriben a la vez no abren cada uno su
+    transacción; dejan sus elementos en una cola y esperan. Un único hilo
+    escritor toma todo lo acumulado (hasta `max_lote`), lo aplica con una sola
+    llamada a `aplicar_lote` (una transacción, una versión publicada) y
+    devuelve a cada hilo sus resultados. Mientras un lote se confirma, los que
+    llegan forman el siguiente, así que el tamaño del lote crece solo con la
+    carga. `aplicar_lote(elementos)` devuelve una lista de resultados en el
+    mismo orden; si lanza, todos los hilos del lote reciben la excepción.
+    """
+
+    def __init__(self, nombre: str, aplicar_lote, max_lote: int = 512, timeout: float = 30.0):
+        self.nombre = nombre
+        self.aplicar_lote = aplicar_lote
+        self.max_lote = max_lote
+        self.timeout = timeout
+        self._cola = queue.SimpleQueue()
+        self._hilo = None
+        self._lock = threading.Lock()
+        metricas.describir("agrilink_lotes_escritura_total", "counter",
+                           "Lotes confirmados por el escritor agrupado (group commit).")
+        metricas.describir("agrilink_elementos_escritura_total", "counter",
+                           "Elementos confirmados por el escritor agrupado; dividido por los lotes da el tamaño medio.")
+
+    def enviar(self, elementos: list) -> list:
+        """Encola los elementos y espera a que su lote se confirme."""
+        if not elementos:
+            return []
+        self._arrancar()
+        futuro = Future()
+        self._cola.put((elementos, futuro))
+        try:
+            return futuro.result(self.timeout)
+        except TimeoutError:
+            raise TimeoutError(f"{self.nombre}: el lote no se confirmó en {self.timeout} s") from None
+
+    def _arrancar(self):
+        if self._hilo is not None:
+            return
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._escritor, name=f"agrupador-{self.nombre}", daemon=True)
+                self._hilo.start()
+
+    def _escritor(self):
+        while True:
+            pendientes = [self._cola.get()]
+            cantidad = len(pendientes[0][0])
+            while cantidad < self.max_lote:
+                try:
+                    pendiente = self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                pendientes.append(pendiente)
+                cantidad += len(pendiente[0])
+            self._confirmar(pendientes, cantidad)
+
+    def _confirmar(self, pendientes, cantidad):
+        elementos = [elemento for lote, _ in pendientes for elemento in lote]
+        try:
+            resultados = self.aplicar_lote(elementos)
+        except Exception as e:
+            for _, futuro in pendientes:
+                futuro.set_exception(e)
+            return
+        metricas.incrementar("agrilink_lotes_escritura_total", agrupador=self.nombre)
+        metricas.incrementar("agrilink_elementos_escritura_total", cantidad, agrupador=self.nombre)
+        inicio = 0
+        for lote, futuro in pendientes:
+            futuro.set_result(resultados[inicio:inicio + len(lote)])
+            inicio += len(lote)
@@ -1,13 +1,471 @@
 import os
 import sys
+import atexit
+import uuid
 import random
+import functools
+import heapq
+import sqlite3
+import threading
 import networkx as nx
 import time
+import config
+from almacen_atributos import AlmacenAtributos
+from coalescencia import Coalescedor
+from escenarios_descuento import evaluar_escenarios
+from estado_compartido import CacheRutasCompartida, TablaDescuentos
+from ingesta_delta import (EditorGrafo, RegistroDeltas, aplicar_filas, capitales_por_codigo, escribir_graphml,
+                           reproducir_registro, ruta_registro)
+from instrumentacion import metricas
+from instantanea_grafo import CacheLRU, InstantaneaGrafo
+from huella_archivo import sha1_archivo
+from matriz_costos_mmap import PREFIJO as PREFIJO_MATRIZ, MatrizCostos
+from modo_sombra import ModoSombra
+from particion_grafo import CoordinadorShards, ShardCaido
+from plan_distribucion import planificar_distribucion
+from repositorio_sqlite import BaseSQLite
+from rutas_alternativas import construir_adyacencia, k_rutas_mas_cortas
+from indice_busqueda import IndiceBusqueda
+from similitud_productos import IndiceSimilitudProductos, SimilitudDiferida
+from indice_ubigeo import NIVELES, IndiceUbigeo
+
+OPCIONES_DESCUENTO = [0.0, 0.10, 0.15, 0.20, 0.30, 0.40, 0.50]
+
+def _con_instantanea(metodo):
+    """Fija la instantánea vigente en el hilo durante la llamada (si no había una ya fijada)."""
+    @functools.wraps(metodo)
+    def envoltura(self, *args, **kwargs):
+        if getattr(self._local, "instantanea", None) is not None:
+            return metodo(self, *args, **kwargs)
+        self._local.instantanea = self._instantanea
+        try:
+            return metodo(self, *args, **kwargs)
+        finally:
+            self._local.instantanea = None
+    return envoltura
+
+
+def _en_sombra(motor: str, extraer):
+    """
+    Modo sombra (modo_sombra.py): en una muestra de las llamadas mide la
+    latencia del motor y encola la comparación de su respuesta con la
+    referencia de networkx. `extraer(resultado)` la lleva a {criterio: (costo,
+    ruta)}, o devuelve None si no es comparable. Va debajo de @_con_instantanea.
+    """
+    def decorador(metodo):
+        @functools.wraps(metodo)
+        def envoltura(self, origen, destino, *args, **kwargs):
+            sombra = self._sombra
+            if not sombra.muestrear():
+                return metodo(self, origen, destino, *args, **kwargs)
+            inicio = time.perf_counter()
+            resultado = metodo(self, origen, destino, *args, **kwargs)
+            latencia = time.perf_counter() - inicio
+            rapido = extraer(resultado)
+            if rapido is not None:
+                instantanea = self.instantanea
+                consulta = {"origen": origen, "destino": destino, "version_grafo": instantanea.version,
+                            "version_descuentos": instantanea.version_descuentos}
+                sombra.enviar(motor, consulta, rapido, latencia,
+                              lambda: self._rutas_de_referencia(instantanea, origen, destino, tuple(rapido)))
+            return resultado
+        return envoltura
+    return decorador
+
+
+def _costo_mostrado(costo_final: str) -> float:
+    if costo_final == "N/A":
+        return float('inf')
+    if costo_final == "Ciclo Negativo":
+        return -float('inf')
+    return float(costo_final)
+
+
+def _sombra_de_rutas(resultado):
+    """ruta-optima y ruta-regional: costo y ruta (nodos intermedios) de cada criterio."""
+    if "error" in resultado:
+        return None
+    return {criterio: (_costo_mostrado(resultado[criterio]["costo_final"]), resultado[criterio]["ruta"])
+            for criterio in ("bellman_ford", "dijkstra")}
+
+
+def _sombra_de_matriz(resultado):
+    """matriz-costos: solo el costo del criterio pedido (la matriz no guarda rutas)."""
+    if "error" in resultado:
+        return None
+    return {resultado["criterio"]: (_costo_mostrado(resultado["costo_final"]), None)}
+
+
+def _sombra_de_alternativas(resultado):
+    """rutas-alternativas: la primera ruta contra Dijkstra; con tramos cerrados no hay referencia."""
+    if "error" in resultado or resultado["aristas_cerradas"]:
+        return None
+    if not resultado["rutas"]:
+        return {"dijkstra": (float('inf'), [])}
+    mejor = resultado["rutas"][0]
+    return {"dijkstra": (mejor["costo"], mejor["ruta"][1:-1] if len(mejor["ruta"]) > 2 else [])}
+
 
 class AlgoritmosService:
+    """
+    Modelo de concurrencia (workers gthread con varios hilos por proceso):
+      - Lectores: cada petición fija la instantánea vigente en su hilo
+        (fijar_instantanea o @_con_instantanea) y la usa de principio a fin sin
+        candados; una instantánea y todo lo que contiene nunca se modifica.
+      - Escritores (recarga, ingesta y compactación de deltas): se serializan
+        con `_lock_escritura`, construyen la instantánea siguiente aparte y la
+        publican con una sola asignación de `_instantanea`.
+      - El resto del estado compartido (cachés LRU, coalescedor, planes, matriz
+        mapeada) tiene su propio candado interno.
+      - Entre procesos: los descuentos salen de una tabla versionada común
+        (estado_compartido.py) que cada worker sondea, así que todos calculan
+        con los mismos descuentos y pueden compartir resultados.
+    """
+
     def __init__(self):
-        self.grafo = self._cargar_grafo_portable()
-        self.descuentos_activos = self._generar_descuentos_aleatorios()
+        self._local = threading.local()
+        # Un solo escritor a la vez sobre la instantánea publicada
+        self._lock_escritura = threading.Lock()
+        self._estado_recarga = {"estado": "inactivo", "ultima_recarga": None, "duracion_ms": None, "error": None}
+        # Comparación en segundo plano de una muestra de rutas con la referencia de networkx
+        self._sombra = ModoSombra(config.SOMBRA_PROPORCION, config.SOMBRA_TOLERANCIA, config.RUTA_REGISTRO_SOMBRA)
+        # Descuentos (y opcionalmente rutas) compartidos con los demás workers del nodo
+        self._tabla_descuentos, self._cache_compartida = self._abrir_estado_compartido()
+        # Todo lo que depende del grafo vive en una instantánea inmutable; recargar
+        # el grafo es construir otra en segundo plano y reemplazar esta referencia.
+        ruta = self._ruta_grafo()
+        self._instantanea = self._construir_instantanea(self._cargar_grafo_portable(), version=1, ruta=ruta)
+        # Peticiones idénticas simultáneas de ruta-optima comparten un único cálculo
+        self._coalescedor_rutas = Coalescedor("ruta_optima", timeout=config.TIMEOUT_COALESCENCIA)
+        metricas.registrar_gauge("agrilink_rutas_en_calculo", self._coalescedor_rutas.en_curso,
+                                 "Cálculos de ruta-optima distintos en curso.")
+        # Versiones del grafo y de la tabla de descuentos (se exponen en /api/metrics)
+        metricas.registrar_gauge("agrilink_grafo_version", lambda: self._instantanea.version, "Versión del grafo servido.")
+        metricas.registrar_gauge("agrilink_descuentos_version", lambda: self._instantanea.version_descuentos, "Versión de la tabla de descuentos.")
+        metricas.registrar_gauge("agrilink_grafo_nodos", lambda: self._instantanea.grafo.number_of_nodes(), "Nodos del grafo servido.")
+        metricas.describir("agrilink_recargas_grafo_total", "counter", "Recargas del grafo por resultado (ok/error).")
+        # Matriz Asociación x Mercado precalculada por Panditas/matriz_costos.py (se abre al primer uso)
+        self._matriz_costos = None
+        self._lock_matriz = threading.Lock()
+        # Estado (flujo por arista y potenciales) de los últimos planes de distribución, para arrancar en caliente
+        self._planes = CacheLRU("planes_distribucion", 64)
+        # Rutas servidas por shards regionales en procesos aparte (opcional)
+        self._coordinador = None
+        if config.SHARDS_ESTRATEGIA:
+            self.iniciar_shards(config.SHARDS_ESTRATEGIA, config.NUM_SHARDS)
+        if config.VIGILAR_GRAFO:
+            self.iniciar_vigilancia(config.INTERVALO_VIGILANCIA)
+        if self._tabla_descuentos is not None and config.INTERVALO_DESCUENTOS > 0:
+            self.iniciar_sondeo_descuentos(config.INTERVALO_DESCUENTOS)
+
+    # =========================================================================
+    # INSTANTÁNEA DEL GRAFO (versión inmutable + recarga en caliente)
+    # =========================================================================
+    @property
+    def instantanea(self):
+        """La instantánea fijada por la petición en curso o, fuera de una, la vigente."""
+        return getattr(self._local, "instantanea", None) or self._instantanea
+
+    def fijar_instantanea(self):
+        """Fija la instantánea vigente en este hilo hasta soltar_instantanea() (una por petición HTTP)."""
+        self._local.instantanea = self._instantanea
+
+    def soltar_instantanea(self):
+        self._local.instantanea = None
+
+    @property
+    def grafo(self):
+        return self.instantanea.grafo
+
+    @property
+    def atributos(self):
+        return self.instantanea.atributos
+
+    @property
+    def descuentos_activos(self):
+        return self.instantanea.descuentos
+
+    @property
+    def version_grafo(self):
+        return self.instantanea.version
+
+    @property
+    def version_descuentos(self):
+        return self.instantanea.version_descuentos
+
+    @property
+    def indice_busqueda(self):
+        return self.instantanea.indice_busqueda
+
+    @property
+    def similitud_productos(self):
+        return self.instantanea.similitud_productos
+
+    @property
+    def indice_ubigeo(self):
+        return self.instantanea.indice_ubigeo
+
+    def _construir_instantanea(self, grafo, version, ruta=None, anterior=None):
+        """Construye grafo congelado, descuentos, índices y caché de una versión nueva."""
+        inicio = time.perf_counter()
+        # Las filas ingeridas después de generar el GraphML se reproducen sobre él
+        sha1 = sha1_archivo(ruta) if ruta else None
+        secuencia = reproducir_registro(grafo, ruta, sha1) if ruta else 0
+        # Antes que los índices: deja los dicts del grafo apuntando a cadenas compartidas
+        atributos = AlmacenAtributos.desde_grafo(grafo)
+        nx.freeze(grafo)
+        # Grafo releído: el precio original de todos puede haber cambiado (se conserva el porcentaje)
+        productos = [n for n, tipo in grafo.nodes(data='tipo') if tipo == 'Producto']
+        descuentos, version_descuentos = self._generar_descuentos(grafo, productos, anterior, set(productos))
+        origen = "tabla compartida" if self._tabla_descuentos is not None else "sorteo local"
+        print(f"🎲 Descuentos v{version_descuentos}: {len(descuentos)} productos ({origen})")
+
+        instantanea = InstantaneaGrafo(
+            version=version,
+            grafo=grafo,
+            atributos=atributos,
+            descuentos=descuentos,
+            version_descuentos=version_descuentos,
+            alcanzabilidad=self._construir_alcanzabilidad(grafo),
+            indice_busqueda=IndiceBusqueda.desde_grafo(grafo),
+            similitud_productos=IndiceSimilitudProductos(grafo),
+            indice_ubigeo=IndiceUbigeo(grafo),
+            cache_rutas=CacheLRU("ruta_optima", config.CAPACIDAD_CACHE_RUTAS),
+            ruta_archivo=ruta,
+            mtime_archivo=os.path.getmtime(ruta) if ruta else None,
+            sha1_archivo=sha1,
+            secuencia_deltas=secuencia,
+        )
+        print(f"📸 Instantánea v{version} del grafo lista ({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+        return instantanea
+
+    def recargar_grafo(self, esperar: bool = False):
+        """
+        Relee el GraphML y publica una instantánea nueva sin detener el servicio.
+        La construcción corre en un hilo aparte; las peticiones en curso terminan
+        con la versión que tomaron y las nuevas ven la nueva versión completa.
+        """
+        if not self._lock_escritura.acquire(blocking=False):
+            return {**self._estado_recarga, "mensaje": "Ya hay una recarga en curso"}
+        self._estado_recarga = {**self._estado_recarga, "estado": "en_curso", "error": None}
+        hilo = threading.Thread(target=self._recargar, name="recarga-grafo", daemon=True)
+        hilo.start()
+        if esperar:
+            hilo.join()
+        return self.estado_recarga()
+
+    def _recargar(self):
+        inicio = time.perf_counter()
+        try:
+            anterior = self._instantanea
+            ruta = self._ruta_grafo()
+            if ruta is None:
+                raise FileNotFoundError("No se encontró Grafo_Proyecto_Actualizado.graphml")
+            grafo = nx.read_graphml(ruta)
+            print(f"🔄 Recargando grafo: {grafo.number_of_nodes()} nodos, {grafo.number_of_edges()} aristas")
+            nueva = self._construir_instantanea(grafo, anterior.version + 1, ruta, anterior)
+            # Intercambio atómico: una sola asignación de referencia
+            self._instantanea = nueva
+            metricas.incrementar("agrilink_recargas_grafo_total", resultado="ok")
+            self._estado_recarga = {
+                "estado": "completada",
+                "ultima_recarga": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "duracion_ms": round((time.perf_counter() - inicio) * 1000, 1),
+                "error": None,
+            }
+        except Exception as e:
+            print(f"❌ Error recargando el grafo (se mantiene la versión actual): {e}")
+            metricas.incrementar("agrilink_recargas_grafo_total", resultado="error")
+            self._estado_recarga = {**self._estado_recarga, "estado": "error", "error": str(e)}
+        finally:
+            self._lock_escritura.release()
+
+    def reporte_memoria(self):
+        """Memoria de los atributos del grafo antes y después de pasarlos al almacén por columnas."""
+        instantanea = self._instantanea
+        return {"version_grafo": instantanea.version, **instantanea.atributos.reporte}
+
+    def estado_recarga(self):
+        instantanea = self._instantanea
+        return {
+            **self._estado_recarga,
+            "version_grafo": instantanea.version,
+            "version_descuentos": instantanea.version_descuentos,
+            "archivo": instantanea.ruta_archivo,
+            "secuencia_deltas": instantanea.secuencia_deltas,
+            "total_nodos": instantanea.grafo.number_of_nodes(),
+            "total_aristas": instantanea.grafo.number_of_edges(),
+            "rutas_en_cache": len(instantanea.cache_rutas),
+        }
+
+    def iniciar_vigilancia(self, intervalo: float):
+        """Recarga el grafo cuando cambia la fecha de modificación del GraphML (sondeo en un hilo)."""
+        def vigilar():
+            while True:
+                time.sleep(intervalo)
+                ruta = self._ruta_grafo()
+                if ruta is None or self._lock_escritura.locked():
+                    continue
+                try:
+                    mtime = os.path.getmtime(ruta)
+                except OSError:
+                    continue
+                actual = self._instantanea
+                if ruta != actual.ruta_archivo or mtime != actual.mtime_archivo:
+                    print(f"👀 Cambio detectado en {ruta}")
+                    self.recargar_grafo()
+                else:
+                    # Deltas anotados por otro worker o por la CLI de ingesta_delta.py
+                    self.sincronizar_deltas()
+
+        threading.Thread(target=vigilar, name="vigilancia-grafo", daemon=True).start()
+        print(f"👀 Vigilando el GraphML cada {intervalo:g} s")
+
+    # =========================================================================
+    # DELTAS DEL GRAFO (ingesta incremental, ver ingesta_delta.py)
+    # =========================================================================
+    def ingerir_filas(self, filas: list):
+        """
+        Aplica filas nuevas o modificadas (esquema de panda.py) al grafo servido:
+        se validan todas sobre una copia para escritura del grafo, se anotan en el
+        registro de deltas y se publica una versión nueva actualizando los índices
+        solo en lo que cambió. Si alguna fila no es válida no se aplica ninguna.
+        """
+        inicio = time.perf_counter()
+        # Mismo candado que la recarga: una ingesta nunca se pisa con otra ni con una recarga
+        with self._lock_escritura:
+            anterior = self._instantanea
+            if anterior.ruta_archivo is None:
+                return {"error": "No hay GraphML cargado", "estado": "no_disponible"}
+            capitales = capitales_por_codigo(anterior.grafo, anterior.alcanzabilidad["capitales"])
+            editor = EditorGrafo(anterior.grafo)
+            normalizadas, errores = aplicar_filas(editor, filas, capitales)
+            if errores:
+                return {"error": "Filas inválidas; no se aplicó ninguna", "filas_invalidas": errores}
+
+            registro = RegistroDeltas(ruta_registro(anterior.ruta_archivo))
+            try:
+                entradas = registro.agregar(normalizadas, anterior.sha1_archivo)
+            except ValueError as e:
+                return {"error": str(e), "estado": "conflicto"}
+            if entradas[0]["secuencia"] != anterior.secuencia_deltas + 1:
+                # Otro proceso anotó deltas que esta versión aún no tiene: van antes que estas filas
+                _, entradas = registro.leer(desde=anterior.secuencia_deltas)
+                editor = EditorGrafo(anterior.grafo)
+                aplicar_filas(editor, entradas, capitales)
+            nueva = self._instantanea_con_deltas(anterior, editor, entradas[-1]["secuencia"])
+            self._instantanea = nueva
+        return {
+            "filas_aplicadas": len(normalizadas),
+            "secuencia": nueva.secuencia_deltas,
+            "version_grafo": nueva.version,
+            "version_descuentos": nueva.version_descuentos,
+            "nodos_modificados": len(editor.atributos_previos),
+            "total_nodos": nueva.grafo.number_of_nodes(),
+            "duracion_ms": round((time.perf_counter() - inicio) * 1000, 2),
+        }
+
+    def sincronizar_deltas(self):
+        """Aplica los deltas del registro que esta versión aún no tiene (anotados por otro proceso)."""
+        actual = self._instantanea
+        if actual.ruta_archivo is None or not self._lock_escritura.acquire(blocking=False):
+            return 0
+        try:
+            actual = self._instantanea
+            cabecera, entradas = RegistroDeltas(ruta_registro(actual.ruta_archivo)).leer(desde=actual.secuencia_deltas)
+            # Un registro de otro GraphML se resuelve al recargar (el GraphML cambió)
+            if not entradas or cabecera.get("graphml_sha1") != actual.sha1_archivo:
+                return 0
+            editor = EditorGrafo(actual.grafo)
+            aplicar_filas(editor, entradas, capitales_por_codigo(actual.grafo, actual.alcanzabilidad["capitales"]))
+            self._instantanea = self._instantanea_con_deltas(actual, editor, entradas[-1]["secuencia"])
+            return len(entradas)
+        finally:
+            self._lock_escritura.release()
+
+    def compactar_deltas(self):
+        """
+        Escribe el grafo servido (GraphML base + deltas) como GraphML nuevo,
+        reinicia el registro y reconstruye el índice de búsqueda sin capa de deltas.
+        Las filas que otro proceso anote mientras tanto no se pierden: quedan en
+        el registro nuevo y se aplican al terminar.
+        """
+        self.sincronizar_deltas()
+        inicio = time.perf_counter()
+        with self._lock_escritura:
+            actual = self._instantanea
+            if actual.ruta_archivo is None:
+                return {"error": "No hay GraphML cargado", "estado": "no_disponible"}
+            if not actual.secuencia_deltas:
+                return {"mensaje": "Nada que compactar", "version_grafo": actual.version}
+            try:
+                sha1, conservadas = RegistroDeltas(ruta_registro(actual.ruta_archivo)).compactar(
+                    actual.sha1_archivo, actual.secuencia_deltas,
+                    lambda: escribir_graphml(actual.grafo, actual.ruta_archivo))
+            except ValueError as e:
+                return {"error": str(e), "estado": "conflicto"}
+            # El contenido servido no cambia: misma versión, solo apunta al GraphML nuevo
+            self._instantanea = actual.con(
+                indice_busqueda=IndiceBusqueda.desde_grafo(actual.grafo),
+                mtime_archivo=os.path.getmtime(actual.ruta_archivo),
+                sha1_archivo=sha1,
+                secuencia_deltas=0,
+            )
+        print(f"🗜️  Deltas hasta la secuencia {actual.secuencia_deltas} compactados en el GraphML")
+        if conservadas:
+            self.sincronizar_deltas()
+        return {
+            "deltas_compactados": actual.secuencia_deltas,
+            "deltas_conservados": len(conservadas),
+            "archivo": actual.ruta_archivo,
+            "graphml_sha1": sha1,
+            "version_grafo": self._instantanea.version,
+            "duracion_ms": round((time.perf_counter() - inicio) * 1000, 1),
+        }
+
+    def _instantanea_con_deltas(self, anterior, editor, secuencia):
+        """Versión nueva a partir de la anterior y un EditorGrafo, actualizando solo lo que cambió."""
+        inicio = time.perf_counter()
+        grafo = editor.grafo
+        modificados = editor.atributos_previos
+        atributos = anterior.atributos.con_cambios(grafo, modificados)
+        nx.freeze(grafo)
+
+        # Descuento de productos nuevos y precio original de los que cambiaron de precio
+        tocados = {n for n in editor.tocados if grafo.nodes[n].get('tipo') == 'Producto'}
+        descuentos, version_descuentos = self._generar_descuentos(
+            grafo, [*anterior.descuentos, *(tocados - anterior.descuentos.keys())], anterior, tocados)
+
+        instantanea = anterior.con(
+            version=anterior.version + 1,
+            grafo=grafo,
+            atributos=atributos,
+            descuentos=descuentos,
+            version_descuentos=version_descuentos,
+            alcanzabilidad=self._actualizar_alcanzabilidad(anterior.alcanzabilidad, grafo, editor.tocados),
+            indice_busqueda=anterior.indice_busqueda.con_nodos(grafo, modificados),
+            similitud_productos=SimilitudDiferida(grafo),
+            indice_ubigeo=anterior.indice_ubigeo.con_cambios(grafo, modificados),
+            cache_rutas=CacheLRU("ruta_optima", config.CAPACIDAD_CACHE_RUTAS),
+            secuencia_deltas=secuencia,
+        )
+        print(f"🧾 Instantánea v{instantanea.version} con deltas hasta la secuencia {secuencia}: "
+              f"{len(editor.tocados)} nodos tocados ({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+        return instantanea
+
+    def _ruta_grafo(self):
+        directorio_actual = os.path.dirname(os.path.abspath(__file__))
+        
+        rutas_relativas = [
+            os.path.join(directorio_actual, "..", "Panditas"),
+            os.path.join(directorio_actual, "..", "..", "Panditas"),  
+        ]
+        
+        for ruta_rel in rutas_relativas:
+            graphml_path = os.path.join(os.path.abspath(ruta_rel), "Proyecto_Grafo_Archivos", "Grafo_Proyecto_Actualizado.graphml")
+            if os.path.exists(graphml_path):
+                return graphml_path
+        return None
     
     def _cargar_grafo_portable(self):
         directorio_actual = os.path.dirname(os.path.abspath(__file__))
@@ -37,47 +495,302 @@ class AlgoritmosService:
         print("No se pudo cargar el grafo real. Usando grafo vacío.")
         return nx.DiGraph()
     
-    def _generar_descuentos_aleatorios(self):
-        """Genera descuentos aleatorios para productos sin modificar el dataset original"""
-        print("🎲 Generando descuentos aleatorios (0%, 10%, 15%, 20%, 30%, 40%, 50%)...")
-        
+    # =========================================================================
+    # DESCUENTOS (tabla versionada compartida por los workers, ver estado_compartido.py)
+    # =========================================================================
+    def _abrir_estado_compartido(self):
+        if not config.DESCUENTOS_COMPARTIDOS:
+            return None, None
+        try:
+            base = BaseSQLite(config.RUTA_ESTADO_COMPARTIDO)
+            tabla = TablaDescuentos(base)
+            cache = (CacheRutasCompartida(base, "ruta_optima_compartida", config.CAPACIDAD_CACHE_COMPARTIDA)
+                     if config.CAPACIDAD_CACHE_COMPARTIDA > 0 else None)
+        except (sqlite3.Error, OSError) as e:
+            print(f"⚠️  Sin estado compartido ({e}); cada proceso sorteará sus propios descuentos")
+            return None, None
+        print(f"🤝 Descuentos compartidos en {config.RUTA_ESTADO_COMPARTIDO}")
+        return tabla, cache
+
+    @staticmethod
+    def _sortear_descuento():
+        return random.choice(OPCIONES_DESCUENTO)
+
+    def _generar_descuentos(self, grafo, productos, anterior=None, tocados=frozenset()):
+        """
+        (descuentos, versión) de los productos: de la tabla compartida si la hay
+        (la versión es la de la tabla) o sorteados en este proceso conservando
+        los previos (la versión sube si algo cambió).
+        """
+        previos = anterior.descuentos if anterior is not None else {}
+        if self._tabla_descuentos is None:
+            descuentos = self._generar_descuentos_aleatorios(grafo, productos, previos, tocados)
+            if anterior is None:
+                return descuentos, 1
+            cambio = descuentos.keys() != previos.keys() or any(descuentos[p] != previos[p] for p in tocados)
+            return descuentos, anterior.version_descuentos + (1 if cambio else 0)
+        version, porcentajes = self._tabla_descuentos.asegurar(productos, self._sortear_descuento)
+        return self._entradas_descuento(grafo, productos, porcentajes, previos, tocados), version
+
+    def _generar_descuentos_aleatorios(self, grafo, productos, previos=None, tocados=frozenset()):
+        """
+        Genera descuentos aleatorios para productos sin modificar el dataset original.
+        En una recarga se conserva el descuento de los productos que siguen existiendo.
+        """
+        previos = previos or {}
+        porcentajes = {p: previos[p]['descuento_porcentaje'] if p in previos else self._sortear_descuento()
+                       for p in productos}
+        return self._entradas_descuento(grafo, productos, porcentajes, previos, tocados)
+
+    def _entradas_descuento(self, grafo, productos, porcentajes, previos, tocados=frozenset()):
+        """Entradas de descuento; reutiliza las previas de productos con el mismo porcentaje y sin cambios."""
         descuentos = {}
-        opciones_descuento = [0.0, 0.10, 0.15, 0.20, 0.30, 0.40, 0.50]
-        
-        # Aplicar a productos existentes en el grafo
-        productos = [n for n, data in self.grafo.nodes(data=True) 
-                    if data.get('tipo') == 'Producto']
-        
         for producto in productos:
-            descuento = random.choice(opciones_descuento)
-            descuentos[producto] = {
-                'descuento_porcentaje': descuento,
-                'descuento_texto': f"{int(descuento * 100)}%",
-                'precio_original': self._obtener_precio_original(producto),
-                'precio_final': None
-            }
-            
-            # Calcular precio final si tenemos precio original
-            if descuentos[producto]['precio_original']:
-                precio_original = descuentos[producto]['precio_original']
-                descuentos[producto]['precio_final'] = round(precio_original * (1 - descuento), 2)
-        
-        print(f"✅ {len(descuentos)} productos con descuentos aplicados")
+            previo = previos.get(producto)
+            if (previo is not None and producto not in tocados
+                    and previo['descuento_porcentaje'] == porcentajes[producto]):
+                descuentos[producto] = previo
+            else:
+                descuentos[producto] = self._entrada_descuento(producto, grafo, porcentajes[producto])
         return descuentos
+
+    def sincronizar_descuentos(self):
+        """Publica los descuentos de la tabla compartida si otro worker la cambió (regeneración o productos nuevos)."""
+        tabla = self._tabla_descuentos
+        if tabla is None or tabla.version() == self._instantanea.version_descuentos:
+            return False
+        if not self._lock_escritura.acquire(blocking=False):
+            return False
+        try:
+            actual = self._instantanea
+            version, porcentajes = tabla.asegurar(list(actual.descuentos), self._sortear_descuento)
+            if version == actual.version_descuentos:
+                return False
+            self._publicar_descuentos(actual, porcentajes, version)
+            return True
+        finally:
+            self._lock_escritura.release()
+
+    def regenerar_descuentos(self):
+        """Sortea descuentos nuevos para todos los productos; los demás workers los toman en su próximo sondeo."""
+        with self._lock_escritura:
+            actual = self._instantanea
+            productos = list(actual.descuentos)
+            if self._tabla_descuentos is not None:
+                version, porcentajes = self._tabla_descuentos.regenerar(productos, self._sortear_descuento)
+            else:
+                version = actual.version_descuentos + 1
+                porcentajes = {p: self._sortear_descuento() for p in productos}
+            nueva = self._publicar_descuentos(actual, porcentajes, version)
+        return {
+            "version_descuentos": nueva.version_descuentos,
+            "version_grafo": nueva.version,
+            "productos": len(nueva.descuentos),
+            "compartidos": self._tabla_descuentos is not None,
+        }
+
+    def _publicar_descuentos(self, actual, porcentajes, version):
+        # Mismo grafo con otros descuentos: las rutas de la caché ya no valen
+        nueva = actual.con(
+            descuentos=self._entradas_descuento(actual.grafo, list(actual.descuentos), porcentajes, actual.descuentos),
+            version_descuentos=version,
+            cache_rutas=CacheLRU("ruta_optima", config.CAPACIDAD_CACHE_RUTAS),
+        )
+        self._instantanea = nueva
+        print(f"🎲 Descuentos v{version} publicados ({len(nueva.descuentos)} productos)")
+        return nueva
+
+    def iniciar_sondeo_descuentos(self, intervalo: float):
+        """Relee la versión de la tabla compartida cada `intervalo` s (una consulta de una fila)."""
+        def sondear():
+            while True:
+                time.sleep(intervalo)
+                try:
+                    self.sincronizar_descuentos()
+                except sqlite3.Error as e:
+                    print(f"⚠️  No se pudo leer la tabla de descuentos: {e}")
+
+        threading.Thread(target=sondear, name="sondeo-descuentos", daemon=True).start()
+
+    def _entrada_descuento(self, producto, grafo, descuento):
+        entrada = {
+            'descuento_porcentaje': descuento,
+            'descuento_texto': f"{int(descuento * 100)}%",
+            'precio_original': self._obtener_precio_original(producto, grafo),
+            'precio_final': None
+        }
+        # Calcular precio final si tenemos precio original
+        if entrada['precio_original']:
+            entrada['precio_final'] = round(entrada['precio_original'] * (1 - descuento), 2)
+        return entrada
     
-    def _obtener_precio_original(self, producto):
+    def _obtener_precio_original(self, producto, grafo=None):
         """Intenta obtener el precio original del producto desde las aristas del grafo"""
+        grafo = self.grafo if grafo is None else grafo
         try:
             # ❗ CORRECCIÓN: Buscar conexiones a CAPITALES, no a mercados, para obtener precios
-            for vecino in self.grafo.neighbors(producto):
-                if self.grafo.nodes[vecino].get('tipo') == 'Capital': # <-- CAMBIADO: 'Capital' es donde está el precio en panda.py
-                    peso = self.grafo[producto][vecino].get('peso', 0)
+            for vecino in grafo.neighbors(producto):
+                if grafo.nodes[vecino].get('tipo') == 'Capital': # <-- CAMBIADO: 'Capital' es donde está el precio en panda.py
+                    peso = grafo[producto][vecino].get('peso', 0)
                     if peso > 0:
                         return peso
             return None
         except:
             return None
         
+    # =========================================================================
+    # ALCANZABILIDAD (poda antes de Bellman-Ford / Dijkstra)
+    # =========================================================================
+    def _construir_alcanzabilidad(self, grafo):
+        """
+        Precalcula, para una versión del grafo, la condensación en componentes
+        fuertemente conexas (SCC) y, por componente, la máscara de bits de las
+        Capitales alcanzables (descendientes) y de las que la alcanzan (ancestros).
+        Toda ruta Asociación -> Producto -> Capital ... Capital -> Mercado pasa por
+        la red troncal, así que con estas máscaras un par imposible se descarta en
+        O(1) y la búsqueda se limita a las capitales que pueden estar en la ruta.
+        """
+        inicio = time.perf_counter()
+        condensacion = nx.condensation(grafo)
+        componente = condensacion.graph['mapping']
+
+        capitales = sorted(n for n, data in grafo.nodes(data=True) if data.get('tipo') == 'Capital')
+        bit_capital = {capital: 1 << i for i, capital in enumerate(capitales)}
+
+        mascara_propia = [0] * condensacion.number_of_nodes()
+        for capital, bit in bit_capital.items():
+            mascara_propia[componente[capital]] |= bit
+
+        orden = list(nx.topological_sort(condensacion))
+        descendientes = list(mascara_propia)
+        for scc in reversed(orden):
+            for sucesor in condensacion.successors(scc):
+                descendientes[scc] |= descendientes[sucesor]
+        ancestros = list(mascara_propia)
+        for scc in orden:
+            for predecesor in condensacion.predecessors(scc):
+                ancestros[scc] |= ancestros[predecesor]
+
+        por_asociacion = {}
+        for nodo, data in grafo.nodes(data=True):
+            if data.get('tipo') == 'Asociacion':
+                alcance = self._alcance_asociacion(grafo, nodo, bit_capital, componente, descendientes)
+                if alcance is not None:
+                    por_asociacion[nodo] = alcance
+
+        print(f"🧭 Alcanzabilidad precalculada: {condensacion.number_of_nodes()} SCC, "
+              f"{len(capitales)} capitales ({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+        return {
+            "componente": componente,
+            "capitales": capitales,
+            "descendientes": descendientes,
+            "ancestros": ancestros,
+            "por_asociacion": por_asociacion,
+        }
+
+    @staticmethod
+    def _alcance_asociacion(grafo, nodo, capitales, componente, descendientes):
+        """
+        (producto, máscara de Capitales alcanzables) de una Asociación en el grafo
+        de consulta, donde solo sobrevive la arista Producto -> Capital de su propio
+        departamento. None si no vende ningún producto.
+        """
+        producto = next((v for v in grafo.successors(nodo)
+                         if grafo.nodes[v].get('tipo') == 'Producto'), None)
+        capital = grafo.nodes[nodo].get('departamento')
+        if producto is None:
+            return None
+        if capital is None:
+            return producto, descendientes[componente[producto]]
+        if capital in capitales and grafo.has_edge(producto, capital):
+            return producto, descendientes[componente[capital]]
+        return producto, 0
+
+    def _actualizar_alcanzabilidad(self, anterior, grafo, tocados):
+        """
+        Alcanzabilidad de una versión con deltas sin recondensar el grafo. Las
+        filas solo agregan o cambian Asociaciones, Productos y Mercados y sus
+        aristas vende / precio_adquisicion / distribucion_final, que no forman
+        ciclos: cada uno de esos nodos es su propia SCC y sus máscaras salen de las
+        de sus vecinos. Las de las Capitales no cambian (ninguna Capital llega a un
+        Producto, y un Mercado no alcanza ninguna Capital).
+        """
+        componente = dict(anterior["componente"])
+        descendientes = list(anterior["descendientes"])
+        ancestros = list(anterior["ancestros"])
+        capitales = set(anterior["capitales"])
+
+        por_tipo = {'Producto': [], 'Asociacion': [], 'Mercado': []}
+        for nodo in tocados:
+            tipo = grafo.nodes[nodo].get('tipo')
+            if tipo in por_tipo:
+                por_tipo[tipo].append(nodo)
+            if nodo not in componente:
+                componente[nodo] = len(descendientes)
+                descendientes.append(0)
+                ancestros.append(0)
+        # Asociaciones que venden un producto tocado: su máscara depende de la de él
+        asociaciones = set(por_tipo['Asociacion'])
+        for producto in por_tipo['Producto']:
+            asociaciones.update(u for u in grafo.predecessors(producto)
+                                if grafo.nodes[u].get('tipo') == 'Asociacion')
+
+        # Productos antes que Asociaciones (las Asociaciones dependen de sus productos)
+        for nodo in [*por_tipo['Producto'], *asociaciones, *por_tipo['Mercado']]:
+            scc = componente[nodo]
+            descendientes[scc] = functools.reduce(
+                lambda m, v: m | descendientes[componente[v]], grafo.successors(nodo), 0)
+            ancestros[scc] = functools.reduce(
+                lambda m, u: m | ancestros[componente[u]], grafo.predecessors(nodo), 0)
+
+        por_asociacion = dict(anterior["por_asociacion"])
+        for nodo in asociaciones:
+            alcance = self._alcance_asociacion(grafo, nodo, capitales, componente, descendientes)
+            if alcance is None:
+                por_asociacion.pop(nodo, None)
+            else:
+                por_asociacion[nodo] = alcance
+        return {**anterior, "componente": componente, "descendientes": descendientes,
+                "ancestros": ancestros, "por_asociacion": por_asociacion}
+
+    def _nodos_relevantes(self, origen: str, destino: str):
+        """
+        Nodos que pueden formar parte de una ruta origen -> destino en el grafo de
+        consulta. Devuelve solo {origen, destino} si el par es imposible.
+        """
+        alcance = self.instantanea.alcanzabilidad
+        grafo = self.grafo
+
+        if grafo.nodes[destino].get('tipo') not in ('Mercado', 'Capital'):
+            # Fuera del esquema troncal: intersección de descendientes y ancestros
+            desde_origen = nx.descendants(grafo, origen)
+            if destino not in desde_origen:
+                return {origen, destino}
+            return (desde_origen & nx.ancestors(grafo, destino)) | {origen, destino}
+
+        componente = alcance["componente"]
+        nodos = {origen, destino}
+        if origen in alcance["por_asociacion"]:
+            producto, mascara = alcance["por_asociacion"][origen]
+            nodos.add(producto)
+        else:
+            mascara = alcance["descendientes"][componente[origen]]
+
+        mascara &= alcance["ancestros"][componente[destino]]
+        if not mascara:
+            return {origen, destino}
+
+        for i, capital in enumerate(alcance["capitales"]):
+            if mascara >> i & 1:
+                nodos.add(capital)
+        return nodos
+
+    def _subgrafo_de_consulta(self, origen: str, destino: str):
+        """Copia editable restringida a los nodos que pueden estar en la ruta."""
+        with metricas.etapa("alcanzabilidad"):
+            nodos = self._nodos_relevantes(origen, destino)
+        return self.grafo.subgraph(nodos).copy()
+
     def _obtener_ruta_y_costo(self, grafo, origen, destino, algoritmo):
         """
         Ejecuta un algoritmo de ruta, mide su rendimiento y captura el resultado.
@@ -147,20 +860,23 @@ class AlgoritmosService:
         
         return resultado
     
+    @_con_instantanea
     def encontrar_ruta_optima(self, origen: str, destino: str):
         if origen not in self.grafo or destino not in self.grafo:
             return {"error": "Origen o destino no encontrado en el grafo"}
 
         # 1. Pre-procesar el grafo 
         try:
-            grafo_filtrado = self._crear_grafo_para_bellman_ford(origen, destino) 
+            with metricas.etapa("copia_grafo_bellman_ford"):
+                grafo_filtrado = self._crear_grafo_para_bellman_ford(origen, destino) 
         except Exception as e:
             return {"error": f"Error al pre-procesar el grafo: {str(e)}"}
 
         # 2. Ejecutar el algoritmo Bellman-Ford
         try:
-            ruta = nx.bellman_ford_path(grafo_filtrado, source=origen, target=destino, weight='peso')
-            costo_total = nx.bellman_ford_path_length(grafo_filtrado, source=origen, target=destino, weight='peso')
+            with metricas.etapa("bellman_ford"):
+                ruta = nx.bellman_ford_path(grafo_filtrado, source=origen, target=destino, weight='peso')
+                costo_total = nx.bellman_ford_path_length(grafo_filtrado, source=origen, target=destino, weight='peso')
         except nx.NetworkXNoPath:
             return {"error": f"No se encontró ruta de {origen} a {destino} usando Bellman-Ford"}
         except Exception as e:
@@ -235,12 +951,13 @@ class AlgoritmosService:
     def _traducir_ruta_geografica(self, ruta_ids: list):
         """Traduce los IDs internos de la ruta a nombres geográficos o significativos."""
         ruta_traducida = []
+        atributos = self.atributos
         for nodo_id in ruta_ids:
-            if nodo_id not in self.grafo:
+            data = atributos.vista(nodo_id)
+            if data is None:
                 ruta_traducida.append(nodo_id)
                 continue
                 
-            data = self.grafo.nodes[nodo_id]
             tipo = data.get('tipo', 'Desconocido')
             
             if tipo == 'Asociacion':
@@ -289,6 +1006,7 @@ class AlgoritmosService:
                     })
         return descuentos
     
+    @_con_instantanea
     def obtener_descuentos_activos(self):
         """Endpoint para ver todos los descuentos activos CON ubicaciones"""
         descuentos_con_mercados = {}
@@ -312,34 +1030,188 @@ class AlgoritmosService:
             "descuentos": descuentos_con_mercados
         }
     
+    def _matriz_vigente(self, instantanea):
+        """Abre (o reabre si se regeneró) la matriz precalculada y comprueba que sea del GraphML servido."""
+        if instantanea.ruta_archivo is None:
+            return None, "No hay GraphML cargado"
+        carpeta = os.path.dirname(instantanea.ruta_archivo)
+        meta = os.path.join(carpeta, f"{PREFIJO_MATRIZ}_meta.json")
+        if not os.path.exists(meta):
+            return None, "Matriz de costos no generada (ejecute Panditas/matriz_costos.py o panda.py)"
+        with self._lock_matriz:
+            if self._matriz_costos is None or self._matriz_costos.mtime != os.path.getmtime(meta):
+                self._matriz_costos = MatrizCostos(carpeta)
+        matriz = self._matriz_costos
+        if matriz.meta.get("graphml_sha1") not in (None, instantanea.sha1_archivo):
+            return None, "La matriz de costos corresponde a otra versión del GraphML; regénerela"
+        if instantanea.secuencia_deltas:
+            return None, "El grafo servido tiene deltas sin compactar; compacte y regenere la matriz"
+        return matriz, None
+
+    def matriz_abierta(self):
+        """True si la matriz de la instantánea vigente ya está abierta: consultarla no descomprime ni relee archivos."""
+        instantanea = self.instantanea
+        matriz = self._matriz_costos
+        if matriz is None or instantanea.ruta_archivo is None:
+            return False
+        meta = os.path.join(os.path.dirname(instantanea.ruta_archivo), f"{PREFIJO_MATRIZ}_meta.json")
+        try:
+            return (matriz.mtime == os.path.getmtime(meta)
+                    and matriz.meta.get("graphml_sha1") in (None, instantanea.sha1_archivo))
+        except OSError:
+            return False
+
+    @_con_instantanea
+    @_en_sombra("matriz_costos", _sombra_de_matriz)
+    def costo_precalculado(self, origen: str, destino: str, criterio: str = 'dijkstra'):
+        """
+        Costo Asociación -> Mercado leído de la matriz precalculada, sin búsqueda.
+        La matriz guarda solo el transporte; el precio del producto se toma de los
+        descuentos vigentes con la misma semántica de comparar_rutas_optimas.
+        """
+        if criterio not in ('dijkstra', 'bellman_ford'):
+            return {"error": "criterio debe ser 'dijkstra' o 'bellman_ford'"}
+        instantanea = self.instantanea
+        matriz, error = self._matriz_vigente(instantanea)
+        if error:
+            return {"error": error, "estado": "no_disponible"}
+        celda = matriz.celda(origen, destino)
+        if celda is None:
+            return {"error": "El origen debe ser una Asociación y el destino un Mercado de la matriz"}
+
+        transporte, producto, modo = celda
+        info = self.descuentos_activos.get(producto) or {}
+        precio_original, precio_final = info.get('precio_original'), info.get('precio_final')
+        if modo == 'descuento':
+            if criterio == 'dijkstra':
+                precio = precio_final
+            elif precio_original is not None and precio_final is not None:
+                precio = precio_final - precio_original
+            else:
+                precio = 0.0
+        else:
+            precio = 0.0 if modo == 'fijo' else None
+        costo = transporte + precio if precio is not None else float('inf')
+
+        return {
+            "origen": origen,
+            "destino": destino,
+            "criterio": criterio,
+            "producto": producto or None,
+            "costo_final": f"{costo:.2f}" if costo != float('inf') else "N/A",
+            "transporte": round(transporte, 2) if transporte != float('inf') else None,
+            "precio_producto": round(precio, 2) if precio is not None else None,
+            "matriz": {"creada": matriz.meta.get("creado"), "forma": matriz.meta.get("forma")},
+        }
+
+    def iniciar_shards(self, estrategia: str, num_shards: int):
+        """Particiona el grafo por regiones y levanta un proceso por shard."""
+        coordinador = CoordinadorShards(estrategia, num_shards)
+        coordinador.cargar(self._instantanea.grafo, self._instantanea.version)
+        self._coordinador = coordinador
+        atexit.register(coordinador.detener)
+
+    def estado_shards(self):
+        if self._coordinador is None:
+            return {"error": "Shards deshabilitados (AGRILINK_SHARDS)", "estado": "no_disponible"}
+        return self._coordinador.estado()
+
+    @_con_instantanea
+    @_en_sombra("ruta_regional", _sombra_de_rutas)
+    def ruta_regional(self, origen: str, destino: str):
+        """
+        Ruta óptima (Bellman-Ford y Dijkstra) calculada por los shards regionales:
+        el shard del origen y el del destino resuelven sus tramos en paralelo y el
+        coordinador los une sobre la red troncal. Se reparticiona si cambió el grafo;
+        si otra petición ya publicó un grafo o descuentos más nuevos se responde
+        con estado "version_obsoleta".
+        """
+        coordinador = self._coordinador
+        if coordinador is None:
+            return {"error": "Shards deshabilitados (AGRILINK_SHARDS)", "estado": "no_disponible"}
+        if origen not in self.grafo or destino not in self.grafo:
+            return {"error": "Nodo no encontrado", "mensaje": "Verifique que los IDs de origen y destino existan en el grafo."}
+        try:
+            with metricas.etapa("shards_sincronizar"):
+                coordinador.cargar(self.grafo, self.version_grafo)
+                coordinador.publicar_descuentos(self.version_descuentos, self.descuentos_activos)
+        except ShardCaido as e:
+            return {"error": "Shard no disponible", "mensaje": str(e), "estado": "no_disponible"}
+        with metricas.etapa("shards_ruta"):
+            return coordinador.ruta(origen, destino, self.version_grafo, self.version_descuentos)
+
+    @_con_instantanea
+    def plan_distribucion(self, ofertas: dict, demandas: dict, capacidades=(), plan_base: str = None,
+                          limite_envios: int = 1000):
+        """
+        Plan de distribución con flujo de costo mínimo sobre la red troncal. Si se
+        indica `plan_base` (el plan_id de un plan anterior) se parte de su solución.
+        """
+        base = self._planes.obtener(plan_base) if plan_base else None
+        with metricas.etapa("flujo_costo_minimo"):
+            resultado, estado = planificar_distribucion(self.grafo, self.descuentos_activos, ofertas, demandas,
+                                                        capacidades, base=base, limite_envios=limite_envios)
+        if estado is None:
+            return resultado
+        plan_id = uuid.uuid4().hex[:12]
+        self._planes.guardar(plan_id, estado)
+        if plan_base and base is None:
+            resultado["solucion"]["aviso"] = f"plan_base {plan_base} no encontrado; se resolvió desde cero"
+        return {
+            "plan_id": plan_id,
+            "version_grafo": self.version_grafo,
+            "version_descuentos": self.version_descuentos,
+            **resultado,
+        }
+
+    @_con_instantanea
+    def escenarios_descuento(self, origenes: list, destinos: list, escenarios: int = 10000,
+                             semilla=None, cuantiles=(0.05, 0.5, 0.95), criterio: str = 'dijkstra'):
+        """Distribución de costos de ruta bajo escenarios aleatorios de descuento (Monte Carlo vectorizado)."""
+        return evaluar_escenarios(self.grafo, self.descuentos_activos, origenes, destinos, OPCIONES_DESCUENTO,
+                                  escenarios=escenarios, semilla=semilla, cuantiles=cuantiles, criterio=criterio)
+
+    @_con_instantanea
+    def buscar_nodos(self, consulta: str, tipo: str = None, limite: int = 10):
+        """Autocompletado de nodos (ids, productos, capitales y ubicaciones) por prefijo y aproximado."""
+        inicio = time.perf_counter()
+        resultados = self.indice_busqueda.buscar(consulta, tipo=tipo, limite=limite)
+        return {
+            "consulta": consulta,
+            "tipo": tipo,
+            "resultados": resultados,
+            "total": len(resultados),
+            "tiempo_ms": round((time.perf_counter() - inicio) * 1000, 4),
+        }
+
+    @_con_instantanea
     def productos_relacionados(self, producto: str):
+        """
+        Productos similares según capitales de adquisición, departamentos y
+        asociaciones compartidos (índice precalculado por versión del grafo).
+        """
         if producto not in self.grafo:
             return {"error": "Producto no encontrado"}
+        if producto not in self.similitud_productos:
+            return {"error": f"'{producto}' no es un nodo de tipo Producto"}
     
-        relacionados = set()
-    
-        # Buscar productos que comparten mismos mercados o ubicaciones
-        for vecino in self.grafo.neighbors(producto):
-            # Si el vecino es un mercado o ubicación, buscar otros productos conectados
-            if self.grafo.nodes[vecino].get('tipo') in ['Mercado', 'Ubicacion']:
-                for vecino_del_vecino in self.grafo.neighbors(vecino):
-                    if (self.grafo.nodes[vecino_del_vecino].get('tipo') == 'Producto' and 
-                        vecino_del_vecino != producto):
-                        relacionados.add(vecino_del_vecino)
-    
+        detalle = self.similitud_productos.relacionados(producto, k=10)  # Limitar a 10 resultados
         return {
             "producto_consulta": producto,
-            "relacionados": list(relacionados)[:10],  # Limitar a 10 resultados
-            "total_relacionados": len(relacionados)
+            "relacionados": [d["producto"] for d in detalle],
+            "total_relacionados": self.similitud_productos.total_relacionados(producto),
+            "detalle": detalle,
         }
     
-    def _crear_grafo_para_bellman_ford(self, origen: str, destino: str):
+    def _crear_grafo_para_bellman_ford(self, origen: str, destino: str, completo: bool = False):
         """
         [CORREGIDO] Crea un grafo con PESOS NEGATIVOS (ahorros) para Bellman-Ford.
         El peso de la arista de adquisición será el valor NEGATIVO del descuento, 
         permitiendo que el algoritmo minimice el costo al maximizar el ahorro.
+        Con `completo` parte de todo el grafo y no del subgrafo de consulta
+        (referencia del modo sombra).
         """
-        grafo_temp = self.grafo.copy()
+        grafo_temp = self.grafo.copy() if completo else self._subgrafo_de_consulta(origen, destino)
 
         # 1. Identificar el Producto y la Capital de Origen legítima
         producto_en_ruta = None
@@ -385,6 +1257,7 @@ class AlgoritmosService:
         
         return grafo_temp
     
+    @_con_instantanea
     def obtener_pesos_negativos(self):
         """Muestra los pesos negativos generados por descuentos"""
         grafo = self._crear_grafo_para_bellman_ford()
@@ -406,12 +1279,12 @@ class AlgoritmosService:
             "explicacion": "Pesos negativos generados por ahorros de descuentos"
         }
         
+    @_con_instantanea
     def obtener_info_geografica(self, nodo_id: str):
         """Obtiene el Departamento, Provincia y Distrito de un nodo, si existen."""
-        if nodo_id not in self.grafo:
+        data = self.atributos.vista(nodo_id)
+        if data is None:
             return {"departamento": "N/A", "provincia": "N/A", "distrito": "N/A", "tipo": "No encontrado"}
-
-        data = self.grafo.nodes[nodo_id]
         
         # Asume que los atributos fueron cargados en panda.py
         return {
@@ -422,6 +1295,32 @@ class AlgoritmosService:
             "distrito": data.get('distrito', 'N/A')
         }
     
+    @_con_instantanea
+    def nodos_por_region(self, ubigeo: str, tipo: str = None, desplazamiento: int = 0, limite: int = 100):
+        """
+        Lista y cuenta los nodos de una región por prefijo de ubigeo:
+        departamento (2 dígitos), provincia (4) o distrito (6).
+        """
+        if not ubigeo.isdigit() or len(ubigeo) not in NIVELES:
+            return {"error": "El ubigeo debe tener 2 (departamento), 4 (provincia) o 6 (distrito) dígitos."}
+
+        indice = self.indice_ubigeo
+        nodos = [
+            {**self.obtener_info_geografica(nodo), "ubigeo": codigo}
+            for codigo, nodo in indice.listar(ubigeo, tipo, desplazamiento, limite)
+        ]
+        return {
+            "ubigeo": ubigeo,
+            "nivel": NIVELES[len(ubigeo)],
+            "nombre": indice.nombre(ubigeo),
+            "conteos_por_tipo": indice.conteos(ubigeo),
+            "total": indice.contar(ubigeo, tipo),
+            "tipo": tipo,
+            "desplazamiento": desplazamiento,
+            "limite": limite,
+            "nodos": nodos,
+        }
+
     def _obtener_detalles_productos_en_ruta(self, ruta: list):
         detalles_productos = []
         descuentos_activos = self.descuentos_activos # Usamos la caché generada en __init__
@@ -465,12 +1364,45 @@ class AlgoritmosService:
                     
         return detalles_productos
     
+    @_con_instantanea
+    @_en_sombra("ruta_optima", _sombra_de_rutas)
     def comparar_rutas_optimas(self, origen: str, destino: str):
         """
         Calcula la ruta óptima usando Bellman-Ford (peso negativo) y 
         Dijkstra (precio final positivo), comparando resultados, tiempos de 
         ejecución y la validez de cada uno.
+        
+        Los resultados se guardan en la caché de la instantánea (se descarta al
+        recargar el grafo) y las llamadas concurrentes con el mismo (origen,
+        destino, versión del grafo, versión de descuentos) esperan al primer
+        cálculo y comparten su resultado.
+        """
+        instantanea = self.instantanea
+        resultado = instantanea.cache_rutas.obtener((origen, destino))
+        if resultado is not None:
+            return resultado
+        clave = (origen, destino, instantanea.version, instantanea.version_descuentos)
+        resultado = self._coalescedor_rutas.ejecutar(clave, lambda: self._comparar_rutas_compartidas(origen, destino))
+        instantanea.cache_rutas.guardar((origen, destino), resultado)
+        return resultado
+
+    def _comparar_rutas_compartidas(self, origen: str, destino: str):
         """
+        Caché entre workers: la clave es lo que fija el resultado en cualquier
+        proceso (GraphML, deltas aplicados y versión de la tabla de descuentos).
+        """
+        instantanea = self.instantanea
+        cache = self._cache_compartida
+        if cache is None or instantanea.sha1_archivo is None:
+            return self._comparar_rutas_optimas(origen, destino)
+        clave = [instantanea.sha1_archivo, instantanea.secuencia_deltas, instantanea.version_descuentos, origen, destino]
+        resultado = cache.obtener(clave)
+        if resultado is None:
+            resultado = self._comparar_rutas_optimas(origen, destino)
+            cache.guardar(clave, resultado)
+        return resultado
+    
+    def _comparar_rutas_optimas(self, origen: str, destino: str):
         
         # 0. Verificación de Nodos
         if origen not in self.grafo or destino not in self.grafo:
@@ -484,12 +1416,14 @@ class AlgoritmosService:
         costo_bf = float('inf')
         mensaje_bf = "Error de ejecución."
         
-        grafo_bf = self._crear_grafo_para_bellman_ford(origen, destino)
+        with metricas.etapa("copia_grafo_bellman_ford"):
+            grafo_bf = self._crear_grafo_para_bellman_ford(origen, destino)
         
         inicio_bf = time.time()
         try:
-            ruta_bf = nx.bellman_ford_path(grafo_bf, source=origen, target=destino, weight='peso')
-            costo_bf = nx.bellman_ford_path_length(grafo_bf, source=origen, target=destino, weight='peso')
+            with metricas.etapa("bellman_ford"):
+                ruta_bf = nx.bellman_ford_path(grafo_bf, source=origen, target=destino, weight='peso')
+                costo_bf = nx.bellman_ford_path_length(grafo_bf, source=origen, target=destino, weight='peso')
             mensaje_bf = "Ruta **ÓPTIMA** encontrada. Costo mínimo al manejar descuentos (pesos negativos)."
         except nx.NetworkXNoPath:
             costo_bf = float('inf')
@@ -508,12 +1442,14 @@ class AlgoritmosService:
         costo_dj = float('inf')
         mensaje_dj = "Error de ejecución."
         
-        grafo_dj_optimo = self._crear_grafo_para_dijkstra_optimo(origen, destino) 
+        with metricas.etapa("copia_grafo_dijkstra"):
+            grafo_dj_optimo = self._crear_grafo_para_dijkstra_optimo(origen, destino) 
         
         inicio_dj = time.time()
         try:
-            ruta_dj = nx.dijkstra_path(grafo_dj_optimo, source=origen, target=destino, weight='peso')
-            costo_dj = nx.dijkstra_path_length(grafo_dj_optimo, source=origen, target=destino, weight='peso')
+            with metricas.etapa("dijkstra"):
+                ruta_dj = nx.dijkstra_path(grafo_dj_optimo, source=origen, target=destino, weight='peso')
+                costo_dj = nx.dijkstra_path_length(grafo_dj_optimo, source=origen, target=destino, weight='peso')
             
             mensaje_dj = "Ruta **ÓPTIMA** encontrada. El grafo fue modificado para usar precios finales POSITIVOS, permitiendo que Dijkstra encuentre el costo mínimo de manera más rápida."
 
@@ -532,12 +1468,13 @@ class AlgoritmosService:
         # Se elimina el ID de origen (ruta[0]) y el ID de destino (ruta[-1]) 
         # para mostrar solo los nodos intermedios (Producto y Capitales).
         # Se aplica solo si la ruta tiene más de 2 nodos (ID_A, ID_B, ...).
-        ruta_bf_display = ruta_bf[1:-1] if len(ruta_bf) > 2 else []
-        ruta_dj_display = ruta_dj[1:-1] if len(ruta_dj) > 2 else []
-        
-        # Formatear los costos
-        costo_bf_str = f"{costo_bf:.2f}" if costo_bf not in [float('inf'), -float('inf')] else ("Ciclo Negativo" if costo_bf == -float('inf') else "N/A")
-        costo_dj_str = f"{costo_dj:.2f}" if costo_dj != float('inf') else "N/A"
+        with metricas.etapa("formateo_ruta"):
+            ruta_bf_display = ruta_bf[1:-1] if len(ruta_bf) > 2 else []
+            ruta_dj_display = ruta_dj[1:-1] if len(ruta_dj) > 2 else []
+            
+            # Formatear los costos
+            costo_bf_str = f"{costo_bf:.2f}" if costo_bf not in [float('inf'), -float('inf')] else ("Ciclo Negativo" if costo_bf == -float('inf') else "N/A")
+            costo_dj_str = f"{costo_dj:.2f}" if costo_dj != float('inf') else "N/A"
         
         conclusion = "Ambos algoritmos encuentran la ruta óptima si el grafo se modifica (precios finales). Bellman-Ford es crucial para la robustez y la validación de la lógica de descuento (peso negativo)."
         if costo_bf == -float('inf'):
@@ -565,13 +1502,191 @@ class AlgoritmosService:
             "conclusion_principal": conclusion
         }
         
-    def _crear_grafo_para_dijkstra_optimo(self, origen: str, destino: str):
+    def _rutas_de_referencia(self, instantanea, origen: str, destino: str, criterios):
+        """
+        Cálculo de referencia del modo sombra: networkx sobre una copia del grafo
+        completo (sin poda por alcanzabilidad, cachés, matriz ni shards), en la
+        misma instantánea que atendió la petición. Devuelve {criterio: (costo, ruta)}.
+        """
+        self._local.instantanea = instantanea
+        try:
+            referencia = {}
+            for criterio in criterios:
+                if criterio == 'bellman_ford':
+                    grafo = self._crear_grafo_para_bellman_ford(origen, destino, completo=True)
+                    buscar = nx.single_source_bellman_ford
+                else:
+                    grafo = self._crear_grafo_para_dijkstra_optimo(origen, destino, completo=True)
+                    buscar = nx.single_source_dijkstra
+                try:
+                    costo, ruta = buscar(grafo, origen, target=destino, weight='peso')
+                except nx.NetworkXNoPath:
+                    costo, ruta = float('inf'), []
+                except nx.NetworkXUnbounded:
+                    costo, ruta = -float('inf'), []
+                referencia[criterio] = (costo, ruta[1:-1] if len(ruta) > 2 else [])
+            return referencia
+        finally:
+            self._local.instantanea = None
+
+    def estado_sombra(self):
+        return self._sombra.estado()
+
+    def configurar_sombra(self, proporcion: float = None, tolerancia: float = None):
+        """Cambia en caliente la muestra y la tolerancia del modo sombra (solo en este proceso)."""
+        if proporcion is not None:
+            self._sombra.proporcion = proporcion
+        if tolerancia is not None:
+            self._sombra.tolerancia = tolerancia
+        return self._sombra.estado()
+
+    @_con_instantanea
+    @_en_sombra("rutas_alternativas", _sombra_de_alternativas)
+    def rutas_alternativas(self, origen: str, destino: str, k: int = 5, aristas_cerradas=()):
+        """
+        Las k rutas más baratas (sin ciclos) con la semántica de Dijkstra
+        (precio final con descuento + transporte), opcionalmente con tramos
+        cerrados. No copia el grafo: los pesos de la consulta (aristas
+        ilegítimas y cerradas ocultas) se resuelven una vez sobre los nodos
+        relevantes y todas las búsquedas de Yen comparten esa adyacencia.
+        """
+        grafo = self.grafo
+        if origen not in grafo or destino not in grafo:
+            return {"error": "Nodo no encontrado", "mensaje": "Verifique que los IDs de origen y destino existan en el grafo."}
+        cerradas = {(u, v) for u, v in aristas_cerradas}
+        inexistentes = [[u, v] for u, v in cerradas if not grafo.has_edge(u, v)]
+        if inexistentes:
+            return {"error": "Aristas cerradas inexistentes", "aristas": inexistentes}
+
+        producto_en_ruta = next((v for v in grafo.neighbors(origen) if grafo.nodes[v].get('tipo') == 'Producto'), None)
+        capital_origen_nombre = grafo.nodes[origen].get('departamento')
+        info_descuento = self.descuentos_activos.get(producto_en_ruta) or {}
+        precio_final = info_descuento.get('precio_final')
+        modificar = producto_en_ruta is not None and capital_origen_nombre is not None
+
+        def peso(u, v, data):
+            if (u, v) in cerradas:
+                return None
+            if modificar and u == producto_en_ruta and grafo.nodes[v].get('tipo') == 'Capital':
+                # Igual que _crear_grafo_para_dijkstra_optimo: solo la arista legítima, con el precio final
+                return precio_final if v == capital_origen_nombre else None
+            return data.get('peso', 0)
+
+        inicio = time.perf_counter()
+        with metricas.etapa("alcanzabilidad"):
+            nodos = self._nodos_relevantes(origen, destino)
+        with metricas.etapa("rutas_alternativas"):
+            rutas = k_rutas_mas_cortas(construir_adyacencia(grafo, nodos, peso), origen, destino, k)
+
+        return {
+            "origen": origen,
+            "destino": destino,
+            "k": k,
+            "aristas_cerradas": [list(a) for a in sorted(cerradas)],
+            "total_rutas": len(rutas),
+            "rutas": [
+                {
+                    "posicion": i + 1,
+                    "costo": round(costo, 2),
+                    "ruta": ruta,
+                    "ruta_geografica": self._traducir_ruta_geografica(ruta),
+                    "tramos": [{"desde": u, "hacia": v, "peso": round(peso(u, v, grafo[u][v]), 2)}
+                               for u, v in zip(ruta, ruta[1:])],
+                }
+                for i, (costo, ruta) in enumerate(rutas)
+            ],
+            "mensaje": None if rutas else "No se encontró un camino entre los nodos.",
+            "tiempo_ms": round((time.perf_counter() - inicio) * 1000, 4),
+        }
+
+    @_con_instantanea
+    def proveedores_mas_baratos(self, mercado: str, producto: str, k: int = 10, criterio: str = 'dijkstra'):
+        """
+        Las k Asociaciones que venden `producto` y lo llevan más barato a
+        `mercado`, con una sola búsqueda inversa en vez de un ruta-optima por
+        asociación: Dijkstra desde el Mercado por las aristas entrantes de la red
+        troncal (Capital -> Capital -> Mercado) da el costo de cada Capital al
+        Mercado, y a cada proveedor se le suma su arista legítima Producto ->
+        Capital (la de su departamento, con el descuento vigente) y la arista
+        vende. Mismos costos que ruta-optima: criterio "dijkstra" usa el precio
+        final y "bellman_ford" el ahorro como peso negativo. El peso negativo
+        solo puede estar en esa primera arista, así que Dijkstra sobre la
+        troncal basta también para bellman_ford.
+        """
+        grafo = self.grafo
+        if criterio not in ('dijkstra', 'bellman_ford'):
+            return {"error": "criterio debe ser 'dijkstra' o 'bellman_ford'"}
+        for nodo, tipo in ((mercado, 'Mercado'), (producto, 'Producto')):
+            if nodo not in grafo:
+                return {"error": "Nodo no encontrado", "mensaje": f"'{nodo}' no existe en el grafo.", "estado": "no_encontrado"}
+            if grafo.nodes[nodo].get('tipo') != tipo:
+                return {"error": f"'{nodo}' no es un {tipo}"}
+
+        inicio = time.perf_counter()
+        with metricas.etapa("busqueda_inversa"):
+            troncal = grafo.subgraph([*self.instantanea.alcanzabilidad["capitales"], mercado])
+            costo_capital, caminos = nx.single_source_dijkstra(troncal.reverse(copy=False), mercado, weight='peso')
+
+        info_descuento = self.descuentos_activos.get(producto) or {}
+        precio_final = info_descuento.get('precio_final')
+        precio_original = info_descuento.get('precio_original')
+        if criterio == 'dijkstra':
+            peso_legitimo = precio_final
+        else:
+            peso_legitimo = -(precio_original - precio_final) if precio_final is not None and precio_original is not None else 0
+
+        candidatos = []
+        total = 0
+        with metricas.etapa("proveedores"):
+            for asociacion in grafo.predecessors(producto):
+                if grafo.nodes[asociacion].get('tipo') != 'Asociacion':
+                    continue
+                total += 1
+                capital = grafo.nodes[asociacion].get('departamento')
+                if capital is None:
+                    # Sin departamento ruta-optima no modifica el grafo: cualquier Capital al precio sin descuento
+                    opciones = [(grafo[producto][c].get('peso', 0) + costo_capital[c], c)
+                                for c in grafo.successors(producto) if c in costo_capital and c != mercado]
+                elif peso_legitimo is not None and capital in costo_capital and grafo.has_edge(producto, capital):
+                    opciones = [(peso_legitimo + costo_capital[capital], capital)]
+                else:
+                    continue
+                if opciones:
+                    costo, capital = min(opciones)
+                    candidatos.append((costo + grafo[asociacion][producto].get('peso', 0), asociacion, capital))
+            mejores = heapq.nsmallest(k, candidatos)
+
+        proveedores = []
+        for i, (costo, asociacion, capital) in enumerate(mejores):
+            ruta = [asociacion, producto, *reversed(caminos[capital])]
+            proveedores.append({
+                "posicion": i + 1,
+                "asociacion": asociacion,
+                "departamento": grafo.nodes[asociacion].get('departamento'),
+                "costo": round(costo, 2),
+                "ruta": ruta,
+                "ruta_geografica": self._traducir_ruta_geografica(ruta),
+            })
+        return {
+            "mercado": mercado,
+            "producto": producto,
+            "criterio": criterio,
+            "descuento": info_descuento.get('descuento_texto'),
+            "asociaciones_que_venden": total,
+            "asociaciones_con_ruta": len(candidatos),
+            "proveedores": proveedores,
+            "mensaje": None if proveedores else "Ninguna asociación que venda el producto llega al mercado.",
+            "tiempo_ms": round((time.perf_counter() - inicio) * 1000, 4),
+        }
+
+    def _crear_grafo_para_dijkstra_optimo(self, origen: str, destino: str, completo: bool = False):
         """
         Crea un grafo modificado para Dijkstra.
         Aplica el precio final POSITIVO (con descuento) como peso de la arista, 
         eliminando la necesidad de pesos negativos para encontrar la ruta óptima.
+        Con `completo` parte de todo el grafo (referencia del modo sombra).
         """
-        grafo_temp = self.grafo.copy()
+        grafo_temp = self.grafo.copy() if completo else self._subgrafo_de_consulta(origen, destino)
 
         producto_en_ruta = None
         capital_origen_nombre = self.grafo.nodes[origen].get('departamento')
@@ -607,6 +1722,7 @@ class AlgoritmosService:
                         
         return grafo_temp
     
+    @_con_instantanea
     def metricas_grafo(self):
         return {
             "total_nodos": self.grafo.number_of_nodes(),
@@ -615,6 +1731,7 @@ class AlgoritmosService:
             "productos_con_descuento": len([p for p in self.descuentos_activos if self.descuentos_activos[p]['precio_original']])
         }
         
+    @_con_instantanea
     def arbol_expansion_minima_kruskal(self):
         """
         [MST/Kruskal] Calcula el costo total mínimo para conectar a TODOS los nodos del grafo 
@@ -0,0 +1,207 @@
+import sys
+import time
+from array import array
+
+# Atributos de nodo que se guardan por columnas (codificados con diccionario)
+COLUMNAS = ("tipo", "departamento", "provincia", "distrito", "ubigeo")
+
+
+class _Columna:
+    """Columna categórica: un código entero pequeño por nodo y la tabla de valores (código 0 = ausente)."""
+
+    __slots__ = ("codigos", "valores", "_codigo")
+
+    def __init__(self):
+        self.codigos = array("H")
+        self.valores = [None]
+        self._codigo = {None: 0}
+
+    def agregar(self, valor):
+        """Añade el valor del siguiente nodo y devuelve la instancia compartida de la tabla."""
+        codigo = self._codificar(valor)
+        self.codigos.append(codigo)
+        return self.valores[codigo]
+
+    def fijar(self, i, valor):
+        """Cambia el valor del nodo i (deltas) y devuelve la instancia compartida."""
+        codigo = self._codificar(valor)
+        self.codigos[i] = codigo
+        return self.valores[codigo]
+
+    def _codificar(self, valor):
+        codigo = self._codigo.get(valor)
+        if codigo is None:
+            if isinstance(valor, str):
+                valor = sys.intern(valor)
+            codigo = self._codigo[valor] = len(self.valores)
+            self.valores.append(valor)
+            if codigo > 0xFFFF and self.codigos.typecode == "H":
+                self.codigos = array("I", self.codigos)
+        return codigo
+
+    def copiar(self):
+        copia = _Columna()
+        copia.codigos = array(self.codigos.typecode, self.codigos)
+        copia.valores = list(self.valores)
+        copia._codigo = dict(self._codigo)
+        return copia
+
+    def __getitem__(self, i):
+        return self.valores[self.codigos[i]]
+
+    def bytes(self):
+        return (self.codigos.buffer_info()[1] * self.codigos.itemsize + sys.getsizeof(self.valores)
+                + sum(sys.getsizeof(v) for v in self.valores[1:]))
+
+
+class VistaNodo:
+    """Acceso de solo lectura a los atributos de un nodo del almacén (sin dict por nodo)."""
+
+    __slots__ = ("_almacen", "_columnas", "indice")
+
+    def __init__(self, almacen, indice):
+        self._almacen = almacen
+        self._columnas = almacen.columnas
+        self.indice = indice
+
+    @property
+    def id(self):
+        return self._almacen.nodos[self.indice]
+
+    def get(self, atributo, defecto=None):
+        columna = self._columnas.get(atributo)
+        if columna is None:
+            return defecto
+        valor = columna.valores[columna.codigos[self.indice]]
+        return defecto if valor is None else valor
+
+    def __getitem__(self, atributo):
+        valor = self.get(atributo)
+        if valor is None:
+            raise KeyError(atributo)
+        return valor
+
+
+class AlmacenAtributos:
+    """
+    Atributos de nodo por columnas, indexados por un índice denso de nodo.
+    Los atributos categóricos (tipo, departamento, provincia, distrito, ubigeo)
+    se repiten miles de veces; aquí cada nodo guarda un código de 2 bytes por
+    columna y cada valor distinto existe una sola vez en la tabla. Al construirlo
+    desde el grafo, los dicts de nodo (y la relación de las aristas) pasan a
+    apuntar a esas mismas cadenas, así que no quedan copias repetidas en memoria.
+    """
+
+    def __init__(self):
+        self.nodos = []
+        self._indice = {}
+        self.columnas = {nombre: _Columna() for nombre in COLUMNAS}
+        self.reporte = {}
+
+    @classmethod
+    def desde_grafo(cls, grafo, compactar: bool = True):
+        inicio = time.perf_counter()
+        antes = _bytes_atributos(grafo)
+        almacen = cls()
+        for nodo, data in grafo.nodes(data=True):
+            almacen.agregar_nodo(nodo, data, compactar)
+        if compactar:
+            relaciones = {}
+            for _, _, data in grafo.edges(data=True):
+                relacion = data.get("relacion")
+                if isinstance(relacion, str):
+                    data["relacion"] = relaciones.setdefault(relacion, sys.intern(relacion))
+        despues = _bytes_atributos(grafo)
+        almacen.reporte = {
+            "nodos": len(almacen.nodos),
+            "antes": antes,
+            "despues": despues,
+            "almacen_columnar_bytes": almacen.bytes(),
+            "ahorro_bytes": antes["total_bytes"] - despues["total_bytes"],
+            "valores_distintos": {nombre: len(c.valores) - 1 for nombre, c in almacen.columnas.items()},
+        }
+        print(f"🗃️  Atributos por columnas: {len(almacen.nodos)} nodos, "
+              f"{antes['total_bytes'] / 1e6:.2f} MB -> {despues['total_bytes'] / 1e6:.2f} MB en el grafo "
+              f"+ {almacen.bytes() / 1e6:.2f} MB columnares ({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+        return almacen
+
+    def agregar_nodo(self, nodo, data: dict, compactar: bool = False):
+        """Registra un nodo nuevo; con `compactar`, su dict reutiliza las cadenas de la tabla."""
+        if nodo in self._indice:
+            raise ValueError(f"El nodo {nodo} ya está en el almacén")
+        self._indice[nodo] = len(self.nodos)
+        self.nodos.append(nodo)
+        for nombre, columna in self.columnas.items():
+            valor = columna.agregar(data.get(nombre))
+            if compactar and valor is not None:
+                data[nombre] = valor
+        return self._indice[nodo]
+
+    def con_cambios(self, grafo, nodos):
+        """
+        Copia del almacén con los nodos indicados agregados o actualizados desde
+        `grafo` (ingesta de deltas). El almacén de la versión anterior no cambia.
+        """
+        copia = AlmacenAtributos()
+        copia.nodos = list(self.nodos)
+        copia._indice = dict(self._indice)
+        copia.columnas = {nombre: columna.copiar() for nombre, columna in self.columnas.items()}
+        for nodo in nodos:
+            data = grafo.nodes[nodo]
+            indice = copia._indice.get(nodo)
+            if indice is None:
+                copia.agregar_nodo(nodo, data, compactar=True)
+                continue
+            for nombre, columna in copia.columnas.items():
+                valor = columna.fijar(indice, data.get(nombre))
+                if valor is not None:
+                    data[nombre] = valor
+        copia.reporte = {**self.reporte, "nodos": len(copia.nodos)}
+        return copia
+
+    def __contains__(self, nodo):
+        return nodo in self._indice
+
+    def __len__(self):
+        return len(self.nodos)
+
+    def vista(self, nodo):
+        """VistaNodo del nodo, o None si no existe."""
+        indice = self._indice.get(nodo)
+        return None if indice is None else VistaNodo(self, indice)
+
+    def valor(self, nodo, atributo, defecto=None):
+        indice = self._indice.get(nodo)
+        if indice is None:
+            return defecto
+        valor = self.columnas[atributo][indice]
+        return defecto if valor is None else valor
+
+    def bytes(self):
+        return (sys.getsizeof(self._indice) + sys.getsizeof(self.nodos)
+                + sum(c.bytes() for c in self.columnas.values()))
+
+
+def _bytes_atributos(grafo):
+    """Bytes de los dicts de atributos del grafo y de los objetos distintos que referencian."""
+    vistos = set()
+
+    def medir(dicts):
+        total = 0
+        for data in dicts:
+            total += sys.getsizeof(data)
+            for clave, valor in data.items():
+                for objeto in (clave, valor):
+                    if id(objeto) not in vistos:
+                        vistos.add(id(objeto))
+                        total += sys.getsizeof(objeto)
+        return total
+
+    nodos = medir(data for _, data in grafo.nodes(data=True))
+    aristas = medir(data for _, _, data in grafo.edges(data=True))
+    return {
+        "nodos_bytes": nodos,
+        "aristas_bytes": aristas,
+        "total_bytes": nodos + aristas,
+        "objetos_distintos": len(vistos),
+    }
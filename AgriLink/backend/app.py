@@ -1,12 +1,174 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, send_from_directory
 from flask_cors import CORS
 # Asegúrate de que estos archivos estén disponibles en tu entorno
+import config
 from agricultor_service import agricultor_service 
 from algoritmos_service import algoritmos_service 
+from instrumentacion import metricas
+from perfilador import perfilador
 
 app = Flask(__name__)
+app.config["MAX_CONTENT_LENGTH"] = int(config.MAX_CUERPO_MB * 1024 * 1024)
 CORS(app)
 
+# =========================================================================
+# INSTRUMENTACIÓN (latencia por endpoint, etapas y peticiones en curso)
+# =========================================================================
+@app.before_request
+def iniciar_medicion():
+    metricas.iniciar_peticion()
+
+@app.after_request
+def finalizar_medicion(respuesta):
+    endpoint = request.url_rule.rule if request.url_rule else "desconocido"
+    etapas = metricas.finalizar_peticion(endpoint, request.method, respuesta.status_code)
+    if etapas:
+        # Las etapas de la petición se exponen también en la cabecera estándar Server-Timing
+        respuesta.headers["Server-Timing"] = ", ".join(
+            f"{nombre};dur={duracion * 1000:.3f}" for nombre, duracion in etapas
+        )
+    return respuesta
+
+@app.teardown_request
+def cerrar_medicion(_error=None):
+    metricas.cerrar_peticion()
+
+# =========================================================================
+# INSTANTÁNEA DEL GRAFO (cada petición trabaja sobre una única versión)
+# =========================================================================
+@app.before_request
+def fijar_instantanea():
+    algoritmos_service.fijar_instantanea()
+
+@app.teardown_request
+def soltar_instantanea(_error=None):
+    algoritmos_service.soltar_instantanea()
+
+@app.route('/api/admin/grafo/recargar', methods=['POST'])
+def recargar_grafo():
+    """Relee el GraphML en segundo plano y publica la nueva versión sin reiniciar. Cuerpo opcional: {"esperar": true}"""
+    datos = request.get_json(silent=True) or {}
+    estado = algoritmos_service.recargar_grafo(esperar=bool(datos.get('esperar', False)))
+    if estado.get('estado') == 'error':
+        return jsonify(estado), 500
+    return jsonify(estado), 200 if estado.get('estado') == 'completada' else 202
+
+@app.route('/api/admin/grafo/estado', methods=['GET'])
+def estado_grafo():
+    return jsonify(algoritmos_service.estado_recarga())
+
+@app.route('/api/admin/grafo/memoria', methods=['GET'])
+def memoria_grafo():
+    """Memoria de los atributos del grafo antes/después del almacén por columnas."""
+    return jsonify(algoritmos_service.reporte_memoria())
+
+@app.route('/api/admin/grafo/deltas', methods=['POST'])
+def ingerir_deltas():
+    """Aplica filas nuevas o modificadas (columnas de panda.py) al grafo servido y las anota en el registro de deltas."""
+    datos = request.get_json(silent=True) or {}
+    filas = datos.get('filas')
+    if not isinstance(filas, list) or not filas:
+        return jsonify({"error": "Envíe 'filas': [{\"tipo\": \"asociacion|mercado|precio\", \"fila\": {...}}]"}), 400
+    resultado = algoritmos_service.ingerir_filas(filas)
+    if "error" in resultado:
+        codigos = {"no_disponible": 503, "conflicto": 409}
+        return jsonify(resultado), codigos.get(resultado.get("estado"), 400)
+    return jsonify(resultado)
+
+@app.route('/api/admin/grafo/compactar', methods=['POST'])
+def compactar_deltas():
+    """Reescribe el GraphML con los deltas ingeridos y reinicia el registro."""
+    resultado = algoritmos_service.compactar_deltas()
+    if "error" in resultado:
+        return jsonify(resultado), 409 if resultado.get("estado") == "conflicto" else 503
+    return jsonify(resultado)
+
+@app.route('/api/admin/descuentos/regenerar', methods=['POST'])
+def regenerar_descuentos():
+    """Sortea descuentos nuevos en la tabla compartida; los demás workers los toman en su próximo sondeo."""
+    return jsonify(algoritmos_service.regenerar_descuentos())
+
+@app.route('/api/admin/shards', methods=['GET'])
+def estado_shards():
+    """Partición regional, versión cargada y memoria (RSS) de cada proceso shard."""
+    estado = algoritmos_service.estado_shards()
+    return jsonify(estado), 503 if estado.get("estado") == "no_disponible" else 200
+
+@app.route('/api/admin/sombra', methods=['GET'])
+def estado_sombra():
+    """Comparaciones del modo sombra por motor (coincide/empate/difiere/error) y últimas discrepancias."""
+    return jsonify(algoritmos_service.estado_sombra())
+
+@app.route('/api/admin/sombra', methods=['POST'])
+def configurar_sombra():
+    """Ajusta el modo sombra de este worker. Cuerpo: {"proporcion": 0.05, "tolerancia": 0.01}"""
+    datos = request.get_json(silent=True) or {}
+    try:
+        proporcion = float(datos['proporcion']) if datos.get('proporcion') is not None else None
+        tolerancia = float(datos['tolerancia']) if datos.get('tolerancia') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "proporcion y tolerancia deben ser números"}), 400
+    if proporcion is not None and not 0 <= proporcion <= 1:
+        return jsonify({"error": "proporcion debe estar entre 0 y 1"}), 400
+    if tolerancia is not None and tolerancia < 0:
+        return jsonify({"error": "tolerancia no puede ser negativa"}), 400
+    return jsonify(algoritmos_service.configurar_sombra(proporcion, tolerancia))
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Exporta las métricas en formato de texto de Prometheus."""
+    return Response(metricas.exportar_prometheus(), mimetype="text/plain; version=0.0.4")
+
+# =========================================================================
+# PERFILADO BAJO DEMANDA (AGRILINK_PERFILADO=1 + cabecera X-Perfilar: 1)
+# =========================================================================
+@app.before_request
+def iniciar_perfilado():
+    if perfilador.debe_perfilar(request.headers, request.args):
+        g.perfil = perfilador.iniciar()
+
+@app.after_request
+def finalizar_perfilado(respuesta):
+    perfil = g.pop("perfil", None)
+    if perfil is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "desconocido"
+        archivo, resumen = perfilador.finalizar(perfil, endpoint)
+        respuesta.headers["X-Perfil-Archivo"] = archivo
+        respuesta.headers["X-Perfil-Top"] = perfilador.formatear_cabecera(resumen)
+    return respuesta
+
+@app.route('/api/admin/perfiles', methods=['GET'])
+def listar_perfiles():
+    """Lista los perfiles guardados (.pstats deterministas y .folded de muestreo)."""
+    if not perfilador.habilitado:
+        return jsonify({"error": "Perfilado deshabilitado (AGRILINK_PERFILADO=1)"}), 404
+    return jsonify({"directorio": perfilador.directorio, "perfiles": perfilador.listar()})
+
+@app.route('/api/admin/perfiles/<nombre>', methods=['GET'])
+def descargar_perfil(nombre):
+    if not perfilador.habilitado:
+        return jsonify({"error": "Perfilado deshabilitado (AGRILINK_PERFILADO=1)"}), 404
+    return send_from_directory(perfilador.directorio, nombre, as_attachment=True)
+
+@app.route('/api/admin/perfiles/muestreo', methods=['POST'])
+def iniciar_muestreo():
+    """Muestrea las pilas de todos los hilos durante una ventana de tiempo. Cuerpo: {"segundos": 10, "intervalo_ms": 5}"""
+    if not perfilador.habilitado:
+        return jsonify({"error": "Perfilado deshabilitado (AGRILINK_PERFILADO=1)"}), 404
+    datos = request.get_json(silent=True) or {}
+    try:
+        segundos = float(datos.get('segundos', 10))
+        intervalo_ms = float(datos.get('intervalo_ms', 5))
+    except (TypeError, ValueError):
+        return jsonify({"error": "'segundos' e 'intervalo_ms' deben ser números"}), 400
+    if not (0 < segundos < float('inf') and 0 < intervalo_ms < float('inf')):
+        return jsonify({"error": "'segundos' e 'intervalo_ms' deben ser positivos"}), 400
+    segundos = min(segundos, 300)
+    archivo = perfilador.iniciar_muestreo(segundos, intervalo_ms)
+    if archivo is None:
+        return jsonify({"error": "Ya hay un muestreo en curso"}), 409
+    return jsonify({"mensaje": f"Muestreo iniciado por {segundos} s", "archivo": archivo}), 202
+
 # HEALTH CHECK
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -70,9 +232,18 @@ def update_agricultor(agricultor_id):
     agricultor = agricultor_service.actualizar_agricultor(agricultor_id, request.json)
     return jsonify(agricultor) if agricultor else (jsonify({"error": "No encontrado"}), 404)
 
+@app.route('/api/agricultores/<int:agricultor_id>/resumen', methods=['GET'])
+def get_resumen_agricultor(agricultor_id):
+    """Panel del agricultor: rating promedio, pedidos por estado, ingresos y unidades vendidas."""
+    resumen = agricultor_service.obtener_resumen_agricultor(agricultor_id)
+    return jsonify(resumen) if resumen else (jsonify({"error": "No encontrado"}), 404)
+
 @app.route('/api/agricultores', methods=['POST'])
 def crear_agricultor():
-    agricultor = agricultor_service.crear_agricultor(request.json)
+    datos = request.get_json(silent=True)
+    if not isinstance(datos, dict):
+        return jsonify({"error": "Envíe el agricultor como un objeto JSON."}), 400
+    agricultor = agricultor_service.crear_agricultor(datos)
     return jsonify(agricultor), 201
 
 # =========================================================================
@@ -80,16 +251,81 @@ def crear_agricultor():
 # =========================================================================
 @app.route('/api/productos', methods=['GET'])
 def get_productos():
-    return jsonify(agricultor_service.obtener_productos())
+    activo = request.args.get('activo')
+    return jsonify(agricultor_service.obtener_productos(
+        agricultor_id=request.args.get('agricultor_id', type=int),
+        categoria=request.args.get('categoria'),
+        activo=None if activo is None else activo.lower() in ('1', 'true', 'si', 'sí'),
+    ))
 
 @app.route('/api/pedidos/agricultor/<int:agricultor_id>', methods=['GET'])
 def get_pedidos_agricultor(agricultor_id):
-    return jsonify(agricultor_service.obtener_pedidos_agricultor(agricultor_id))
+    return jsonify(agricultor_service.obtener_pedidos_agricultor(agricultor_id, request.args.get('estado')))
 
 @app.route('/api/resenas/agricultor/<int:agricultor_id>', methods=['GET'])
 def get_resenas_agricultor(agricultor_id):
     return jsonify(agricultor_service.obtener_resenas_agricultor(agricultor_id))
 
+@app.route('/api/resenas', methods=['POST'])
+def crear_resena():
+    datos = request.get_json(silent=True)
+    if not isinstance(datos, dict):
+        return jsonify({"error": "Envíe la reseña como JSON."}), 400
+    resena = agricultor_service.crear_resena(datos)
+    if "error" in resena:
+        return jsonify(resena), 404 if resena["motivo"] == "no_encontrado" else 400
+    return jsonify(resena), 201
+
+@app.route('/api/pedidos', methods=['POST'])
+def crear_pedidos():
+    """
+    Un pedido: {"cliente": "...", "productos": [{"producto_id": 1, "cantidad": 2}]}
+    Un lote:   {"pedidos": [pedido, pedido, ...]} (cada pedido se acepta o rechaza entero)
+    Cada pedido admite "clave_idempotencia" (o la cabecera Idempotency-Key en un pedido
+    suelto): reintentar con la misma clave devuelve el pedido ya creado.
+    """
+    datos = request.json
+    if not isinstance(datos, dict):
+        return jsonify({"error": "Envíe un pedido o {\"pedidos\": [...]} como JSON."}), 400
+    lote = datos.get('pedidos')
+    if lote is not None and not isinstance(lote, list):
+        return jsonify({"error": "'pedidos' debe ser una lista"}), 400
+    if lote is None and request.headers.get('Idempotency-Key') and not datos.get('clave_idempotencia'):
+        datos = {**datos, "clave_idempotencia": request.headers['Idempotency-Key']}
+    resultados = agricultor_service.crear_pedidos(lote if lote is not None else [datos])
+
+    if lote is None:
+        resultado = resultados[0]
+        codigos = {"invalido": 400, "no_encontrado": 404, "stock_insuficiente": 409, "en_proceso": 202}
+        return jsonify(resultado), codigos.get(resultado.get("motivo"), 200 if resultado.get("repetido") else 201)
+    en_proceso = sum(1 for r in resultados if r.get("motivo") == "en_proceso")
+    repetidos = sum(1 for r in resultados if r.get("repetido"))
+    creados = sum(1 for r in resultados if "error" not in r and "motivo" not in r) - repetidos
+    cuerpo = {"creados": creados, "repetidos": repetidos, "rechazados": len(resultados) - creados - repetidos - en_proceso,
+              "en_proceso": en_proceso, "resultados": resultados}
+    if en_proceso:
+        return jsonify(cuerpo), 202
+    return jsonify(cuerpo), 201 if creados + repetidos == len(resultados) else 207
+
+@app.route('/api/pedidos/clave/<clave>', methods=['GET'])
+def get_pedido_por_clave(clave):
+    """Pedido registrado con esa clave_idempotencia (p. ej. después de un 202)."""
+    pedido = agricultor_service.obtener_pedido_por_clave(clave)
+    return jsonify(pedido) if pedido else (jsonify({"error": "No hay pedido con esa clave (rechazado o aún en proceso)"}), 404)
+
+@app.route('/api/pedidos/<int:pedido_id>/estado', methods=['PUT'])
+def actualizar_estado_pedido(pedido_id):
+    estado = (request.json or {}).get('estado')
+    if not estado:
+        return jsonify({"error": "Falta 'estado' en el cuerpo de la solicitud JSON."}), 400
+    pedido = agricultor_service.actualizar_estado_pedido(pedido_id, estado)
+    if pedido is None:
+        return jsonify({"error": "No encontrado"}), 404
+    if "error" in pedido:
+        codigos = {"invalido": 400, "no_encontrado": 404, "stock_insuficiente": 409}
+        return jsonify(pedido), codigos.get(pedido.get("motivo"), 400)
+    return jsonify(pedido)
+
 
 # =========================================================================
 # 3. ENDPOINTS DE ALGORITMOS (GRAFO Y COMPARACIÓN)
@@ -124,16 +360,175 @@ def get_ruta_optima_comparada():
             
         return jsonify(resultado)
 
+    except TimeoutError as e:
+        # Otra petición idéntica está calculando la misma ruta y no terminó a tiempo
+        return jsonify({"error": "Tiempo de espera agotado", "detalle": str(e)}), 504
     except Exception as e:
         # Manejo de cualquier error inesperado en el servidor
         print(f"Error al procesar la ruta óptima: {e}")
         return jsonify({"error": "Error interno del servidor", "detalle": str(e)}), 500
 
+@app.route('/api/algoritmos/matriz-costos', methods=['GET'])
+def get_costo_precalculado():
+    """Costo Asociación -> Mercado desde la matriz precalculada. Parámetros: origen, destino, criterio."""
+    origen = request.args.get('origen')
+    destino = request.args.get('destino')
+    if not origen or not destino:
+        return jsonify({"error": "Faltan los parámetros 'origen' y 'destino'"}), 400
+    resultado = algoritmos_service.costo_precalculado(origen, destino, request.args.get('criterio', 'dijkstra'))
+    if resultado.get("estado") == "no_disponible":
+        return jsonify(resultado), 503
+    if "error" in resultado:
+        return jsonify(resultado), 400
+    return jsonify(resultado)
+
+@app.route('/api/algoritmos/proveedores-mas-baratos', methods=['GET'])
+def get_proveedores_mas_baratos():
+    """Asociaciones que llevan un producto más barato a un Mercado. Parámetros: mercado, producto, k, criterio."""
+    mercado = request.args.get('mercado')
+    producto = request.args.get('producto')
+    if not mercado or not producto:
+        return jsonify({"error": "Faltan los parámetros 'mercado' y 'producto'"}), 400
+    k = request.args.get('k', 10, type=int)
+    if not 1 <= k <= 100:
+        return jsonify({"error": "'k' debe estar entre 1 y 100"}), 400
+    resultado = algoritmos_service.proveedores_mas_baratos(mercado, producto, k, request.args.get('criterio', 'dijkstra'))
+    if resultado.get("estado") == "no_encontrado":
+        return jsonify(resultado), 404
+    if "error" in resultado:
+        return jsonify(resultado), 400
+    return jsonify(resultado)
+
+@app.route('/api/algoritmos/rutas-alternativas', methods=['POST'])
+def get_rutas_alternativas():
+    """
+    Las k rutas más baratas entre dos nodos, opcionalmente con tramos cerrados.
+    
+    Espera un cuerpo JSON: {"origen": "A", "destino": "B", "k": 5, "aristas_cerradas": [["LIMA", "ICA"]]}
+    """
+    datos = request.get_json(silent=True) or {}
+    origen = datos.get('origen')
+    destino = datos.get('destino')
+    if not origen or not destino:
+        return jsonify({"error": "Faltan 'origen' o 'destino' en el cuerpo de la solicitud JSON."}), 400
+    try:
+        k = int(datos.get('k', 5))
+        aristas_cerradas = [(str(u), str(v)) for u, v in datos.get('aristas_cerradas', [])]
+    except (TypeError, ValueError):
+        return jsonify({"error": "'k' debe ser entero y 'aristas_cerradas' una lista de pares [desde, hacia]"}), 400
+    if not 1 <= k <= 20:
+        return jsonify({"error": "'k' debe estar entre 1 y 20"}), 400
+
+    resultado = algoritmos_service.rutas_alternativas(origen, destino, k=k, aristas_cerradas=aristas_cerradas)
+    if resultado.get("error") == "Nodo no encontrado":
+        return jsonify(resultado), 404
+    if "error" in resultado:
+        return jsonify(resultado), 400
+    return jsonify(resultado)
+
+@app.route('/api/algoritmos/escenarios-descuento', methods=['POST'])
+def get_escenarios_descuento():
+    """
+    Distribución del costo de ruta bajo miles de escenarios aleatorios de descuento.
+    
+    Espera un cuerpo JSON: {"origenes": [...], "destinos": [...], "escenarios": 10000,
+    "semilla": 42, "cuantiles": [0.05, 0.5, 0.95], "criterio": "dijkstra" | "bellman_ford"}
+    """
+    datos = request.get_json(silent=True) or {}
+    origenes = datos.get('origenes') or ([datos['origen']] if datos.get('origen') else [])
+    destinos = datos.get('destinos') or ([datos['destino']] if datos.get('destino') else [])
+    try:
+        escenarios = int(datos.get('escenarios', 10000))
+        cuantiles = [float(q) for q in datos.get('cuantiles', [0.05, 0.5, 0.95])]
+    except (TypeError, ValueError):
+        return jsonify({"error": "'escenarios' debe ser entero y 'cuantiles' una lista de números"}), 400
+    if not all(0 <= q <= 1 for q in cuantiles):
+        return jsonify({"error": "Los cuantiles deben estar entre 0 y 1"}), 400
+    if not all(isinstance(nodos, list) and all(isinstance(n, str) for n in nodos) for nodos in (origenes, destinos)):
+        return jsonify({"error": "'origenes' y 'destinos' deben ser listas de ids de nodo (texto)"}), 400
+    semilla = datos.get('semilla')
+    if semilla is not None and (isinstance(semilla, bool) or not isinstance(semilla, int) or semilla < 0):
+        return jsonify({"error": "'semilla' debe ser un entero no negativo"}), 400
+
+    resultado = algoritmos_service.escenarios_descuento(
+        origenes, destinos, escenarios=escenarios, semilla=semilla,
+        cuantiles=cuantiles, criterio=datos.get('criterio', 'dijkstra'),
+    )
+    if "error" in resultado:
+        return jsonify(resultado), 400
+    return jsonify(resultado)
+
+@app.route('/api/algoritmos/plan-distribucion', methods=['POST'])
+def get_plan_distribucion():
+    """
+    Plan de distribución de temporada: un único flujo de costo mínimo en lugar de N rutas independientes.
+    
+    Espera un cuerpo JSON: {"ofertas": {"ID_ASOCIACION": 120}, "demandas": {"ID_MERCADO": 80},
+    "capacidades": [["LIMA", "ICA", 500]], "plan_base": "PLAN_ID_ANTERIOR", "limite_envios": 1000}
+    """
+    datos = request.get_json(silent=True) or {}
+    try:
+        capacidades = [(str(u), str(v), c) for u, v, c in datos.get('capacidades', [])]
+        limite_envios = max(0, int(datos.get('limite_envios', 1000)))
+    except (TypeError, ValueError):
+        return jsonify({"error": "'capacidades' debe ser una lista de [desde, hacia, capacidad] y 'limite_envios' un entero"}), 400
+
+    resultado = algoritmos_service.plan_distribucion(
+        datos.get('ofertas') or {}, datos.get('demandas') or {}, capacidades,
+        plan_base=datos.get('plan_base'), limite_envios=limite_envios,
+    )
+    if "error" in resultado:
+        return jsonify(resultado), 400
+    return jsonify(resultado)
+
+@app.route('/api/algoritmos/ruta-regional', methods=['POST'])
+def get_ruta_regional():
+    """
+    Ruta óptima calculada por los shards regionales (requiere AGRILINK_SHARDS).
+    
+    Espera un cuerpo JSON: {"origen": "ID_ASOCIACION_O_CAPITAL", "destino": "ID_MERCADO_O_CAPITAL"}
+    """
+    datos = request.get_json(silent=True) or {}
+    origen = datos.get('origen')
+    destino = datos.get('destino')
+    if not origen or not destino:
+        return jsonify({"error": "Faltan 'origen' o 'destino' en el cuerpo de la solicitud JSON."}), 400
+    resultado = algoritmos_service.ruta_regional(origen, destino)
+    if resultado.get("estado") in ("no_disponible", "version_obsoleta"):
+        return jsonify(resultado), 503
+    if resultado.get("error") == "Nodo no encontrado":
+        return jsonify(resultado), 404
+    if "error" in resultado:
+        return jsonify(resultado), 400
+    return jsonify(resultado)
+
 @app.route('/api/algoritmos/productos-relacionados/<producto>', methods=['GET'])
 def get_productos_relacionados(producto):
     """Obtiene información de descuento y productos relacionados en el grafo."""
     return jsonify(algoritmos_service.productos_relacionados(producto))
 
+@app.route('/api/algoritmos/buscar', methods=['GET'])
+def buscar_nodos():
+    """Autocompletado de nodos: /api/algoritmos/buscar?q=plat&tipo=Producto&limite=10"""
+    consulta = request.args.get('q', '')
+    if not consulta.strip():
+        return jsonify({"error": "Falta el parámetro 'q'"}), 400
+    limite = max(1, min(request.args.get('limite', 10, type=int), 100))
+    return jsonify(algoritmos_service.buscar_nodos(consulta, tipo=request.args.get('tipo'), limite=limite))
+
+@app.route('/api/algoritmos/region/<ubigeo>', methods=['GET'])
+def get_nodos_por_region(ubigeo):
+    """Nodos de una región por prefijo de ubigeo: /api/algoritmos/region/0801?tipo=Asociacion&limite=50"""
+    resultado = algoritmos_service.nodos_por_region(
+        ubigeo,
+        tipo=request.args.get('tipo'),
+        desplazamiento=max(0, request.args.get('desplazamiento', 0, type=int)),
+        limite=max(1, min(request.args.get('limite', 100, type=int), 1000)),
+    )
+    if "error" in resultado:
+        return jsonify(resultado), 400
+    return jsonify(resultado)
+
 @app.route('/api/algoritmos/explorar-nodo/<nodo>', methods=['GET'])
 def explorar_nodo(nodo):
     """Muestra los nodos y aristas salientes de un nodo específico."""
@@ -0,0 +1,229 @@
+"""
+Modo de servicio asíncrono (ASGI) con los mismos endpoints que app.py:
+
+    uvicorn asgi:app --port 5000 --workers 2
+
+Cada petición la resuelve la app Flask, pero en uno de dos sitios:
+  - lecturas baratas que solo tocan memoria (explorar-nodo, búsqueda,
+    regiones, métricas, ruta-optima ya en caché, matriz-costos ya abierta, y
+    agricultores/productos solo con AGRILINK_BACKEND_DATOS=memoria) en el
+    mismo event loop: cuestan micro o milisegundos y no compensan un salto de
+    hilo. Nada que lea disco (SQLite, archivos) corre en el loop: una lectura
+    lenta lo frenaría para todas las conexiones;
+  - el resto (búsquedas en el grafo y escrituras) en un pool de hilos acotado
+    (AGRILINK_ASGI_HILOS). Si ya hay AGRILINK_ASGI_COLA peticiones en el pool
+    (en curso o esperando) se responde 429 con Retry-After en lugar de encolar
+    sin límite, y cada petición tiene un tiempo máximo (AGRILINK_ASGI_TIMEOUT,
+    504). Un cuerpo de más de AGRILINK_MAX_CUERPO_MB se rechaza con 413 sin
+    terminar de leerlo. Una petición que agota el tiempo recibe 504, pero su hilo termina el
+    cálculo (no se puede interrumpir) y sigue ocupando la cola hasta entonces.
+Una conexión en espera solo cuesta una corrutina, así que un proceso sostiene
+miles de conexiones abiertas. El pool es de hilos y no de procesos porque el
+grafo, sus índices y las cachés viven en este proceso; para paralelismo de CPU
+se suman workers de uvicorn o los shards regionales (AGRILINK_SHARDS).
+"""
+import asyncio
+import io
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from app import app as app_flask
+from agricultor_service import agricultor_service
+from algoritmos_service import algoritmos_service
+from instrumentacion import metricas
+
+# (método, prefijo de ruta) que se atienden en el event loop: solo memoria
+LECTURAS_BARATAS = (
+    ("GET", "/api/health"),
+    ("GET", "/api/algoritmos/explorar-nodo/"),
+    ("GET", "/api/algoritmos/buscar"),
+    ("GET", "/api/algoritmos/region/"),
+    ("GET", "/api/algoritmos/metricas-grafo"),
+    ("GET", "/api/algoritmos/info-bellman-ford"),
+    ("GET", "/api/admin/grafo/estado"),
+    ("GET", "/api/metrics"),
+)
+
+# Lecturas de AgricultorService: en memoria son baratas, con SQLite leen disco y van al pool
+LECTURAS_TABLAS = (
+    ("GET", "/api/agricultores"),
+    ("GET", "/api/productos"),
+    ("GET", "/api/pedidos/agricultor/"),
+    ("GET", "/api/resenas/agricultor/"),
+)
+
+
+class AplicacionASGI:
+    def __init__(self, app_wsgi, hilos: int, cola: int, timeout: float, max_cuerpo: int = None):
+        self.app_wsgi = app_wsgi
+        self.timeout = timeout
+        self.cola = cola
+        self.max_cuerpo = max_cuerpo
+        self._lecturas = LECTURAS_BARATAS + (LECTURAS_TABLAS if agricultor_service.base is None else ())
+        self._executor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="asgi")
+        # Plazas del pool: se toman en el event loop y se liberan en el hilo al terminar
+        self._plazas = threading.BoundedSemaphore(cola)
+        self._ocupadas = 0
+        self._lock = threading.Lock()
+        metricas.registrar_gauge("agrilink_asgi_en_pool", lambda: self._ocupadas,
+                                 "Peticiones en el pool de hilos del modo ASGI (en curso o esperando).")
+        metricas.describir("agrilink_asgi_peticiones_total", "counter",
+                           "Peticiones del modo ASGI por lugar: event_loop, pool, rechazada (429), timeout (504) "
+                           "o demasiado_grande (413).")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._ciclo_de_vida(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        cuerpo = await self._leer_cuerpo(scope, receive)
+        if cuerpo is None:
+            metricas.incrementar("agrilink_asgi_peticiones_total", lugar="demasiado_grande")
+            await _responder_json(send, 413, {"error": "Cuerpo de la petición demasiado grande",
+                                              "maximo_bytes": self.max_cuerpo})
+            return
+        entorno = _entorno_wsgi(scope, cuerpo)
+
+        if self._es_barata(scope["method"], scope["path"], cuerpo):
+            metricas.incrementar("agrilink_asgi_peticiones_total", lugar="event_loop")
+            await _responder(send, *_llamar_wsgi(self.app_wsgi, entorno))
+            return
+
+        if not self._plazas.acquire(blocking=False):
+            metricas.incrementar("agrilink_asgi_peticiones_total", lugar="rechazada")
+            await _responder_json(send, 429, {"error": "Servidor saturado, reintente en unos segundos",
+                                              "en_cola": self._ocupadas}, [(b"retry-after", b"1")])
+            return
+        with self._lock:
+            self._ocupadas += 1
+        metricas.incrementar("agrilink_asgi_peticiones_total", lugar="pool")
+        futuro = asyncio.get_running_loop().run_in_executor(self._executor, self._en_pool, entorno)
+        try:
+            respuesta = await asyncio.wait_for(asyncio.shield(futuro), self.timeout)
+        except asyncio.TimeoutError:
+            metricas.incrementar("agrilink_asgi_peticiones_total", lugar="timeout")
+            await _responder_json(send, 504, {"error": "Tiempo de espera agotado",
+                                              "detalle": f"La petición superó {self.timeout:g} s"})
+            return
+        await _responder(send, *respuesta)
+
+    def _en_pool(self, entorno):
+        try:
+            return _llamar_wsgi(self.app_wsgi, entorno)
+        finally:
+            with self._lock:
+                self._ocupadas -= 1
+            self._plazas.release()
+
+    def _es_barata(self, metodo, ruta, cuerpo):
+        if any(metodo == m and ruta.startswith(prefijo) for m, prefijo in self._lecturas):
+            return True
+        if metodo == "POST" and ruta == "/api/algoritmos/ruta-optima":
+            # Solo si la ruta ya está en la caché de la instantánea vigente
+            try:
+                datos = json.loads(cuerpo)
+                return (datos.get("origen"), datos.get("destino")) in algoritmos_service.instantanea.cache_rutas
+            except (ValueError, AttributeError, TypeError):
+                return False
+        if metodo == "GET" and ruta.startswith("/api/algoritmos/matriz-costos"):
+            # La primera consulta tras arrancar, recargar o regenerar abre la matriz
+            # (y puede descomprimir el .npz): esa va al pool
+            return algoritmos_service.matriz_abierta()
+        return False
+
+    async def _leer_cuerpo(self, scope, receive):
+        """El cuerpo completo, o None en cuanto se sabe que supera `max_cuerpo` (no se sigue leyendo)."""
+        maximo = self.max_cuerpo
+        if maximo is not None:
+            declarado = dict(scope.get("headers", ())).get(b"content-length", b"")
+            if declarado.isdigit() and int(declarado) > maximo:
+                return None
+        partes, leidos = [], 0
+        while True:
+            mensaje = await receive()
+            parte = mensaje.get("body", b"")
+            leidos += len(parte)
+            if maximo is not None and leidos > maximo:
+                return None
+            partes.append(parte)
+            if not mensaje.get("more_body"):
+                return b"".join(partes)
+
+    async def _ciclo_de_vida(self, receive, send):
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif mensaje["type"] == "lifespan.shutdown":
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def _entorno_wsgi(scope, cuerpo: bytes) -> dict:
+    servidor = scope.get("server") or ("localhost", 80)
+    cliente = scope.get("client") or ("", 0)
+    entorno = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": servidor[0],
+        "SERVER_PORT": str(servidor[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": cliente[0],
+        "CONTENT_LENGTH": str(len(cuerpo)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(cuerpo),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for nombre, valor in scope.get("headers", []):
+        nombre = nombre.decode("latin-1").upper().replace("-", "_")
+        valor = valor.decode("latin-1")
+        if nombre == "CONTENT_LENGTH":
+            continue
+        clave = nombre if nombre == "CONTENT_TYPE" else f"HTTP_{nombre}"
+        entorno[clave] = f"{entorno[clave]},{valor}" if clave in entorno else valor
+    return entorno
+
+
+def _llamar_wsgi(app_wsgi, entorno):
+    respuesta = {}
+
+    def iniciar_respuesta(estado, cabeceras, exc_info=None):
+        respuesta["estado"] = int(estado.split(" ", 1)[0])
+        respuesta["cabeceras"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in cabeceras]
+
+    iterable = app_wsgi(entorno, iniciar_respuesta)
+    try:
+        cuerpo = b"".join(iterable)
+    finally:
+        if hasattr(iterable, "close"):
+            iterable.close()
+    return respuesta["estado"], respuesta["cabeceras"], cuerpo
+
+
+async def _responder(send, estado, cabeceras, cuerpo):
+    await send({"type": "http.response.start", "status": estado, "headers": cabeceras})
+    await send({"type": "http.response.body", "body": cuerpo})
+
+
+async def _responder_json(send, estado, datos, cabeceras=()):
+    cuerpo = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+    await _responder(send, estado, [(b"content-type", b"application/json"), *cabeceras], cuerpo)
+
+
+app = AplicacionASGI(app_flask, config.ASGI_HILOS, config.ASGI_COLA, config.ASGI_TIMEOUT,
+                     app_flask.config["MAX_CONTENT_LENGTH"])
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("asgi:app", port=5000)
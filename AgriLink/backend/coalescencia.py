@@ -0,0 +1,59 @@
+import threading
+
+from instrumentacion import metricas
+
+
+class _Vuelo:
+    __slots__ = ("evento", "resultado", "error")
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class Coalescedor:
+    """
+    "Single-flight": el primer hilo que pide una clave ejecuta el cálculo y los
+    que llegan con la misma clave mientras tanto esperan y comparten su
+    resultado (o su excepción). Si la espera supera `timeout` se lanza
+    TimeoutError solo en ese hilo; el cálculo del líder sigue su curso.
+    """
+
+    def __init__(self, nombre: str, timeout: float = 30.0):
+        self.nombre = nombre
+        self.timeout = timeout
+        self._vuelos = {}
+        self._lock = threading.Lock()
+        metricas.describir("agrilink_coalescencia_total", "counter",
+                           "Llamadas coalescidas por rol: lider (calcula) o seguidor (espera al líder).")
+
+    def ejecutar(self, clave, calcular):
+        with self._lock:
+            vuelo = self._vuelos.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._vuelos[clave] = _Vuelo()
+
+        if lider:
+            metricas.incrementar("agrilink_coalescencia_total", coalescedor=self.nombre, rol="lider")
+            try:
+                vuelo.resultado = calcular()
+            except Exception as e:
+                vuelo.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._vuelos[clave]
+                vuelo.evento.set()
+            return vuelo.resultado
+
+        metricas.incrementar("agrilink_coalescencia_total", coalescedor=self.nombre, rol="seguidor")
+        if not vuelo.evento.wait(self.timeout):
+            raise TimeoutError(f"{self.nombre}: se agotó la espera ({self.timeout} s) del cálculo en curso")
+        if vuelo.error is not None:
+            raise vuelo.error
+        return vuelo.resultado
+
+    def en_curso(self) -> int:
+        return len(self._vuelos)
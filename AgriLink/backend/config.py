@@ -0,0 +1,74 @@
+import os
+
+# =========================================================================
+# Configuración del backend (se lee de variables de entorno AGRILINK_*)
+# =========================================================================
+
+def _leer_bandera(nombre: str, defecto: bool) -> bool:
+    valor = os.environ.get(nombre)
+    if valor is None:
+        return defecto
+    return valor.strip().lower() in ("1", "true", "si", "sí", "yes", "on")
+
+
+# Instrumentación: histogramas de latencia por endpoint y tiempos por etapa
+METRICAS_HABILITADAS = _leer_bandera("AGRILINK_METRICAS", True)
+
+# Perfilado bajo demanda: solo se activa si esta bandera está encendida y la
+# petición lo pide con la cabecera "X-Perfilar: 1" o el parámetro ?perfilar=1
+PERFILADO_HABILITADO = _leer_bandera("AGRILINK_PERFILADO", False)
+DIRECTORIO_PERFILES = os.environ.get(
+    "AGRILINK_DIRECTORIO_PERFILES",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "perfiles"),
+)
+
+# Persistencia de agricultores/productos/pedidos/reseñas: "memoria" (por proceso)
+# o "sqlite" (archivo local compartido por todos los workers)
+BACKEND_DATOS = os.environ.get("AGRILINK_BACKEND_DATOS", "memoria").strip().lower()
+RUTA_SQLITE = os.environ.get(
+    "AGRILINK_SQLITE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "datos", "agrilink.db"),
+)
+
+# Descuentos compartidos por todos los workers del nodo (tabla versionada en SQLite);
+# sin ella cada proceso sortea los suyos. Los workers releen la versión cada INTERVALO_DESCUENTOS s
+DESCUENTOS_COMPARTIDOS = _leer_bandera("AGRILINK_DESCUENTOS_COMPARTIDOS", True)
+RUTA_ESTADO_COMPARTIDO = os.environ.get(
+    "AGRILINK_ESTADO_COMPARTIDO",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "datos", "compartido.db"),
+)
+INTERVALO_DESCUENTOS = float(os.environ.get("AGRILINK_INTERVALO_DESCUENTOS", "2"))
+# Caché de ruta-optima compartida entre workers (en el mismo archivo; 0 la desactiva)
+CAPACIDAD_CACHE_COMPARTIDA = int(os.environ.get("AGRILINK_CACHE_COMPARTIDA", "0"))
+
+# Espera máxima (segundos) de una petición que se une a un cálculo de ruta idéntico en curso
+TIMEOUT_COALESCENCIA = float(os.environ.get("AGRILINK_TIMEOUT_COALESCENCIA", "30"))
+
+# Rutas ruta-optima guardadas por versión del grafo (LRU; 0 la desactiva)
+CAPACIDAD_CACHE_RUTAS = int(os.environ.get("AGRILINK_CACHE_RUTAS", "4096"))
+
+# Recarga automática del grafo cuando cambia el GraphML (sondeo de la fecha de modificación)
+VIGILAR_GRAFO = _leer_bandera("AGRILINK_VIGILAR_GRAFO", False)
+INTERVALO_VIGILANCIA = float(os.environ.get("AGRILINK_INTERVALO_VIGILANCIA", "10"))
+
+# Modo ASGI (asgi.py): hilos del pool para búsquedas en el grafo y escrituras, peticiones
+# admitidas en el pool antes de responder 429, y tiempo máximo por petición (504)
+ASGI_HILOS = int(os.environ.get("AGRILINK_ASGI_HILOS", "4"))
+ASGI_COLA = int(os.environ.get("AGRILINK_ASGI_COLA", "64"))
+ASGI_TIMEOUT = float(os.environ.get("AGRILINK_ASGI_TIMEOUT", "30"))
+
+# Cuerpo máximo de una petición en MB (413 por encima), en Flask y en el modo ASGI
+MAX_CUERPO_MB = float(os.environ.get("AGRILINK_MAX_CUERPO_MB", "10"))
+
+# Shards regionales: "" (deshabilitado), "departamentos" o "louvain"; un proceso por shard
+SHARDS_ESTRATEGIA = os.environ.get("AGRILINK_SHARDS", "").strip().lower()
+NUM_SHARDS = int(os.environ.get("AGRILINK_NUM_SHARDS", "4"))
+
+# Modo sombra: fracción (0 a 1) de las consultas de ruta que además se recalculan en segundo
+# plano con networkx sobre el grafo completo para comparar costos (± SOMBRA_TOLERANCIA) y rutas
+SOMBRA_PROPORCION = float(os.environ.get("AGRILINK_SOMBRA", "0"))
+SOMBRA_TOLERANCIA = float(os.environ.get("AGRILINK_SOMBRA_TOLERANCIA", "0.01"))
+RUTA_REGISTRO_SOMBRA = os.environ.get(
+    "AGRILINK_REGISTRO_SOMBRA",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "datos", "sombra.jsonl"),
+)
@@ -0,0 +1,158 @@
+import time
+
+import networkx as nx
+import numpy as np
+
+# Tope de celdas escenarios x orígenes x destinos que se evalúan en memoria (float64)
+MAX_CELDAS = 20_000_000
+
+
+def _distancias_troncales(grafo):
+    """Dijkstra entre todas las Capitales sobre la red troncal (transporte_interdepartamental)."""
+    capitales = [n for n, data in grafo.nodes(data=True) if data.get('tipo') == 'Capital']
+    troncal = grafo.subgraph(capitales)
+    return {c: nx.single_source_dijkstra_path_length(troncal, c, weight='peso') for c in capitales}
+
+
+def _estructura(grafo, descuentos, origenes, destinos, criterio):
+    """
+    Descompone el costo de cada par en la parte fija y la que depende del
+    descuento, con la misma semántica de los grafos de consulta. Con
+    precio_final = round(precio_original * (1 - D), 2), la arista legítima pesa
+
+        Bellman-Ford: precio_final - precio_original   (el ahorro, negativo)
+        Dijkstra:     precio_final
+
+    y `base[o, m]` es el transporte troncal desde la capital legítima de la
+    Asociación hasta la capital que abastece al Mercado (inf si no hay ruta).
+    `aplica[o]` es False cuando el descuento no interviene en el costo.
+    """
+    distancias = _distancias_troncales(grafo)
+    productos = []
+    indice_producto = {}
+    base = np.full((len(origenes), len(destinos)), np.inf)
+    precio = np.zeros(len(origenes))
+    aplica = np.zeros(len(origenes), dtype=bool)
+    producto_de = np.zeros(len(origenes), dtype=np.int64)
+
+    capitales_destino = [
+        [u for u in grafo.predecessors(m) if grafo.nodes[u].get('tipo') == 'Capital'] if m in grafo else []
+        for m in destinos
+    ]
+
+    for i, origen in enumerate(origenes):
+        if origen not in grafo:
+            continue
+        producto = next((v for v in grafo.successors(origen) if grafo.nodes[v].get('tipo') == 'Producto'), None)
+        capital = grafo.nodes[origen].get('departamento')
+        if producto is None:
+            continue
+
+        if capital is None:
+            # Sin capital legítima el grafo de consulta no se modifica: vale cualquier capital, sin descuento
+            salidas = [(c, grafo[producto][c].get('peso', 0)) for c in grafo.successors(producto) if c in distancias]
+            for j, capitales_mercado in enumerate(capitales_destino):
+                base[i, j] = min((peso + distancias[c].get(cm, np.inf) + grafo[cm][destinos[j]].get('peso', 0)
+                                  for c, peso in salidas for cm in capitales_mercado), default=np.inf)
+            continue
+        if capital not in distancias or not grafo.has_edge(producto, capital):
+            continue
+
+        info = descuentos.get(producto) or {}
+        precio_original = info.get('precio_original')
+        if precio_original is None and criterio == 'dijkstra':
+            # Dijkstra elimina la arista legítima cuando no hay precio final
+            continue
+        producto_de[i] = indice_producto.setdefault(producto, len(productos))
+        if indice_producto[producto] == len(productos):
+            productos.append(producto)
+        if precio_original is not None:
+            precio[i] = precio_original
+            aplica[i] = True
+        for j, capitales_mercado in enumerate(capitales_destino):
+            base[i, j] = min((distancias[capital].get(cm, np.inf) + grafo[cm][destinos[j]].get('peso', 0)
+                              for cm in capitales_mercado), default=np.inf)
+    return base, precio, aplica, producto_de, productos
+
+
+def evaluar_escenarios(grafo, descuentos, origenes, destinos, opciones, escenarios: int = 10000,
+                       semilla=None, cuantiles=(0.05, 0.5, 0.95), criterio: str = 'dijkstra'):
+    """
+    Distribución del costo de ruta origen -> destino bajo `escenarios` sorteos
+    independientes del descuento de cada producto (uniforme sobre `opciones`).
+    La estructura de la ruta (producto, capital legítima, troncal y mercado) no
+    depende del descuento, así que se calcula una vez y los N escenarios se
+    evalúan como operaciones de arreglos en lugar de N ejecuciones de
+    Bellman-Ford/Dijkstra. Para cada destino se cuenta además qué origen resulta
+    el más barato en cada escenario.
+    """
+    if criterio not in ('dijkstra', 'bellman_ford'):
+        return {"error": "criterio debe ser 'dijkstra' (precio final) o 'bellman_ford' (ahorro negativo)"}
+    if not origenes or not destinos:
+        return {"error": "Se requiere al menos un origen y un destino"}
+    if escenarios < 1 or escenarios * len(origenes) * len(destinos) > MAX_CELDAS:
+        return {"error": f"escenarios x orígenes x destinos debe estar entre 1 y {MAX_CELDAS}"}
+
+    inicio = time.perf_counter()
+    base, precio, aplica, producto_de, productos = _estructura(grafo, descuentos, origenes, destinos, criterio)
+    t_estructura = time.perf_counter() - inicio
+
+    rng = np.random.default_rng(semilla)
+    opciones = np.asarray(opciones, dtype=np.float64)
+    # Precio final de cada origen con cada opción de descuento, redondeado como en
+    # _generar_descuentos_aleatorios (round de Python, no np.round: 2.295 -> 2.29)
+    tabla = np.array([[round(float(p) * (1 - float(d)), 2) for d in opciones] for p in precio])
+    tabla = tabla.reshape(len(precio), len(opciones))
+    # sorteo[s, p]: opción de descuento del producto p en el escenario s
+    sorteo = rng.integers(0, len(opciones), size=(escenarios, max(len(productos), 1)))
+    precio_final = tabla[np.arange(len(origenes))[None, :], sorteo[:, producto_de]]   # (N, O)
+    termino = precio_final if criterio == 'dijkstra' else precio_final - precio[None, :]
+    termino = np.where(aplica[None, :], termino, 0.0)
+    costos = base[None, :, :] + termino[:, :, None]                      # (N, O, M)
+    t_escenarios = time.perf_counter() - inicio - t_estructura
+
+    factible = np.isfinite(base)
+    niveles = np.quantile(costos[:, factible], cuantiles, axis=0) if factible.any() else None
+    medias = costos[:, factible].mean(axis=0) if factible.any() else None
+
+    pares = []
+    k = 0
+    for i, origen in enumerate(origenes):
+        for j, destino in enumerate(destinos):
+            par = {"origen": origen, "destino": destino}
+            if not factible[i, j]:
+                par["error"] = "No se encontró ruta."
+            else:
+                par["costo_medio"] = round(float(medias[k]), 2)
+                par["cuantiles"] = {f"p{int(round(q * 100))}": round(float(niveles[n, k]), 2)
+                                    for n, q in enumerate(cuantiles)}
+                k += 1
+            pares.append(par)
+
+    elecciones = []
+    mejores = np.argmin(costos, axis=1)                                   # (N, M)
+    for j, destino in enumerate(destinos):
+        if not factible[:, j].any():
+            elecciones.append({"destino": destino, "error": "Ningún origen tiene ruta a este destino."})
+            continue
+        frecuencias = np.bincount(mejores[:, j], minlength=len(origenes)) / escenarios
+        elecciones.append({
+            "destino": destino,
+            "frecuencia_por_origen": {origenes[i]: round(float(f), 4)
+                                      for i, f in sorted(enumerate(frecuencias), key=lambda x: -x[1]) if f > 0},
+        })
+
+    return {
+        "criterio": criterio,
+        "escenarios": escenarios,
+        "semilla": semilla,
+        "opciones_descuento": opciones.tolist(),
+        "productos_sorteados": productos,
+        "pares": pares,
+        "eleccion_de_ruta": elecciones,
+        "tiempo_ms": {
+            "estructura": round(t_estructura * 1000, 3),
+            "escenarios": round(t_escenarios * 1000, 3),
+            "total": round((time.perf_counter() - inicio) * 1000, 3),
+        },
+    }
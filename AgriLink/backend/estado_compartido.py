@@ -0,0 +1,110 @@
+"""
+Estado compartido por todos los workers (procesos) de un nodo, en un archivo
+SQLite local:
+  - TablaDescuentos: el porcentaje de descuento de cada producto y una versión
+    que solo crece. El primer proceso que ve un producto le sortea el
+    descuento y los demás leen el mismo, así que una misma consulta cuesta lo
+    mismo la atienda el worker que la atienda.
+  - CacheRutasCompartida: resultados de ruta-optima indexados por lo que los
+    determina en cualquier proceso (sha1 del GraphML, secuencia de deltas,
+    versión de descuentos, origen y destino).
+"""
+import json
+
+from instrumentacion import metricas
+from repositorio_sqlite import BaseSQLite
+
+
+class TablaDescuentos:
+    def __init__(self, base: BaseSQLite):
+        self.base = base
+        with base.transaccion() as conexion:
+            conexion.execute("CREATE TABLE IF NOT EXISTS descuentos "
+                             "(producto TEXT PRIMARY KEY, porcentaje REAL NOT NULL) WITHOUT ROWID")
+            conexion.execute("CREATE TABLE IF NOT EXISTS descuentos_version (id INTEGER PRIMARY KEY CHECK (id = 1), "
+                             "version INTEGER NOT NULL)")
+            conexion.execute("INSERT OR IGNORE INTO descuentos_version (id, version) VALUES (1, 0)")
+
+    def version(self) -> int:
+        return self.base.conexion().execute("SELECT version FROM descuentos_version").fetchone()[0]
+
+    def leer(self):
+        """(versión, {producto: porcentaje}) leídos de un mismo estado de la tabla."""
+        conexion = self.base.conexion()
+        conexion.execute("BEGIN")
+        try:
+            return self._leer(conexion)
+        finally:
+            conexion.execute("COMMIT")
+
+    def asegurar(self, productos, elegir):
+        """
+        Garantiza que todos los productos tengan descuento (los que faltan se
+        sortean con `elegir()` y suben la versión) y devuelve (versión, tabla).
+        """
+        version, porcentajes = self.leer()
+        if all(p in porcentajes for p in productos):
+            return version, porcentajes
+        with self.base.transaccion() as conexion:
+            # Releer dentro de la transacción: otro proceso pudo sortearlos entre tanto
+            version, porcentajes = self._leer(conexion)
+            nuevos = {p: elegir() for p in productos if p not in porcentajes}
+            if nuevos:
+                conexion.executemany("INSERT INTO descuentos (producto, porcentaje) VALUES (?, ?)", nuevos.items())
+                version = self._subir_version(conexion)
+                porcentajes.update(nuevos)
+        return version, porcentajes
+
+    def regenerar(self, productos, elegir):
+        """Sortea de nuevo el descuento de todos los productos en una versión nueva."""
+        with self.base.transaccion() as conexion:
+            porcentajes = {p: elegir() for p in productos}
+            conexion.execute("DELETE FROM descuentos")
+            conexion.executemany("INSERT INTO descuentos (producto, porcentaje) VALUES (?, ?)", porcentajes.items())
+            version = self._subir_version(conexion)
+        return version, porcentajes
+
+    @staticmethod
+    def _leer(conexion):
+        version = conexion.execute("SELECT version FROM descuentos_version").fetchone()[0]
+        return version, dict(conexion.execute("SELECT producto, porcentaje FROM descuentos"))
+
+    @staticmethod
+    def _subir_version(conexion):
+        conexion.execute("UPDATE descuentos_version SET version = version + 1")
+        return conexion.execute("SELECT version FROM descuentos_version").fetchone()[0]
+
+
+class CacheRutasCompartida:
+    """
+    Caché de resultados (JSON) con desalojo por antigüedad de inserción: cada
+    `PODA_CADA` escrituras se borran las filas que exceden la capacidad.
+    """
+
+    PODA_CADA = 64
+
+    def __init__(self, base: BaseSQLite, nombre: str, capacidad: int):
+        self.base = base
+        self.nombre = nombre
+        self.capacidad = capacidad
+        self._escrituras = 0
+        with base.transaccion() as conexion:
+            conexion.execute("CREATE TABLE IF NOT EXISTS cache_rutas (clave TEXT UNIQUE NOT NULL, resultado TEXT NOT NULL)")
+
+    def obtener(self, clave):
+        registro = self.base.conexion().execute(
+            "SELECT resultado FROM cache_rutas WHERE clave = ?", (json.dumps(clave),)).fetchone()
+        metricas.registrar_cache(self.nombre, registro is not None)
+        return json.loads(registro[0]) if registro else None
+
+    def guardar(self, clave, valor):
+        with self.base.transaccion() as conexion:
+            conexion.execute("INSERT OR REPLACE INTO cache_rutas (clave, resultado) VALUES (?, ?)",
+                             (json.dumps(clave), json.dumps(valor, ensure_ascii=False)))
+            self._escrituras += 1
+            if self._escrituras % self.PODA_CADA == 0:
+                conexion.execute("DELETE FROM cache_rutas WHERE rowid <= (SELECT MAX(rowid) FROM cache_rutas) - ?",
+                                 (self.capacidad,))
+
+    def __len__(self):
+        return self.base.conexion().execute("SELECT COUNT(*) FROM cache_rutas").fetchone()[0]
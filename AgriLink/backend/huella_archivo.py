@@ -0,0 +1,10 @@
+import hashlib
+
+
+def sha1_archivo(ruta):
+    """SHA-1 (hex) del contenido de un archivo, leído por bloques de 1 MB."""
+    h = hashlib.sha1()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
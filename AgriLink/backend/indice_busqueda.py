@@ -0,0 +1,228 @@
+import time
+import unicodedata
+from collections import Counter, deque
+
+# Profundidad máxima del trie: las claves más largas se guardan en la cubeta del
+# nodo de esa profundidad y se filtran por prefijo al consultar. Así los ids
+# hexadecimales de 32 caracteres no generan una cadena de nodos por carácter.
+PROFUNDIDAD_TRIE = 4
+ATRIBUTOS_GEOGRAFICOS = ("departamento", "provincia", "distrito")
+
+
+def normalizar(texto) -> str:
+    """Minúsculas, sin tildes ni eñes (ñ -> n) y con espacios simples."""
+    texto = unicodedata.normalize("NFKD", str(texto))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.lower().split())
+
+
+def _trigramas(clave: str):
+    relleno = f"  {clave} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+class _NodoTrie:
+    __slots__ = ("hijos", "entradas")
+
+    def __init__(self):
+        self.hijos = {}
+        self.entradas = []   # [(clave, id_termino, es_sufijo)]
+
+
+class IndiceBusqueda:
+    """
+    Índice de autocompletado sobre los nodos del grafo. Cada término es
+    (texto, campo, tipo) con la lista de nodos que lo tienen: ids de nodo
+    (nombres de Producto y Capital, UUID de Asociación/Mercado) y valores de
+    departamento/provincia/distrito. Combina un trie de prefijos sin tildes con
+    un índice de trigramas para consultas con errores de tipeo.
+    """
+
+    def __init__(self):
+        self._terminos = []          # [(texto, campo, tipo, [nodos])]
+        self._por_clave = {}         # (campo, tipo, clave normalizada) -> id_termino
+        self._raiz = _NodoTrie()
+        self._trigramas = {}         # trigrama -> [id_termino]
+        self._num_trigramas = []     # id_termino -> trigramas de su clave (0 si no es difusa)
+
+    @classmethod
+    def desde_grafo(cls, grafo):
+        inicio = time.perf_counter()
+        indice = cls()
+        for nodo, data in grafo.nodes(data=True):
+            indice.agregar_nodo(nodo, data)
+        print(f"🔎 Índice de búsqueda: {len(indice._terminos)} términos "
+              f"({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+        return indice
+
+    # --- Construcción -------------------------------------------------------
+    def agregar_nodo(self, nodo, data: dict):
+        tipo = data.get("tipo", "Desconocido")
+        # Los ids de Asociación/Mercado son hashes: solo admiten búsqueda por prefijo
+        self._agregar(str(nodo), "id", tipo, nodo, difusa=tipo in ("Producto", "Capital"))
+        for atributo in ATRIBUTOS_GEOGRAFICOS:
+            valor = data.get(atributo)
+            if valor:
+                self._agregar(str(valor), atributo, tipo, nodo, difusa=True)
+
+    def _agregar(self, texto, campo, tipo, nodo, difusa):
+        clave = normalizar(texto)
+        if not clave:
+            return
+        id_termino = self._por_clave.get((campo, tipo, clave))
+        if id_termino is not None:
+            self._terminos[id_termino][3].append(nodo)
+            return
+
+        id_termino = len(self._terminos)
+        self._terminos.append((texto, campo, tipo, [nodo]))
+        self._por_clave[(campo, tipo, clave)] = id_termino
+
+        # Se indexa el texto completo y cada sufijo de palabra ("platano bellaco", "bellaco")
+        palabras = clave.split(" ")
+        for i in range(len(palabras)):
+            self._insertar_trie(" ".join(palabras[i:]), id_termino, i > 0)
+
+        trigramas = _trigramas(clave) if difusa else ()
+        self._num_trigramas.append(len(trigramas))
+        for trigrama in trigramas:
+            self._trigramas.setdefault(trigrama, []).append(id_termino)
+
+    def _insertar_trie(self, clave, id_termino, es_sufijo):
+        nodo = self._raiz
+        for caracter in clave[:PROFUNDIDAD_TRIE]:
+            nodo = nodo.hijos.setdefault(caracter, _NodoTrie())
+        nodo.entradas.append((clave, id_termino, es_sufijo))
+
+    # --- Consulta -----------------------------------------------------------
+    def con_nodos(self, grafo, nodos):
+        """Índice de una versión con deltas: este índice sin tocar + los nodos nuevos o modificados."""
+        return IndiceBusquedaConDeltas(self, grafo, nodos)
+
+    def buscar(self, consulta: str, tipo: str = None, limite: int = 10, difusa: bool = True):
+        clave = normalizar(consulta)
+        if not clave:
+            return []
+        resultados = []
+        for id_termino, coincidencia, puntaje in self._coincidencias(clave, tipo, difusa):
+            resultados.append(self._resultado(id_termino, coincidencia, puntaje))
+            if len(resultados) >= limite:
+                break
+        return resultados
+
+    def _coincidencias(self, clave, tipo, difusa):
+        """(id_termino, coincidencia, puntaje) sin repetir: primero por prefijo y después aproximadas."""
+        vistos = set()
+        for id_termino in self._prefijo(clave, tipo):
+            if id_termino not in vistos:
+                vistos.add(id_termino)
+                yield id_termino, "prefijo", 1.0
+        if difusa and len(clave) >= 3:
+            for id_termino, puntaje in self._aproximados(clave, tipo):
+                if id_termino not in vistos:
+                    vistos.add(id_termino)
+                    yield id_termino, "aproximada", puntaje
+
+    def _prefijo(self, clave, tipo):
+        """Términos cuyo texto (o alguna palabra) empieza por `clave`: primero los más cortos y, a igual
+        profundidad, los que coinciden desde el inicio del texto."""
+        nodo = self._raiz
+        for caracter in clave[:PROFUNDIDAD_TRIE]:
+            nodo = nodo.hijos.get(caracter)
+            if nodo is None:
+                return
+        cola = deque([nodo])
+        while cola:
+            actual = cola.popleft()
+            for texto, id_termino, _ in sorted(actual.entradas, key=lambda e: (e[2], len(e[0]))):
+                if texto.startswith(clave) and (tipo is None or self._terminos[id_termino][2] == tipo):
+                    yield id_termino
+            for caracter in sorted(actual.hijos):
+                cola.append(actual.hijos[caracter])
+
+    def _aproximados(self, clave, tipo, umbral: float = 0.4):
+        """Coeficiente de Dice sobre trigramas, de mayor a menor."""
+        consulta = _trigramas(clave)
+        comunes = Counter()
+        for trigrama in consulta:
+            comunes.update(self._trigramas.get(trigrama, ()))
+        candidatos = []
+        for id_termino, compartidos in comunes.items():
+            if tipo is not None and self._terminos[id_termino][2] != tipo:
+                continue
+            puntaje = 2 * compartidos / (len(consulta) + self._num_trigramas[id_termino])
+            if puntaje >= umbral:
+                candidatos.append((id_termino, round(puntaje, 3)))
+        candidatos.sort(key=lambda c: c[1], reverse=True)
+        return candidatos
+
+    def _resultado(self, id_termino, coincidencia, puntaje, max_nodos: int = 20):
+        texto, campo, tipo, nodos = self._terminos[id_termino]
+        return {
+            "texto": texto,
+            "campo": campo,
+            "tipo": tipo,
+            "nodos": nodos[:max_nodos],
+            "total_nodos": len(nodos),
+            "coincidencia": coincidencia,
+            "puntaje": puntaje,
+        }
+
+
+class IndiceBusquedaConDeltas:
+    """
+    Índice de una versión con deltas (ingesta_delta.py): el índice completo de
+    la última carga, que no se modifica, más un índice pequeño con los nodos
+    nuevos o modificados desde entonces, que se reconstruye en cada ingesta.
+    Los nodos modificados se ocultan en los resultados del índice base y los
+    términos iguales de ambos se unen. Al recargar o compactar el grafo se
+    vuelve a un único IndiceBusqueda.
+    """
+
+    def __init__(self, base, grafo, nodos):
+        self.base = base
+        self.nodos = frozenset(nodos)
+        self.delta = IndiceBusqueda()
+        for nodo in self.nodos:
+            self.delta.agregar_nodo(nodo, grafo.nodes[nodo])
+
+    def con_nodos(self, grafo, nodos):
+        return IndiceBusquedaConDeltas(self.base, grafo, self.nodos | set(nodos))
+
+    def buscar(self, consulta: str, tipo: str = None, limite: int = 10, difusa: bool = True):
+        clave = normalizar(consulta)
+        if not clave:
+            return []
+        combinados = {}
+        for indice, ocultos in ((self.base, self.nodos), (self.delta, ())):
+            encontrados = 0
+            for id_termino, coincidencia, puntaje in indice._coincidencias(clave, tipo, difusa):
+                texto, campo, tipo_termino, nodos = indice._terminos[id_termino]
+                nodos = [n for n in nodos if n not in ocultos] if ocultos else nodos
+                if not nodos:
+                    continue
+                llave = (campo, tipo_termino, normalizar(texto))
+                actual = combinados.get(llave)
+                if actual is None:
+                    combinados[llave] = [texto, campo, tipo_termino, list(nodos), coincidencia, puntaje]
+                else:
+                    actual[3].extend(nodos)
+                    if puntaje > actual[5]:
+                        actual[4], actual[5] = coincidencia, puntaje
+                encontrados += 1
+                if encontrados >= limite:
+                    break
+        # Orden estable: prefijos antes que aproximadas y, dentro de cada grupo, por puntaje
+        ordenados = sorted(combinados.values(), key=lambda t: (t[4] != "prefijo", -t[5]))[:limite]
+        return [
+            {
+                "texto": texto,
+                "campo": campo,
+                "tipo": tipo_termino,
+                "nodos": nodos[:20],
+                "total_nodos": len(nodos),
+                "coincidencia": coincidencia,
+                "puntaje": puntaje,
+            }
+            for texto, campo, tipo_termino, nodos, coincidencia, puntaje in ordenados
+        ]
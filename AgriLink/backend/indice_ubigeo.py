@@ -0,0 +1,131 @@
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+# Longitud del prefijo de ubigeo -> nivel geográfico (y atributo con su nombre)
+NIVELES = {2: "departamento", 4: "provincia", 6: "distrito"}
+
+
+class IndiceUbigeo:
+    """
+    Índice jerárquico por ubigeo (DDPPdd). Los nodos se guardan ordenados por
+    ubigeo, en un arreglo global y uno por `tipo`, así cualquier región
+    (departamento = 2 dígitos, provincia = 4, distrito = 6) es un rango
+    contiguo que se resuelve con búsqueda binaria: O(log n + k). Los conteos
+    por tipo de cada región se precalculan.
+    """
+
+    def __init__(self, grafo):
+        inicio = time.perf_counter()
+        entradas = []
+        for nodo, data in grafo.nodes(data=True):
+            ubigeo = _ubigeo(data)
+            if ubigeo:
+                entradas.append((ubigeo, str(nodo), data.get("tipo", "Desconocido")))
+        entradas.sort()
+
+        self._ubigeos = [u for u, _, _ in entradas]
+        self._nodos = [n for _, n, _ in entradas]
+        self._por_tipo = {}
+        for ubigeo, nodo, tipo in entradas:
+            ubigeos, nodos = self._por_tipo.setdefault(tipo, ([], []))
+            ubigeos.append(ubigeo)
+            nodos.append(nodo)
+
+        self._conteos = {}
+        self._nombres = {}
+        for ubigeo, nodo, tipo in entradas:
+            data = grafo.nodes[nodo]
+            for longitud, atributo in NIVELES.items():
+                prefijo = ubigeo[:longitud]
+                self._conteos.setdefault(prefijo, Counter())[tipo] += 1
+                if prefijo not in self._nombres and data.get(atributo) and tipo != "Capital":
+                    self._nombres[prefijo] = data[atributo]
+        print(f"🗺️  Índice de ubigeo: {len(entradas)} nodos, {len(self._conteos)} regiones "
+              f"({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+
+    def con_cambios(self, grafo, atributos_previos: dict):
+        """
+        Copia del índice tras una ingesta de deltas: `atributos_previos` es
+        nodo -> atributos antes del cambio (None si el nodo es nuevo) y los
+        actuales se leen de `grafo`. Cada cambio es quitar e insertar en los
+        arreglos ordenados, sin volver a ordenar todo.
+        """
+        copia = object.__new__(IndiceUbigeo)
+        copia._ubigeos, copia._nodos = list(self._ubigeos), list(self._nodos)
+        copia._por_tipo = {tipo: (list(u), list(n)) for tipo, (u, n) in self._por_tipo.items()}
+        copia._conteos = dict(self._conteos)
+        copia._nombres = dict(self._nombres)
+        copiados = set()
+
+        def contar(ubigeo, tipo, delta):
+            for longitud in NIVELES:
+                prefijo = ubigeo[:longitud]
+                if prefijo not in copiados:
+                    copia._conteos[prefijo] = Counter(copia._conteos.get(prefijo, ()))
+                    copiados.add(prefijo)
+                copia._conteos[prefijo][tipo] += delta
+                if copia._conteos[prefijo][tipo] <= 0:
+                    del copia._conteos[prefijo][tipo]
+
+        for nodo, previo in atributos_previos.items():
+            nodo = str(nodo)
+            ubigeo = _ubigeo(previo) if previo is not None else None
+            if ubigeo:
+                tipo = previo.get("tipo", "Desconocido")
+                for ubigeos, nodos in (copia._ubigeos, copia._nodos), copia._por_tipo[tipo]:
+                    i = bisect_left(ubigeos, ubigeo)
+                    while nodos[i] != nodo:
+                        i += 1
+                    del ubigeos[i], nodos[i]
+                contar(ubigeo, tipo, -1)
+            data = grafo.nodes[nodo]
+            ubigeo = _ubigeo(data)
+            if ubigeo:
+                tipo = data.get("tipo", "Desconocido")
+                for ubigeos, nodos in (copia._ubigeos, copia._nodos), copia._por_tipo.setdefault(tipo, ([], [])):
+                    # Mismo orden que la construcción: por (ubigeo, nodo)
+                    i = bisect_left(ubigeos, ubigeo)
+                    fin = bisect_right(ubigeos, ubigeo)
+                    while i < fin and nodos[i] < nodo:
+                        i += 1
+                    ubigeos.insert(i, ubigeo)
+                    nodos.insert(i, nodo)
+                contar(ubigeo, tipo, +1)
+                for longitud, atributo in NIVELES.items():
+                    if ubigeo[:longitud] not in copia._nombres and data.get(atributo) and tipo != "Capital":
+                        copia._nombres[ubigeo[:longitud]] = data[atributo]
+        return copia
+
+    @staticmethod
+    def _rango(ubigeos, prefijo):
+        # ':' es el carácter siguiente a '9', así que acota todos los ubigeos con ese prefijo
+        return bisect_left(ubigeos, prefijo), bisect_left(ubigeos, prefijo + ":")
+
+    def conteos(self, prefijo: str) -> dict:
+        return dict(self._conteos.get(prefijo, {}))
+
+    def nombre(self, prefijo: str):
+        return self._nombres.get(prefijo)
+
+    def contar(self, prefijo: str, tipo: str = None) -> int:
+        ubigeos = self._ubigeos if tipo is None else self._por_tipo.get(tipo, ([], []))[0]
+        inicio, fin = self._rango(ubigeos, prefijo)
+        return fin - inicio
+
+    def listar(self, prefijo: str, tipo: str = None, desplazamiento: int = 0, limite: int = 100):
+        """[(ubigeo, nodo)] de la región, paginado."""
+        if tipo is None:
+            ubigeos, nodos = self._ubigeos, self._nodos
+        else:
+            ubigeos, nodos = self._por_tipo.get(tipo, ([], []))
+        inicio, fin = self._rango(ubigeos, prefijo)
+        desde = inicio + desplazamiento
+        hasta = min(fin, desde + limite)
+        return list(zip(ubigeos[desde:hasta], nodos[desde:hasta]))
+
+
+def _ubigeo(data):
+    """El ubigeo del nodo si tiene 6 dígitos; si no, None (el nodo no entra en el índice)."""
+    ubigeo = str(data.get("ubigeo") or "")
+    return ubigeo if len(ubigeo) == 6 and ubigeo.isdigit() else None
@@ -0,0 +1,523 @@
+"""
+Ingesta incremental (deltas) de Asociaciones, Mercados y precios nuevos o
+modificados en el grafo servido, sin volver a correr panda.py.
+
+Cada fila usa las mismas columnas que panda.py lee de los Excel:
+  - "asociacion": id_asociacion, departamento, provincia, distrito, ubigeo,
+                  PRODUCTO, PRECIO_MAYORISTA  (el producto que vende y su precio)
+  - "mercado":    id_anonimo_cenama, departamento, provincia, distrito, ubigeo
+  - "precio":     PRODUCTO, PRECIO_MAYORISTA y, opcional, ubigeo (solo la Capital
+                  de ese departamento; sin ubigeo, todas las Capitales del producto)
+y produce los mismos nodos y aristas que panda.py (vende, precio_adquisicion,
+distribucion_final). La Capital de cada fila sale del `depto_cod` de los nodos
+Capital del grafo.
+
+Las filas aplicadas se anotan en un registro append-only (JSONL) junto al
+GraphML, con una cabecera que guarda el SHA-1 del GraphML base. Al arrancar o
+recargar, el backend reproduce el registro sobre el GraphML; compactar escribe
+un GraphML nuevo con los deltas incluidos y reinicia el registro.
+
+    python ingesta_delta.py aplicar filas.jsonl                # anota en el registro (sin servidor)
+    python ingesta_delta.py aplicar filas.csv --url http://localhost:5000
+    python ingesta_delta.py estado
+    python ingesta_delta.py compactar
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+import time
+import urllib.request
+
+import networkx as nx
+
+from huella_archivo import sha1_archivo
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+NOMBRE_REGISTRO = "Grafo_Deltas.jsonl"
+
+COLUMNAS = {
+    "asociacion": ("id_asociacion", "departamento", "provincia", "distrito", "ubigeo", "PRODUCTO", "PRECIO_MAYORISTA"),
+    "mercado": ("id_anonimo_cenama", "departamento", "provincia", "distrito", "ubigeo"),
+    "precio": ("PRODUCTO", "PRECIO_MAYORISTA", "ubigeo"),
+}
+OBLIGATORIAS = {
+    "asociacion": ("id_asociacion", "departamento", "ubigeo", "PRODUCTO", "PRECIO_MAYORISTA"),
+    "mercado": ("id_anonimo_cenama", "departamento", "ubigeo"),
+    "precio": ("PRODUCTO", "PRECIO_MAYORISTA"),
+}
+
+
+def ruta_registro(ruta_graphml: str) -> str:
+    return os.path.join(os.path.dirname(ruta_graphml), NOMBRE_REGISTRO)
+
+
+# =========================================================================
+# FILAS (validación y aplicación con la semántica de panda.py)
+# =========================================================================
+def normalizar_fila(tipo, fila) -> dict:
+    """Valida una fila y la deja como se anota en el registro (texto sin espacios, ubigeo de 6 dígitos, precio float)."""
+    if tipo not in COLUMNAS:
+        raise ValueError(f"tipo debe ser uno de {', '.join(COLUMNAS)}")
+    if not isinstance(fila, dict):
+        raise ValueError("'fila' debe ser un objeto con las columnas de panda.py")
+    normalizada = {}
+    for columna in COLUMNAS[tipo]:
+        valor = fila.get(columna)
+        if isinstance(valor, str):
+            valor = valor.strip()
+        if valor in (None, ""):
+            if columna in OBLIGATORIAS[tipo]:
+                raise ValueError(f"Falta la columna '{columna}'")
+            continue
+        normalizada[columna] = valor
+    if "ubigeo" in normalizada:
+        ubigeo = str(normalizada["ubigeo"])
+        # Como en panda.py se completan los ceros perdidos al leer el ubigeo como número;
+        # una fila de precio puede traer solo el departamento (2 dígitos) o la provincia (4)
+        largo = 6 if tipo != "precio" or len(ubigeo) > 4 else 2 if len(ubigeo) <= 2 else 4
+        ubigeo = ubigeo.zfill(largo)
+        if not ubigeo.isdigit() or len(ubigeo) != largo:
+            raise ValueError(f"ubigeo inválido: {normalizada['ubigeo']}")
+        normalizada["ubigeo"] = ubigeo
+    if "PRECIO_MAYORISTA" in normalizada:
+        try:
+            precio = float(normalizada["PRECIO_MAYORISTA"])
+        except (TypeError, ValueError):
+            raise ValueError(f"PRECIO_MAYORISTA no es un número: {normalizada['PRECIO_MAYORISTA']}")
+        if not precio > 0:
+            raise ValueError("PRECIO_MAYORISTA debe ser mayor que 0")
+        normalizada["PRECIO_MAYORISTA"] = precio
+    return normalizada
+
+
+def capitales_por_codigo(grafo, capitales=None) -> dict:
+    """depto_cod -> Capital (el diccionario `departamentos` de panda.py, leído del grafo)."""
+    if capitales is None:
+        capitales = (n for n, data in grafo.nodes(data=True) if data.get("tipo") == "Capital")
+    return {grafo.nodes[c]["depto_cod"]: c for c in capitales if grafo.nodes[c].get("depto_cod")}
+
+
+class EditorGrafo:
+    """
+    Copia para escritura de un DiGraph. El grafo nuevo comparte con el original
+    los dicts de atributos y de adyacencia, y copia cada uno solo la primera vez
+    que una fila lo modifica, así aplicar unas filas cuesta lo que esas filas y
+    no lo que el grafo (que puede estar congelado). Con `en_sitio` modifica el
+    grafo directamente (reproducir el registro al cargar el GraphML).
+    """
+
+    def __init__(self, grafo, en_sitio: bool = False):
+        if en_sitio:
+            self.grafo = grafo
+        else:
+            self.grafo = grafo.__class__()
+            self.grafo.graph.update(grafo.graph)
+            self.grafo._node = dict(grafo._node)
+            self.grafo._adj = self.grafo._succ = dict(grafo._adj)
+            self.grafo._pred = dict(grafo._pred)
+        self._en_sitio = en_sitio
+        self._copiados = set()                 # (dict, nodo) ya copiados en esta edición
+        self.atributos_previos = {}            # nodo -> atributos antes de la edición (None si es nuevo)
+        self.tocados = set()                   # nodos con atributos o aristas modificados
+
+    def _propio(self, tabla, nombre, nodo):
+        if not self._en_sitio and (nombre, nodo) not in self._copiados:
+            tabla[nodo] = dict(tabla[nodo])
+            self._copiados.add((nombre, nodo))
+        return tabla[nodo]
+
+    def tipo(self, nodo):
+        data = self.grafo._node.get(nodo)
+        return None if data is None else data.get("tipo")
+
+    def poner_nodo(self, nodo, **atributos):
+        grafo = self.grafo
+        # GraphML no admite atributos None (panda.py tampoco los escribe)
+        atributos = {k: v for k, v in atributos.items() if v is not None}
+        if nodo not in grafo._node:
+            grafo._node[nodo] = atributos
+            grafo._adj[nodo] = {}
+            grafo._pred[nodo] = {}
+            self._copiados.update((("nodo", nodo), ("adj", nodo), ("pred", nodo)))
+            self.atributos_previos.setdefault(nodo, None)
+        else:
+            data = grafo._node[nodo]
+            if all(data.get(k) == v for k, v in atributos.items()):
+                return
+            self.atributos_previos.setdefault(nodo, dict(data))
+            self._propio(grafo._node, "nodo", nodo).update(atributos)
+        self.tocados.add(nodo)
+
+    def poner_arista(self, u, v, **atributos):
+        grafo = self.grafo
+        anterior = grafo._adj[u].get(v)
+        if anterior is not None and all(anterior.get(k) == x for k, x in atributos.items()):
+            return
+        # El mismo dict de atributos se comparte entre _adj[u][v] y _pred[v][u]
+        data = {**anterior, **atributos} if anterior is not None else atributos
+        self._propio(grafo._adj, "adj", u)[v] = data
+        self._propio(grafo._pred, "pred", v)[u] = data
+        self.tocados.update((u, v))
+
+    def quitar_arista(self, u, v):
+        del self._propio(self.grafo._adj, "adj", u)[v]
+        del self._propio(self.grafo._pred, "pred", v)[u]
+        self.tocados.update((u, v))
+
+
+def aplicar_fila(editor: EditorGrafo, tipo: str, fila: dict, capitales: dict):
+    """Aplica una fila normalizada; lanza ValueError si no encaja en el grafo (nada queda a medias)."""
+    if tipo == "asociacion":
+        _aplicar_asociacion(editor, fila, capitales)
+    elif tipo == "mercado":
+        _aplicar_mercado(editor, fila, capitales)
+    else:
+        _aplicar_precio(editor, fila, capitales)
+
+
+def _capital_de(fila, capitales):
+    capital = capitales.get(fila["ubigeo"][:2])
+    if capital is None:
+        raise ValueError(f"El ubigeo {fila['ubigeo']} no corresponde a ninguna Capital del grafo")
+    return capital
+
+
+def _exigir_tipo(editor, nodo, tipo):
+    actual = editor.tipo(nodo)
+    if actual is not None and actual != tipo:
+        raise ValueError(f"{nodo} ya existe como {actual}, no como {tipo}")
+
+
+def _aplicar_asociacion(editor, fila, capitales):
+    asociacion, producto = fila["id_asociacion"], fila["PRODUCTO"]
+    _exigir_tipo(editor, asociacion, "Asociacion")
+    _exigir_tipo(editor, producto, "Producto")
+    capital = _capital_de(fila, capitales)
+
+    editor.poner_nodo(asociacion, tipo="Asociacion", departamento=fila["departamento"],
+                      provincia=fila.get("provincia"), distrito=fila.get("distrito"), ubigeo=fila["ubigeo"])
+    # Una Asociación vende un solo producto: si cambió, se quita la arista al anterior
+    for anterior in list(editor.grafo._adj[asociacion]):
+        if anterior != producto and editor.tipo(anterior) == "Producto":
+            editor.quitar_arista(asociacion, anterior)
+    if editor.tipo(producto) is None:
+        editor.poner_nodo(producto, tipo="Producto")
+    editor.poner_arista(asociacion, producto, peso=0, relacion="vende")
+    editor.poner_arista(producto, capital, peso=fila["PRECIO_MAYORISTA"], relacion="precio_adquisicion")
+
+
+def _aplicar_mercado(editor, fila, capitales):
+    mercado = fila["id_anonimo_cenama"]
+    _exigir_tipo(editor, mercado, "Mercado")
+    capital = capitales.get(fila["ubigeo"][:2], str(fila["departamento"]).upper())
+
+    editor.poner_nodo(mercado, tipo="Mercado", departamento=fila["departamento"],
+                      provincia=fila.get("provincia"), distrito=fila.get("distrito"), ubigeo=fila["ubigeo"])
+    for anterior in list(editor.grafo._pred[mercado]):
+        if anterior != capital and editor.tipo(anterior) == "Capital":
+            editor.quitar_arista(anterior, mercado)
+    # Igual que panda.py: sin Capital conocida el Mercado queda sin arista de distribución
+    if editor.tipo(capital) == "Capital":
+        editor.poner_arista(capital, mercado, peso=0, relacion="distribucion_final")
+
+
+def _aplicar_precio(editor, fila, capitales):
+    producto = fila["PRODUCTO"]
+    if editor.tipo(producto) != "Producto":
+        raise ValueError(f"El producto {producto} no existe en el grafo")
+    if "ubigeo" in fila:
+        destinos = [_capital_de(fila, capitales)]
+    else:
+        destinos = [v for v in editor.grafo._adj[producto] if editor.tipo(v) == "Capital"]
+        if not destinos:
+            raise ValueError(f"El producto {producto} no tiene precios por Capital; indique el ubigeo")
+    for capital in destinos:
+        editor.poner_arista(producto, capital, peso=fila["PRECIO_MAYORISTA"], relacion="precio_adquisicion")
+
+
+def aplicar_filas(editor: EditorGrafo, filas, capitales: dict):
+    """
+    Normaliza y aplica [{"tipo", "fila"}]. Devuelve (normalizadas, errores); si
+    hay errores el editor queda inconsistente y debe descartarse.
+    """
+    normalizadas, errores = [], []
+    for i, entrada in enumerate(filas):
+        try:
+            if not isinstance(entrada, dict):
+                raise ValueError("Cada elemento debe ser {\"tipo\": ..., \"fila\": {...}}")
+            tipo = entrada.get("tipo")
+            fila = normalizar_fila(tipo, entrada.get("fila"))
+            aplicar_fila(editor, tipo, fila, capitales)
+            normalizadas.append({"tipo": tipo, "fila": fila})
+        except ValueError as e:
+            errores.append({"indice": i, "error": str(e)})
+    return normalizadas, errores
+
+
+# =========================================================================
+# REGISTRO APPEND-ONLY
+# =========================================================================
+class RegistroDeltas:
+    """
+    Archivo JSONL: una cabecera {"graphml_sha1", "creado"} y después una línea
+    por fila aplicada {"secuencia", "fecha", "tipo", "fila"}. Solo se agregan
+    líneas (con fsync); varios procesos pueden anotar a la vez porque cada
+    escritura toma un bloqueo exclusivo del archivo.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+
+    @contextlib.contextmanager
+    def _bloqueado(self):
+        while True:
+            archivo = open(self.ruta, "a+b")
+            if fcntl is None:
+                break
+            fcntl.flock(archivo, fcntl.LOCK_EX)
+            # compactar() reemplaza el archivo: si pasó mientras se esperaba el
+            # bloqueo, este descriptor apunta al archivo viejo y hay que reabrir
+            try:
+                vigente = os.stat(self.ruta).st_ino == os.fstat(archivo.fileno()).st_ino
+            except FileNotFoundError:
+                vigente = False
+            if vigente:
+                break
+            archivo.close()
+        try:
+            yield archivo
+        finally:
+            if fcntl is not None:
+                fcntl.flock(archivo, fcntl.LOCK_UN)
+            archivo.close()
+
+    def firma(self):
+        """(mtime, tamaño) del archivo, para detectar cambios sin leerlo."""
+        try:
+            estado = os.stat(self.ruta)
+        except OSError:
+            return None
+        return estado.st_mtime, estado.st_size
+
+    def leer(self, desde: int = 0):
+        """(cabecera, entradas con secuencia > desde). Sin archivo: (None, [])."""
+        if not os.path.exists(self.ruta):
+            return None, []
+        with open(self.ruta, encoding="utf-8") as archivo:
+            cabecera = json.loads(archivo.readline() or "null")
+            entradas = []
+            for linea in archivo:
+                if not linea.strip():
+                    continue
+                try:
+                    entrada = json.loads(linea)
+                except json.JSONDecodeError:
+                    # Una línea truncada solo puede ser la última (escritura interrumpida)
+                    print(f"⚠️  Línea incompleta en {self.ruta}; se ignora")
+                    continue
+                if entrada["secuencia"] > desde:
+                    entradas.append(entrada)
+        return cabecera, entradas
+
+    def agregar(self, filas, sha1_base: str):
+        """Anota las filas normalizadas y devuelve las entradas con su secuencia."""
+        with self._bloqueado() as archivo:
+            archivo.seek(0)
+            primera = archivo.readline()
+            if not primera:
+                archivo.write(_linea(_cabecera(sha1_base)))
+                ultima = 0
+            else:
+                cabecera = json.loads(primera)
+                if cabecera.get("graphml_sha1") != sha1_base:
+                    raise ValueError("El registro de deltas corresponde a otro GraphML; recargue el grafo")
+                ultima = _ultima_secuencia(archivo)
+            fecha = time.strftime("%Y-%m-%dT%H:%M:%S")
+            entradas = [{"secuencia": ultima + i, "fecha": fecha, **fila} for i, fila in enumerate(filas, 1)]
+            archivo.write(b"".join(_linea(e) for e in entradas))
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        return entradas
+
+    def compactar(self, sha1_base: str, hasta: int, escribir_base):
+        """
+        Reinicia el registro después de incorporar al GraphML las entradas hasta
+        la secuencia `hasta`, todo con el bloqueo del archivo tomado para que
+        ningún proceso anote entre medio:
+          - si el registro ya no es del GraphML `sha1_base` (otro proceso
+            compactó antes) se aborta con ValueError sin escribir nada;
+          - `escribir_base()` escribe el GraphML nuevo y devuelve su SHA-1;
+          - las entradas posteriores a `hasta` (anotadas por otro proceso
+            después de leer el registro) pasan al registro nuevo, renumeradas
+            desde 1, bajo la cabecera del GraphML nuevo.
+        Devuelve (SHA-1 del GraphML nuevo, entradas conservadas).
+        """
+        with self._bloqueado():
+            cabecera, posteriores = self.leer(desde=hasta)
+            if cabecera is None or cabecera.get("graphml_sha1") != sha1_base:
+                raise ValueError("El registro de deltas corresponde a otro GraphML (¿ya se compactó?); recargue el grafo")
+            sha1_nuevo = escribir_base()
+            conservadas = [{**entrada, "secuencia": entrada["secuencia"] - hasta} for entrada in posteriores]
+            temporal = f"{self.ruta}.{os.getpid()}.tmp"
+            with open(temporal, "wb") as archivo:
+                archivo.write(_linea(_cabecera(sha1_nuevo)))
+                archivo.write(b"".join(_linea(e) for e in conservadas))
+                archivo.flush()
+                os.fsync(archivo.fileno())
+            os.replace(temporal, self.ruta)
+        return sha1_nuevo, conservadas
+
+
+def _linea(objeto) -> bytes:
+    return (json.dumps(objeto, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _cabecera(sha1_base):
+    return {"graphml_sha1": sha1_base, "creado": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def _ultima_secuencia(archivo) -> int:
+    """Secuencia de la última línea completa, leyendo solo el final del archivo."""
+    archivo.seek(0, os.SEEK_END)
+    tamano = archivo.tell()
+    desplazamiento = 4096
+    while True:
+        archivo.seek(max(0, tamano - desplazamiento))
+        lineas = archivo.read().decode("utf-8", errors="replace").splitlines()
+        for linea in reversed(lineas[1:] if desplazamiento < tamano else lineas):
+            try:
+                entrada = json.loads(linea)
+            except json.JSONDecodeError:
+                continue
+            return entrada.get("secuencia", 0)
+        if desplazamiento >= tamano:
+            return 0
+        desplazamiento *= 4
+
+
+def reproducir_registro(grafo, ruta_graphml: str, sha1_base: str) -> int:
+    """
+    Aplica en el sitio las filas del registro sobre el grafo recién leído del
+    GraphML y devuelve la última secuencia aplicada (0 si no hay registro o es
+    de otro GraphML, por ejemplo porque se regeneró con panda.py).
+    """
+    registro = RegistroDeltas(ruta_registro(ruta_graphml))
+    cabecera, entradas = registro.leer()
+    if cabecera is None:
+        return 0
+    if cabecera.get("graphml_sha1") != sha1_base:
+        print(f"⚠️  {registro.ruta} corresponde a otro GraphML; se ignoran sus deltas")
+        return 0
+    inicio = time.perf_counter()
+    editor = EditorGrafo(grafo, en_sitio=True)
+    capitales = capitales_por_codigo(grafo)
+    ultima = 0
+    for entrada in entradas:
+        try:
+            aplicar_fila(editor, entrada["tipo"], entrada["fila"], capitales)
+        except ValueError as e:
+            print(f"⚠️  Delta {entrada['secuencia']} no aplicable: {e}")
+        ultima = entrada["secuencia"]
+    if entradas:
+        print(f"🧾 {len(entradas)} deltas reproducidos desde {NOMBRE_REGISTRO} "
+              f"({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+    return ultima
+
+
+def escribir_graphml(grafo, ruta_graphml: str) -> str:
+    """Escribe el GraphML de forma atómica (archivo temporal + reemplazo) y devuelve su SHA-1."""
+    temporal = f"{ruta_graphml}.{os.getpid()}.tmp"
+    nx.write_graphml(grafo, temporal)
+    os.replace(temporal, ruta_graphml)
+    return sha1_archivo(ruta_graphml)
+
+
+# =========================================================================
+# CLI
+# =========================================================================
+def _leer_filas(ruta):
+    """Filas de un JSONL ({"tipo", "fila"} por línea) o de un CSV con una columna "tipo"."""
+    with open(ruta, encoding="utf-8-sig", newline="") as archivo:
+        if ruta.lower().endswith(".csv"):
+            return [{"tipo": fila.pop("tipo", None), "fila": fila} for fila in csv.DictReader(archivo)]
+        return [json.loads(linea) for linea in archivo if linea.strip()]
+
+
+def _cargar(ruta_graphml):
+    grafo = nx.read_graphml(ruta_graphml)
+    sha1 = sha1_archivo(ruta_graphml)
+    return grafo, sha1, reproducir_registro(grafo, ruta_graphml, sha1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingesta incremental de filas en el grafo de AgriLink")
+    parser.add_argument("--graphml", default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "Panditas", "Proyecto_Grafo_Archivos",
+        "Grafo_Proyecto_Actualizado.graphml"))
+    sub = parser.add_subparsers(dest="comando", required=True)
+    aplicar = sub.add_parser("aplicar", help="Aplicar filas (JSONL o CSV con columna 'tipo')")
+    aplicar.add_argument("archivo")
+    aplicar.add_argument("--url", help="Enviar al backend en marcha (p. ej. http://localhost:5000) en vez de anotar en el registro")
+    sub.add_parser("estado", help="Resumen del registro de deltas")
+    sub.add_parser("compactar", help="Escribir un GraphML con los deltas incluidos y reiniciar el registro")
+    args = parser.parse_args(argv)
+    ruta_graphml = os.path.abspath(args.graphml)
+    registro = RegistroDeltas(ruta_registro(ruta_graphml))
+
+    if args.comando == "aplicar":
+        filas = _leer_filas(args.archivo)
+        if args.url:
+            peticion = urllib.request.Request(
+                args.url.rstrip("/") + "/api/admin/grafo/deltas",
+                data=json.dumps({"filas": filas}).encode("utf-8"),
+                headers={"Content-Type": "application/json"}, method="POST")
+            try:
+                with urllib.request.urlopen(peticion) as respuesta:
+                    print(respuesta.read().decode("utf-8"))
+            except urllib.error.HTTPError as e:
+                print(e.read().decode("utf-8"))
+                sys.exit(1)
+            return
+        # Sin servidor: se validan contra el GraphML + registro y solo se anotan;
+        # el backend las aplica al recargar o, con vigilancia, en el siguiente sondeo
+        grafo, sha1, _ = _cargar(ruta_graphml)
+        normalizadas, errores = aplicar_filas(EditorGrafo(grafo), filas, capitales_por_codigo(grafo))
+        if errores:
+            print(json.dumps({"error": "Filas inválidas; no se anotó ninguna", "filas_invalidas": errores},
+                             indent=2, ensure_ascii=False))
+            sys.exit(1)
+        entradas = registro.agregar(normalizadas, sha1)
+        print(f"🧾 {len(entradas)} filas anotadas en {registro.ruta} "
+              f"(secuencias {entradas[0]['secuencia']}-{entradas[-1]['secuencia']})")
+    elif args.comando == "estado":
+        cabecera, entradas = registro.leer()
+        print(json.dumps({
+            "registro": registro.ruta,
+            "cabecera": cabecera,
+            "entradas": len(entradas),
+            "ultima_secuencia": entradas[-1]["secuencia"] if entradas else 0,
+            "graphml_coincide": cabecera is not None and cabecera.get("graphml_sha1") == sha1_archivo(ruta_graphml),
+        }, indent=2, ensure_ascii=False))
+    else:
+        grafo, sha1, ultima = _cargar(ruta_graphml)
+        if not ultima:
+            print("Nada que compactar")
+            return
+        try:
+            _, conservadas = registro.compactar(sha1, ultima, lambda: escribir_graphml(grafo, ruta_graphml))
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"🗜️  {ruta_graphml} reescrito con los deltas hasta la secuencia {ultima}; registro reiniciado"
+              + (f" ({len(conservadas)} filas anotadas entre medio se conservan)" if conservadas else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import threading
+from collections import OrderedDict
+
+from instrumentacion import metricas
+
+
+class CacheLRU:
+    """Caché LRU acotada y segura entre hilos; registra aciertos/fallos en las métricas."""
+
+    def __init__(self, nombre: str, capacidad: int):
+        self.nombre = nombre
+        self.capacidad = capacidad
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            valor = self._datos.get(clave)
+            if valor is not None:
+                self._datos.move_to_end(clave)
+        metricas.registrar_cache(self.nombre, valor is not None)
+        return valor
+
+    def guardar(self, clave, valor):
+        if self.capacidad <= 0:
+            return
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.capacidad:
+                self._datos.popitem(last=False)
+
+    def __contains__(self, clave):
+        """Si la clave está guardada, sin contar acierto/fallo ni moverla en el LRU."""
+        return clave in self._datos
+
+    def __len__(self):
+        return len(self._datos)
+
+
+class InstantaneaGrafo:
+    """
+    Versión inmutable de todo lo que depende del grafo: el grafo congelado
+    (nx.freeze), sus atributos por columnas, los descuentos, los índices
+    derivados y la caché de rutas de
+    esa versión. AlgoritmosService publica una instantánea nueva con una sola
+    asignación, así que cada petición trabaja de principio a fin sobre la
+    versión que tomó al empezar y las cachés de versiones viejas se descartan
+    junto con su instantánea.
+    """
+
+    __slots__ = (
+        "version", "grafo", "atributos", "descuentos", "version_descuentos", "alcanzabilidad",
+        "indice_busqueda", "similitud_productos", "indice_ubigeo", "cache_rutas",
+        "ruta_archivo", "mtime_archivo", "sha1_archivo", "secuencia_deltas",
+    )
+
+    def __init__(self, **campos):
+        for campo in self.__slots__:
+            object.__setattr__(self, campo, campos.get(campo))
+
+    def __setattr__(self, nombre, valor):
+        raise AttributeError("InstantaneaGrafo es inmutable; publique una instantánea nueva")
+
+    def con(self, **cambios):
+        """Instantánea nueva igual a esta salvo los campos indicados."""
+        return InstantaneaGrafo(**{**{campo: getattr(self, campo) for campo in self.__slots__}, **cambios})
@@ -0,0 +1,212 @@
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+import config
+
+# Límites (en segundos) de los buckets de los histogramas de latencia
+BUCKETS_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_ETAPA_NULA = nullcontext()
+
+
+class _Etapa:
+    """Context manager que mide una etapa con nombre dentro de la petición actual."""
+    __slots__ = ("_metricas", "_nombre", "_inicio")
+
+    def __init__(self, metricas, nombre):
+        self._metricas = metricas
+        self._nombre = nombre
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duracion = time.perf_counter() - self._inicio
+        self._metricas.observar("agrilink_etapa_duracion_segundos", duracion, etapa=self._nombre)
+        etapas = getattr(self._metricas._local, "etapas", None)
+        if etapas is not None:
+            etapas.append((self._nombre, duracion))
+        return False
+
+
+class Metricas:
+    """
+    Registro de métricas en memoria (contadores, gauges e histogramas) que se
+    exporta en formato de texto de Prometheus. Si está deshabilitado, todas las
+    operaciones retornan de inmediato y `etapa()` devuelve un contexto nulo.
+    """
+
+    def __init__(self, habilitado: bool = True):
+        self.habilitado = habilitado
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._descripciones = {}   # nombre -> (tipo, ayuda)
+        self._contadores = {}      # (nombre, etiquetas) -> valor
+        self._gauges = {}          # (nombre, etiquetas) -> valor
+        self._gauges_dinamicos = {}  # nombre -> función que devuelve {etiquetas: valor}
+        self._histogramas = {}     # (nombre, etiquetas) -> [conteos por bucket, suma, total]
+
+        self.describir("agrilink_peticiones_total", "counter", "Peticiones HTTP atendidas por endpoint, método y código.")
+        self.describir("agrilink_peticion_duracion_segundos", "histogram", "Latencia de las peticiones HTTP por endpoint.")
+        self.describir("agrilink_peticiones_en_curso", "gauge", "Peticiones HTTP en curso.")
+        self.describir("agrilink_etapa_duracion_segundos", "histogram", "Duración de las etapas internas con nombre.")
+        self.describir("agrilink_cache_aciertos_total", "counter", "Aciertos por caché.")
+        self.describir("agrilink_cache_fallos_total", "counter", "Fallos por caché.")
+
+    # --- Registro -----------------------------------------------------------
+    def describir(self, nombre: str, tipo: str, ayuda: str):
+        self._descripciones[nombre] = (tipo, ayuda)
+
+    def registrar_gauge(self, nombre: str, funcion, ayuda: str = ""):
+        """Registra un gauge que se evalúa al exportar. `funcion` devuelve un número o un dict {etiquetas: valor}."""
+        self.describir(nombre, "gauge", ayuda)
+        self._gauges_dinamicos[nombre] = funcion
+
+    # --- Operaciones --------------------------------------------------------
+    def incrementar(self, nombre: str, valor: float = 1, **etiquetas):
+        if not self.habilitado:
+            return
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def fijar(self, nombre: str, valor: float, **etiquetas):
+        if not self.habilitado:
+            return
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self._gauges[clave] = valor
+
+    def sumar_gauge(self, nombre: str, delta: float, **etiquetas):
+        if not self.habilitado:
+            return
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self._gauges[clave] = self._gauges.get(clave, 0) + delta
+
+    def observar(self, nombre: str, valor: float, **etiquetas):
+        if not self.habilitado:
+            return
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        indice = bisect_left(BUCKETS_LATENCIA, valor)
+        with self._lock:
+            histograma = self._histogramas.get(clave)
+            if histograma is None:
+                histograma = [[0] * (len(BUCKETS_LATENCIA) + 1), 0.0, 0]
+                self._histogramas[clave] = histograma
+            histograma[0][indice] += 1
+            histograma[1] += valor
+            histograma[2] += 1
+
+    def registrar_cache(self, cache: str, acierto: bool):
+        self.incrementar("agrilink_cache_aciertos_total" if acierto else "agrilink_cache_fallos_total", cache=cache)
+
+    def etapa(self, nombre: str):
+        """Mide una etapa: `with metricas.etapa("bellman_ford"): ...`"""
+        if not self.habilitado:
+            return _ETAPA_NULA
+        return _Etapa(self, nombre)
+
+    # --- Ciclo de vida de la petición --------------------------------------
+    def iniciar_peticion(self):
+        if not self.habilitado:
+            return
+        self._local.inicio = time.perf_counter()
+        self._local.etapas = []
+        self.sumar_gauge("agrilink_peticiones_en_curso", 1)
+
+    def finalizar_peticion(self, endpoint: str, metodo: str, codigo: int):
+        """Registra la latencia de la petición y devuelve sus etapas [(nombre, segundos)]."""
+        if not self.habilitado:
+            return []
+        inicio = getattr(self._local, "inicio", None)
+        etapas = getattr(self._local, "etapas", None) or []
+        if inicio is not None:
+            self.observar("agrilink_peticion_duracion_segundos", time.perf_counter() - inicio, endpoint=endpoint)
+        self.incrementar("agrilink_peticiones_total", endpoint=endpoint, metodo=metodo, codigo=str(codigo))
+        return etapas
+
+    def cerrar_peticion(self):
+        if not self.habilitado or getattr(self._local, "inicio", None) is None:
+            return
+        self._local.inicio = None
+        self._local.etapas = None
+        self.sumar_gauge("agrilink_peticiones_en_curso", -1)
+
+    # --- Exportación --------------------------------------------------------
+    def exportar_prometheus(self) -> str:
+        with self._lock:
+            contadores = dict(self._contadores)
+            gauges = dict(self._gauges)
+            histogramas = {clave: (list(h[0]), h[1], h[2]) for clave, h in self._histogramas.items()}
+
+        for nombre, funcion in self._gauges_dinamicos.items():
+            try:
+                valor = funcion()
+            except Exception:
+                continue
+            if isinstance(valor, dict):
+                for etiquetas, v in valor.items():
+                    gauges[(nombre, tuple(sorted(dict(etiquetas).items())))] = v
+            else:
+                gauges[(nombre, ())] = valor
+
+        lineas = []
+        for serie, tipo in ((contadores, "counter"), (gauges, "gauge")):
+            for nombre in sorted({n for n, _ in serie}):
+                self._cabecera(lineas, nombre, tipo)
+                for (n, etiquetas), valor in sorted(serie.items()):
+                    if n == nombre:
+                        lineas.append(f"{nombre}{_formatear_etiquetas(etiquetas)} {_formatear_valor(valor)}")
+
+        for nombre in sorted({n for n, _ in histogramas}):
+            self._cabecera(lineas, nombre, "histogram")
+            for (n, etiquetas), (conteos, suma, total) in sorted(histogramas.items()):
+                if n != nombre:
+                    continue
+                acumulado = 0
+                for limite, conteo in zip(BUCKETS_LATENCIA, conteos):
+                    acumulado += conteo
+                    lineas.append(f"{nombre}_bucket{_formatear_etiquetas(etiquetas + (('le', _formatear_valor(float(limite))),))} {acumulado}")
+                lineas.append(f"{nombre}_bucket{_formatear_etiquetas(etiquetas + (('le', '+Inf'),))} {total}")
+                lineas.append(f"{nombre}_sum{_formatear_etiquetas(etiquetas)} {_formatear_valor(suma)}")
+                lineas.append(f"{nombre}_count{_formatear_etiquetas(etiquetas)} {total}")
+
+        return "\n".join(lineas) + "\n"
+
+    def _cabecera(self, lineas, nombre, tipo):
+        tipo, ayuda = self._descripciones.get(nombre, (tipo, ""))
+        if ayuda:
+            lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+
+
+def _formatear_etiquetas(etiquetas) -> str:
+    if not etiquetas:
+        return ""
+    partes = []
+    for clave, valor in etiquetas:
+        valor = str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        partes.append(f'{clave}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def _formatear_valor(valor) -> str:
+    if isinstance(valor, bool):
+        return "1" if valor else "0"
+    if isinstance(valor, int):
+        return str(valor)
+    valor = float(valor)
+    # El formato de texto de Prometheus escribe así los valores especiales (repr da inf / nan)
+    if math.isnan(valor):
+        return "NaN"
+    if math.isinf(valor):
+        return "+Inf" if valor > 0 else "-Inf"
+    return repr(valor)
+
+
+metricas = Metricas(config.METRICAS_HABILITADAS)
@@ -0,0 +1,52 @@
+import json
+import os
+import time
+
+import numpy as np
+
+PREFIJO = "Matriz_Costos"
+
+
+class MatrizCostos:
+    """
+    Lectura de la matriz Asociación x Mercado que genera Panditas/matriz_costos.py.
+    El .npz comprimido se descomprime una sola vez a un .npy junto a él (escritura
+    atómica, así varios workers pueden hacerlo a la vez) y ese .npy se abre con
+    memoria mapeada: todos los procesos comparten las páginas del sistema y una
+    consulta es leer una celda, sin búsqueda.
+    """
+
+    def __init__(self, carpeta: str):
+        inicio = time.perf_counter()
+        base = os.path.join(carpeta, PREFIJO)
+        with open(f"{base}_meta.json", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.mtime = os.path.getmtime(f"{base}_meta.json")
+
+        self._filas = {}
+        with open(f"{base}_asociaciones.tsv", encoding="utf-8") as f:
+            for i, linea in enumerate(f):
+                asociacion, producto, modo = linea.rstrip("\n").split("\t")
+                self._filas[asociacion] = (i, producto, modo)
+        with open(f"{base}_mercados.txt", encoding="utf-8") as f:
+            self._columnas = {m: j for j, m in enumerate(f.read().split())}
+
+        ruta_npy = f"{base}.npy"
+        if not os.path.exists(ruta_npy) or os.path.getmtime(ruta_npy) < os.path.getmtime(f"{base}.npz"):
+            with np.load(f"{base}.npz") as comprimido:
+                temporal = f"{ruta_npy}.{os.getpid()}.tmp"
+                with open(temporal, "wb") as f:
+                    np.save(f, comprimido["transporte"])
+                os.replace(temporal, ruta_npy)
+        self.transporte = np.load(ruta_npy, mmap_mode="r")
+        print(f"🧮 Matriz de costos {self.transporte.shape[0]} x {self.transporte.shape[1]} mapeada "
+              f"({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+
+    def celda(self, asociacion: str, mercado: str):
+        """(transporte, producto, modo) o None si el par no está en la matriz."""
+        fila = self._filas.get(asociacion)
+        columna = self._columnas.get(mercado)
+        if fila is None or columna is None:
+            return None
+        i, producto, modo = fila
+        return float(self.transporte[i, columna]), producto, modo
@@ -0,0 +1,170 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentacion import metricas
+
+
+class ModoSombra:
+    """
+    Ejecución en sombra de los motores rápidos de rutas. En una muestra de las
+    peticiones (`proporcion`, entre 0 y 1) el resultado ya servido se compara,
+    fuera del camino de la petición, con el cálculo de referencia de networkx, y
+    cada comparación termina en:
+      - coincide: mismos costos (dentro de `tolerancia`) y mismas rutas;
+      - empate:   mismos costos pero otra ruta igual de barata;
+      - difiere:  algún costo fuera de la tolerancia (o N/A en solo un lado);
+      - error:    la referencia lanzó una excepción.
+    Las referencias se calculan de a una en un hilo aparte; si ya hay
+    `max_pendientes` en espera la muestra se descarta, así la sombra nunca
+    frena ni acumula trabajo detrás del tráfico real. Las discrepancias
+    (empate, difiere, error) se agregan como líneas JSON a `ruta_registro`.
+    """
+
+    RESULTADOS = ("coincide", "empate", "difiere", "error", "descartada")
+
+    def __init__(self, proporcion: float, tolerancia: float, ruta_registro: str, max_pendientes: int = 32):
+        self.proporcion = proporcion
+        self.tolerancia = tolerancia
+        self.ruta_registro = ruta_registro
+        self.max_pendientes = max_pendientes
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sombra")
+        self._lock = threading.Lock()
+        self._lock_registro = threading.Lock()
+        self._pendientes = 0
+        self._por_motor = {}   # motor -> {"resultados": {resultado: n}, "rapido_s": suma, "referencia_s": suma}
+        self._ultimas = deque(maxlen=20)
+        metricas.describir("agrilink_sombra_comparaciones_total", "counter",
+                           "Comparaciones en sombra por motor y resultado (coincide, empate, difiere, error, descartada).")
+        metricas.describir("agrilink_sombra_latencia_segundos", "histogram",
+                           "Latencia de las peticiones muestreadas por motor: calculo=rapido (servido) o referencia (networkx).")
+        metricas.registrar_gauge("agrilink_sombra_pendientes", lambda: self._pendientes,
+                                 "Comparaciones en sombra esperando su cálculo de referencia.")
+
+    def muestrear(self) -> bool:
+        return self.proporcion > 0 and random.random() < self.proporcion
+
+    def enviar(self, motor: str, consulta: dict, rapido: dict, latencia_rapida: float, calcular_referencia) -> bool:
+        """
+        Encola la comparación de `rapido` ({criterio: (costo, ruta o None)}) con
+        `calcular_referencia()`, que devuelve lo mismo para los criterios pedidos.
+        Retorna False si la muestra se descartó por falta de cupo.
+        """
+        with self._lock:
+            if self._pendientes >= self.max_pendientes:
+                self._contar(motor, "descartada")
+                return False
+            self._pendientes += 1
+        self._executor.submit(self._comparar, motor, consulta, rapido, latencia_rapida, calcular_referencia)
+        return True
+
+    def _comparar(self, motor, consulta, rapido, latencia_rapida, calcular_referencia):
+        try:
+            inicio = time.perf_counter()
+            try:
+                referencia = calcular_referencia()
+            except Exception as e:
+                self._anotar(motor, consulta, "error", latencia_rapida, None, error=f"{type(e).__name__}: {e}")
+                return
+            latencia_referencia = time.perf_counter() - inicio
+            diferencias = comparar_resultados(rapido, referencia, self.tolerancia)
+            if any(d["campo"] == "costo" for d in diferencias):
+                resultado = "difiere"
+            else:
+                resultado = "empate" if diferencias else "coincide"
+            self._anotar(motor, consulta, resultado, latencia_rapida, latencia_referencia, diferencias=diferencias)
+        finally:
+            with self._lock:
+                self._pendientes -= 1
+
+    def _anotar(self, motor, consulta, resultado, latencia_rapida, latencia_referencia, **detalle):
+        with self._lock:
+            self._contar(motor, resultado)
+            agregado = self._por_motor[motor]
+            if latencia_referencia is not None:
+                agregado["rapido_s"] += latencia_rapida
+                agregado["referencia_s"] += latencia_referencia
+        metricas.observar("agrilink_sombra_latencia_segundos", latencia_rapida, motor=motor, calculo="rapido")
+        if latencia_referencia is not None:
+            metricas.observar("agrilink_sombra_latencia_segundos", latencia_referencia, motor=motor, calculo="referencia")
+        if resultado == "coincide":
+            return
+
+        entrada = {
+            "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "pid": os.getpid(),
+            "motor": motor,
+            "resultado": resultado,
+            **consulta,
+            "latencia_rapida_ms": round(latencia_rapida * 1000, 3),
+            "latencia_referencia_ms": round(latencia_referencia * 1000, 3) if latencia_referencia is not None else None,
+            **detalle,
+        }
+        self._ultimas.append(entrada)
+        if resultado != "empate":
+            print(f"⚠️ Sombra [{motor}] {resultado}: {consulta.get('origen')} -> {consulta.get('destino')} "
+                  f"{detalle.get('error') or detalle.get('diferencias')}")
+        try:
+            with self._lock_registro:
+                os.makedirs(os.path.dirname(self.ruta_registro) or ".", exist_ok=True)
+                with open(self.ruta_registro, "a", encoding="utf-8") as archivo:
+                    archivo.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"❌ No se pudo escribir el registro de sombra ({self.ruta_registro}): {e}")
+
+    def _contar(self, motor, resultado):
+        """Se llama con `_lock` tomado."""
+        agregado = self._por_motor.get(motor)
+        if agregado is None:
+            agregado = self._por_motor[motor] = {"resultados": dict.fromkeys(self.RESULTADOS, 0),
+                                                 "rapido_s": 0.0, "referencia_s": 0.0}
+        agregado["resultados"][resultado] += 1
+        metricas.incrementar("agrilink_sombra_comparaciones_total", motor=motor, resultado=resultado)
+
+    def estado(self):
+        with self._lock:
+            motores = {}
+            for motor, agregado in self._por_motor.items():
+                resultados = dict(agregado["resultados"])
+                medidas = sum(resultados[r] for r in ("coincide", "empate", "difiere"))
+                motores[motor] = {
+                    **resultados,
+                    "latencia_rapida_media_ms": round(agregado["rapido_s"] / medidas * 1000, 3) if medidas else None,
+                    "latencia_referencia_media_ms": round(agregado["referencia_s"] / medidas * 1000, 3) if medidas else None,
+                }
+            return {
+                "proporcion": self.proporcion,
+                "tolerancia": self.tolerancia,
+                "pendientes": self._pendientes,
+                "max_pendientes": self.max_pendientes,
+                "registro": self.ruta_registro,
+                "motores": motores,
+                "ultimas_discrepancias": list(self._ultimas),
+            }
+
+
+def comparar_resultados(rapido: dict, referencia: dict, tolerancia: float) -> list:
+    """
+    Diferencias entre dos resultados {criterio: (costo, ruta)}: costos fuera de
+    la tolerancia (inf = sin ruta, -inf = ciclo negativo) y, si los costos
+    coinciden, rutas distintas. Una ruta None en `rapido` no se compara.
+    """
+    diferencias = []
+    for criterio, (costo, ruta) in rapido.items():
+        costo_referencia, ruta_referencia = referencia[criterio]
+        if not (costo == costo_referencia or abs(costo - costo_referencia) <= tolerancia):
+            diferencias.append({"criterio": criterio, "campo": "costo",
+                                "rapido": _costo_json(costo), "referencia": _costo_json(costo_referencia),
+                                "ruta_rapida": ruta, "ruta_referencia": ruta_referencia})
+        elif ruta is not None and list(ruta) != list(ruta_referencia):
+            diferencias.append({"criterio": criterio, "campo": "ruta",
+                                "rapido": ruta, "referencia": ruta_referencia})
+    return diferencias
+
+
+def _costo_json(costo):
+    return round(costo, 4) if costo not in (float('inf'), -float('inf')) else str(costo)
@@ -0,0 +1,565 @@
+"""
+Partición del grafo en shards regionales servidos por procesos locales.
+
+Toda ruta Asociación -> Mercado tiene la forma
+    Asociación -> Producto -> Capital ... (red troncal) ... Capital -> Mercado
+así que el grafo se separa en:
+  - shards regionales: las Asociaciones, Mercados y Capitales de un grupo de
+    regiones, con los Productos que venden esas Asociaciones (y sus aristas de
+    precio hacia cualquier Capital, que queda como nodo frontera);
+  - una capa troncal pequeña: las 25 Capitales y las aristas
+    transporte_interdepartamental, que guarda el coordinador.
+Las regiones son los departamentos (una Capital cada una) o las comunidades de
+Louvain del grafo completo, y se reparten en `num_shards` grupos equilibrados.
+
+Cada shard vive en un proceso aparte (solo carga su parte del grafo). El
+coordinador pide al shard del origen los tramos Asociación -> Capital, al del
+destino los tramos Capital -> Mercado y los une con las distancias troncales.
+Como las Capitales son la única frontera entre regiones, la ruta unida es la
+misma que la de Bellman-Ford / Dijkstra sobre el grafo completo.
+
+Informe de la partición (sin levantar procesos):
+    python particion_grafo.py --estrategia louvain --shards 4
+"""
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+import networkx as nx
+
+ESTRATEGIAS = ("departamentos", "louvain")
+
+
+# =========================================================================
+# PARTICIÓN
+# =========================================================================
+def regiones(grafo, estrategia: str = "departamentos", semilla: int = 42):
+    """Grupos de Capitales: una por departamento o las de cada comunidad de Louvain."""
+    capitales = sorted(n for n, data in grafo.nodes(data=True) if data.get('tipo') == 'Capital')
+    if estrategia == "departamentos":
+        return [[capital] for capital in capitales]
+    if estrategia == "louvain":
+        comunidades = nx.community.louvain_communities(grafo.to_undirected(as_view=True), seed=semilla)
+        conjunto = set(capitales)
+        return sorted(sorted(c for c in comunidad if c in conjunto)
+                      for comunidad in comunidades if not conjunto.isdisjoint(comunidad))
+    raise ValueError(f"Estrategia desconocida: {estrategia} (use {', '.join(ESTRATEGIAS)})")
+
+
+def capital_de_nodo(grafo):
+    """
+    Capital "dueña" de cada Mercado y Asociación: la que abastece al Mercado y
+    la capital legítima (departamento) de la Asociación. Las Asociaciones cuyo
+    departamento no es una Capital van con la Capital que abastece a los
+    Mercados de ese departamento.
+    """
+    duena = {}
+    por_departamento = defaultdict(Counter)
+    for nodo, data in grafo.nodes(data=True):
+        if data.get('tipo') == 'Mercado':
+            capital = next((u for u in grafo.predecessors(nodo) if grafo.nodes[u].get('tipo') == 'Capital'), None)
+            if capital is not None:
+                duena[nodo] = capital
+                por_departamento[data.get('departamento')][capital] += 1
+    for nodo, data in grafo.nodes(data=True):
+        if data.get('tipo') == 'Asociacion':
+            departamento = data.get('departamento')
+            if departamento in grafo and grafo.nodes[departamento].get('tipo') == 'Capital':
+                duena[nodo] = departamento
+            elif por_departamento.get(departamento):
+                duena[nodo] = por_departamento[departamento].most_common(1)[0][0]
+    return duena
+
+
+class Particion:
+    """Shards regionales (subgrafos), la capa troncal y a qué shard pertenece cada nodo."""
+
+    def __init__(self, grafo, estrategia: str = "departamentos", num_shards: int = 4, semilla: int = 42):
+        inicio = time.perf_counter()
+        self.estrategia = estrategia
+        grupos = regiones(grafo, estrategia, semilla)
+        duena = capital_de_nodo(grafo)
+
+        peso_capital = Counter(duena.values())
+        for grupo in grupos:
+            for capital in grupo:
+                peso_capital[capital] += 1
+
+        # Reparto voraz: la región más pesada al shard con menos nodos
+        num_shards = max(1, min(num_shards, len(grupos)))
+        self.regiones = [[] for _ in range(num_shards)]
+        carga = [0] * num_shards
+        for grupo in sorted(grupos, key=lambda g: -sum(peso_capital[c] for c in g)):
+            i = carga.index(min(carga))
+            self.regiones[i].extend(grupo)
+            carga[i] += sum(peso_capital[c] for c in grupo)
+
+        shard_capital = {c: i for i, grupo in enumerate(self.regiones) for c in grupo}
+        self.shard_de = dict(shard_capital)
+        sin_duena = 0
+        for nodo, capital in duena.items():
+            self.shard_de[nodo] = shard_capital[capital]
+        for nodo, data in grafo.nodes(data=True):
+            if data.get('tipo') in ('Asociacion', 'Mercado') and nodo not in self.shard_de:
+                self.shard_de[nodo] = 0
+                sin_duena += 1
+
+        miembros = [set(grupo) for grupo in self.regiones]
+        for nodo, i in self.shard_de.items():
+            miembros[i].add(nodo)
+
+        self.shards = []
+        replicados = 0
+        for nodos in miembros:
+            productos = {v for a in nodos if grafo.nodes[a].get('tipo') == 'Asociacion'
+                         for v in grafo.successors(a) if grafo.nodes[v].get('tipo') == 'Producto'}
+            frontera = {c for p in productos for c in grafo.successors(p)} - nodos
+            replicados += len(productos) + len(frontera)
+            shard = grafo.subgraph(nodos | productos | frontera).copy()
+            shard.remove_edges_from([(u, v) for u, v, data in shard.edges(data=True)
+                                     if data.get('relacion') == 'transporte_interdepartamental'])
+            self.shards.append(shard)
+
+        self.troncal = nx.DiGraph()
+        self.troncal.add_nodes_from(shard_capital)
+        self.troncal.add_edges_from((u, v, {'peso': data.get('peso', 0)}) for u, v, data in grafo.edges(data=True)
+                                    if u in shard_capital and v in shard_capital)
+
+        self.reporte = {
+            "estrategia": estrategia,
+            "regiones": len(grupos),
+            "shards": [
+                {
+                    "shard": i,
+                    "capitales": sorted(self.regiones[i]),
+                    "nodos": shard.number_of_nodes(),
+                    "aristas": shard.number_of_edges(),
+                }
+                for i, shard in enumerate(self.shards)
+            ],
+            "troncal": {"capitales": self.troncal.number_of_nodes(), "aristas": self.troncal.number_of_edges()},
+            "nodos_grafo": grafo.number_of_nodes(),
+            "nodos_replicados": replicados,
+            "nodos_sin_capital": sin_duena,
+            "tiempo_ms": round((time.perf_counter() - inicio) * 1000, 1),
+        }
+
+
+# =========================================================================
+# PROCESO DE UN SHARD
+# =========================================================================
+class ServidorShard:
+    """
+    Atiende las órdenes del coordinador sobre un único shard. Reproduce los
+    pesos de los grafos de consulta de AlgoritmosService: de la Asociación solo
+    sale la arista Producto -> Capital legítima, que pesa el ahorro negativo
+    (Bellman-Ford) o el precio final con descuento (Dijkstra).
+    """
+
+    def __init__(self):
+        self.grafo = nx.DiGraph()
+        self.version = None
+        self.version_descuentos = None
+        self.precios = {}
+
+    def atender(self, mensaje):
+        orden = mensaje[0]
+        if orden == "cargar":
+            _, self.version, self.grafo = mensaje
+            return {"version": self.version, "nodos": self.grafo.number_of_nodes()}
+        if orden == "descuentos":
+            _, self.version_descuentos, self.precios = mensaje
+            return {"productos": len(self.precios)}
+        if orden == "salidas":
+            # Solo responde si el shard tiene el grafo y los descuentos que fijó la petición
+            _, origen, version, version_descuentos = mensaje
+            if (version, version_descuentos) != (self.version, self.version_descuentos):
+                return {"obsoleto": {"version": self.version, "version_descuentos": self.version_descuentos}}
+            return self.salidas(origen)
+        if orden == "entradas":
+            _, destino, version = mensaje
+            if version != self.version:
+                return {"obsoleto": {"version": self.version}}
+            return self.entradas(destino)
+        if orden == "estado":
+            return {
+                "pid": os.getpid(),
+                "version": self.version,
+                "version_descuentos": self.version_descuentos,
+                "nodos": self.grafo.number_of_nodes(),
+                "aristas": self.grafo.number_of_edges(),
+                "rss_mb": _rss_mb(),
+            }
+        raise ValueError(f"Orden desconocida: {orden}")
+
+    def salidas(self, origen):
+        """Tramos origen -> Capital por criterio: {criterio: {capital: (costo, ruta)}}."""
+        grafo = self.grafo
+        if origen not in grafo:
+            return {"bellman_ford": {}, "dijkstra": {}}
+        if grafo.nodes[origen].get('tipo') == 'Capital':
+            propio = {origen: (0, [origen])}
+            return {"bellman_ford": propio, "dijkstra": propio}
+
+        producto = next((v for v in grafo.successors(origen) if grafo.nodes[v].get('tipo') == 'Producto'), None)
+        capital = grafo.nodes[origen].get('departamento')
+        if producto is None:
+            return {"bellman_ford": {}, "dijkstra": {}}
+        peso_venta = grafo[origen][producto].get('peso', 0)
+        if capital is None:
+            # Sin capital legítima el grafo de consulta no se modifica
+            todas = {c: (peso_venta + data.get('peso', 0), [origen, producto, c])
+                     for c, data in grafo[producto].items() if grafo.nodes[c].get('tipo') == 'Capital'}
+            return {"bellman_ford": todas, "dijkstra": todas}
+
+        bellman_ford, dijkstra = {}, {}
+        if grafo.has_edge(producto, capital):
+            precio_original, precio_final = self.precios.get(producto, (None, None))
+            ahorro = precio_original - precio_final if precio_final is not None and precio_original is not None else 0
+            ruta = [origen, producto, capital]
+            bellman_ford[capital] = (peso_venta + -ahorro, ruta)
+            if precio_final is not None:
+                dijkstra[capital] = (peso_venta + precio_final, ruta)
+        return {"bellman_ford": bellman_ford, "dijkstra": dijkstra}
+
+    def entradas(self, destino):
+        """Tramos Capital -> destino: {capital: (peso, ruta)}."""
+        grafo = self.grafo
+        if destino not in grafo:
+            return {}
+        if grafo.nodes[destino].get('tipo') == 'Capital':
+            return {destino: (0, [destino])}
+        return {c: (data.get('peso', 0), [c, destino]) for c, data in grafo.pred[destino].items()
+                if grafo.nodes[c].get('tipo') == 'Capital'}
+
+
+def _rss_mb():
+    try:
+        with open(f"/proc/{os.getpid()}/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return round(int(linea.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def servir():
+    """Bucle del proceso shard: lee órdenes (pickle) por stdin y responde por stdout."""
+    entrada, salida = sys.stdin.buffer, sys.stdout.buffer
+    sys.stdout = sys.stderr    # los print no deben mezclarse con las respuestas
+    servidor = ServidorShard()
+    while True:
+        try:
+            mensaje = pickle.load(entrada)
+        except EOFError:
+            return
+        if mensaje is None:
+            return
+        try:
+            respuesta = (True, servidor.atender(mensaje))
+        except Exception as e:
+            respuesta = (False, f"{type(e).__name__}: {e}")
+        pickle.dump(respuesta, salida, protocol=pickle.HIGHEST_PROTOCOL)
+        salida.flush()
+
+
+# =========================================================================
+# COORDINADOR
+# =========================================================================
+# Lo que lanza la tubería de un proceso shard que murió
+_CAIDA = (EOFError, OSError, pickle.UnpicklingError)
+
+
+class ShardCaido(RuntimeError):
+    """El proceso de un shard murió y no respondió ni después de relanzarlo."""
+
+
+class _ProcesoShard:
+    """
+    Proceso hijo que sirve un shard; una orden a la vez (lock por proceso).
+    Guarda las últimas órdenes "cargar" y "descuentos" que recibió para
+    relanzarlo con el mismo estado si el proceso muere.
+    """
+
+    def __init__(self, indice: int):
+        self.indice = indice
+        self.lock = threading.Lock()
+        self._estado = {}
+        self.proceso = self._lanzar()
+
+    @staticmethod
+    def _lanzar():
+        return subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--servir"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        )
+
+    def enviar(self, mensaje):
+        if mensaje is not None and mensaje[0] in ("cargar", "descuentos"):
+            self._estado[mensaje[0]] = mensaje
+        pickle.dump(mensaje, self.proceso.stdin, protocol=pickle.HIGHEST_PROTOCOL)
+        self.proceso.stdin.flush()
+
+    def recibir(self):
+        ok, respuesta = pickle.load(self.proceso.stdout)
+        if not ok:
+            raise RuntimeError(f"Shard {self.indice}: {respuesta}")
+        return respuesta
+
+    def pedir(self, mensaje):
+        """Envía la orden y espera la respuesta; si el proceso murió lo relanza y la repite una vez."""
+        with self.lock:
+            try:
+                self.enviar(mensaje)
+                return self.recibir()
+            except _CAIDA:
+                self.reiniciar()
+            return self.repetir(mensaje)
+
+    def reiniciar(self):
+        """Con `lock` tomado: relanza el proceso y le reenvía su shard y su tabla de descuentos."""
+        print(f"⚠️ Shard {self.indice}: el proceso {self.proceso.pid} no responde; se relanza")
+        try:
+            self.proceso.kill()
+            self.proceso.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        for tuberia in (self.proceso.stdin, self.proceso.stdout):
+            try:
+                tuberia.close()
+            except OSError:
+                pass
+        self.proceso = self._lanzar()
+        for orden in ("cargar", "descuentos"):
+            if orden in self._estado:
+                self.repetir(self._estado[orden])
+
+    def repetir(self, mensaje):
+        """Con `lock` tomado y el proceso recién relanzado: una segunda caída ya no se reintenta."""
+        try:
+            self.enviar(mensaje)
+            return self.recibir()
+        except _CAIDA as e:
+            raise ShardCaido(f"Shard {self.indice}: el proceso relanzado tampoco responde ({type(e).__name__})") from e
+
+    def detener(self):
+        try:
+            with self.lock:
+                self.enviar(None)
+                self.proceso.stdin.close()
+        except (OSError, ValueError):
+            pass
+        try:
+            self.proceso.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.proceso.kill()
+
+
+class CoordinadorShards:
+    """
+    Reparte el grafo en shards, levanta un proceso por shard y une las rutas que
+    cruzan regiones sobre la capa troncal (distancias entre Capitales precalculadas).
+    """
+
+    def __init__(self, estrategia: str = "departamentos", num_shards: int = 4, semilla: int = 42):
+        if estrategia not in ESTRATEGIAS:
+            raise ValueError(f"Estrategia desconocida: {estrategia} (use {', '.join(ESTRATEGIAS)})")
+        self.estrategia = estrategia
+        self.num_shards = num_shards
+        self.semilla = semilla
+        self.version = None
+        self.version_descuentos = None
+        self.particion = None
+        self._procesos = []
+        # Última tabla publicada, para los procesos que se levanten después
+        self._precios = None
+        # (versión, partición, distancias troncales, caminos troncales) de la versión servida
+        self._vigente = None
+        self._lock = threading.Lock()
+
+    def cargar(self, grafo, version):
+        """Particiona esta versión del grafo y envía cada shard a su proceso (los levanta la primera vez)."""
+        with self._lock:
+            if self.version is not None and version <= self.version:
+                return
+            inicio = time.perf_counter()
+            particion = Particion(grafo, self.estrategia, self.num_shards, self.semilla)
+            while len(self._procesos) < len(particion.shards):
+                proceso = _ProcesoShard(len(self._procesos))
+                if self._precios is not None:
+                    proceso.pedir(("descuentos", self.version_descuentos, self._precios))
+                self._procesos.append(proceso)
+            while len(self._procesos) > len(particion.shards):
+                self._procesos.pop().detener()
+            for proceso, shard in zip(self._procesos, particion.shards):
+                proceso.pedir(("cargar", version, shard))
+            distancias, caminos = {}, {}
+            for capital, (d, c) in nx.all_pairs_dijkstra(particion.troncal, weight='peso'):
+                distancias[capital], caminos[capital] = d, c
+            self._vigente = (version, particion, distancias, caminos)
+            self.particion = particion
+            self.version = version
+            print(f"🧩 Grafo v{version} en {len(particion.shards)} shards ({self.estrategia}) "
+                  f"({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+
+    def publicar_descuentos(self, version, descuentos: dict):
+        """
+        Envía a todos los shards (precio_original, precio_final) por producto si
+        la tabla es más nueva que la publicada. Una petición que fijó una
+        instantánea anterior no debe devolver a los shards precios ya reemplazados.
+        """
+        with self._lock:
+            if self.version_descuentos is not None and version <= self.version_descuentos:
+                return
+            precios = {p: (info.get('precio_original'), info.get('precio_final')) for p, info in descuentos.items()}
+            for proceso in self._procesos:
+                proceso.pedir(("descuentos", version, precios))
+            self._precios = precios
+            self.version_descuentos = version
+
+    def _pedir_a_shards(self, ordenes):
+        """Envía una orden a cada shard implicado antes de esperar respuestas (los shards trabajan en paralelo)."""
+        procesos = sorted({i for i, _ in ordenes})
+        for i in procesos:
+            self._procesos[i].lock.acquire()
+        try:
+            caidos = set()
+            for i, mensaje in ordenes:
+                if i not in caidos:
+                    try:
+                        self._procesos[i].enviar(mensaje)
+                    except _CAIDA:
+                        caidos.add(i)
+            respuestas = []
+            for i, _ in ordenes:
+                respuesta = None
+                if i not in caidos:
+                    try:
+                        respuesta = self._procesos[i].recibir()
+                    except _CAIDA:
+                        caidos.add(i)
+                respuestas.append(respuesta)
+            # Un proceso muerto se relanza con su shard y se repiten sus órdenes una vez
+            for i in caidos:
+                self._procesos[i].reiniciar()
+            for k, (i, mensaje) in enumerate(ordenes):
+                if i in caidos:
+                    respuestas[k] = self._procesos[i].repetir(mensaje)
+            return respuestas
+        finally:
+            for i in procesos:
+                self._procesos[i].lock.release()
+
+    def ruta(self, origen: str, destino: str, version, version_descuentos):
+        """
+        Rutas Bellman-Ford y Dijkstra unidas: tramo del shard origen + troncal +
+        tramo del shard destino, para la versión del grafo y de los descuentos
+        que fijó la petición. Si los shards ya sirven otras versiones se rechaza
+        con estado "version_obsoleta" en lugar de mezclar precios o grafos.
+        """
+        if self._vigente is None:
+            return {"error": "Shards sin cargar"}
+        version_vigente, particion, distancias, caminos = self._vigente
+        if version_vigente != version:
+            return self._obsoleta(version, version_descuentos)
+        shard_origen = particion.shard_de.get(origen)
+        shard_destino = particion.shard_de.get(destino)
+        if shard_origen is None or shard_destino is None:
+            return {"error": "Nodo no soportado",
+                    "mensaje": "El origen debe ser una Asociación o Capital y el destino un Mercado o Capital."}
+
+        inicio = time.perf_counter()
+        try:
+            salidas, entradas = self._pedir_a_shards([
+                (shard_origen, ("salidas", origen, version, version_descuentos)),
+                (shard_destino, ("entradas", destino, version)),
+            ])
+        except ShardCaido as e:
+            return {"error": "Shard no disponible", "mensaje": str(e), "estado": "no_disponible"}
+        if "obsoleto" in salidas or "obsoleto" in entradas:
+            return self._obsoleta(version, version_descuentos)
+        resultado = {"origen": origen, "destino": destino}
+        for criterio in ("bellman_ford", "dijkstra"):
+            mejor = None
+            for c1, (costo_salida, ruta_salida) in salidas[criterio].items():
+                for c2, (costo_entrada, ruta_entrada) in entradas.items():
+                    troncal = distancias.get(c1, {}).get(c2)
+                    if troncal is None:
+                        continue
+                    total = costo_salida + troncal + costo_entrada
+                    if mejor is None or total < mejor[0]:
+                        mejor = (total, ruta_salida[:-1] + caminos[c1][c2] + ruta_entrada[1:], costo_salida, c1, c2)
+            if mejor is None:
+                resultado[criterio] = {"ruta": [], "costo_final": "N/A",
+                                       "validacion": "No se encontró un camino entre los nodos."}
+                continue
+            _, ruta, costo, c1, c2 = mejor
+            # Se suma tramo a tramo, en el mismo orden que el algoritmo sobre el grafo completo
+            for u, v in zip(caminos[c1][c2], caminos[c1][c2][1:]):
+                costo += particion.troncal[u][v]['peso']
+            costo += entradas[c2][0]
+            resultado[criterio] = {
+                "ruta": ruta[1:-1] if len(ruta) > 2 else [],
+                "costo_final": f"{costo:.2f}",
+                "validacion": "Ruta unida sobre la red troncal.",
+            }
+        resultado["shards"] = {"origen": shard_origen, "destino": shard_destino}
+        resultado["tiempo_ms"] = round((time.perf_counter() - inicio) * 1000, 4)
+        return resultado
+
+    def _obsoleta(self, version, version_descuentos):
+        return {"error": "Versión desactualizada",
+                "mensaje": f"Los shards ya sirven el grafo v{self.version} y los descuentos "
+                           f"v{self.version_descuentos}; la petición fijó v{version} y v{version_descuentos}. "
+                           "Reintente la consulta.",
+                "estado": "version_obsoleta"}
+
+    def estado(self):
+        return {
+            "estrategia": self.estrategia,
+            "version_grafo": self.version,
+            "version_descuentos": self.version_descuentos,
+            "particion": self.particion.reporte if self.particion else None,
+            "procesos": [self._estado_proceso(p) for p in self._procesos],
+        }
+
+    @staticmethod
+    def _estado_proceso(proceso):
+        try:
+            return {"shard": proceso.indice, **proceso.pedir(("estado",))}
+        except ShardCaido as e:
+            return {"shard": proceso.indice, "error": str(e)}
+
+    def detener(self):
+        with self._lock:
+            while self._procesos:
+                self._procesos.pop().detener()
+            self.version = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Informe de la partición regional del grafo")
+    parser.add_argument("--estrategia", choices=ESTRATEGIAS, default="departamentos")
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--graphml", default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "Panditas", "Proyecto_Grafo_Archivos",
+        "Grafo_Proyecto_Actualizado.graphml"))
+    parser.add_argument("--servir", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.servir:
+        servir()
+        return
+    particion = Particion(nx.read_graphml(args.graphml), args.estrategia, args.shards, args.semilla)
+    print(json.dumps(particion.reporte, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import cProfile
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+import config
+
+
+class Perfilador:
+    """
+    Perfilado bajo demanda de peticiones individuales (cProfile, determinista)
+    y muestreo de pilas de todos los hilos durante una ventana de tiempo.
+    Los resultados se guardan en `directorio` como .pstats (determinista) y
+    .folded (pilas colapsadas, formato de flamegraph.pl / speedscope).
+    """
+
+    def __init__(self, habilitado: bool, directorio: str):
+        self.habilitado = habilitado
+        self.directorio = directorio
+        # cProfile solo admite un perfilador activo a la vez (Python >= 3.12)
+        self._lock_perfil = threading.Lock()
+        self._muestreo_activo = None
+
+    # --- Perfilado determinista de una petición ----------------------------
+    def debe_perfilar(self, cabeceras, argumentos) -> bool:
+        if not self.habilitado:
+            return False
+        return cabeceras.get("X-Perfilar") == "1" or argumentos.get("perfilar") == "1"
+
+    def iniciar(self):
+        """Devuelve un perfilador activo, o None si ya hay otro perfilado en curso."""
+        if not self._lock_perfil.acquire(blocking=False):
+            return None
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            self._lock_perfil.release()
+            return None
+        return perfil
+
+    def finalizar(self, perfil, etiqueta: str, top: int = 5):
+        """Detiene el perfilador, guarda el .pstats y devuelve (nombre_archivo, resumen_top)."""
+        try:
+            perfil.disable()
+        finally:
+            self._lock_perfil.release()
+
+        estadisticas = pstats.Stats(perfil)
+        nombre = f"{time.strftime('%Y%m%d-%H%M%S')}_{_limpiar_nombre(etiqueta)}_{os.getpid()}.pstats"
+        os.makedirs(self.directorio, exist_ok=True)
+        estadisticas.dump_stats(os.path.join(self.directorio, nombre))
+        return nombre, self._resumen(estadisticas, top)
+
+    def _resumen(self, estadisticas, top):
+        """Funciones con mayor tiempo propio: [(funcion, ms_propio, ms_acumulado, llamadas)]."""
+        filas = []
+        for (archivo, linea, funcion), (_, llamadas, propio, acumulado, _) in estadisticas.stats.items():
+            filas.append((f"{os.path.basename(archivo)}:{linea}({funcion})", propio * 1000, acumulado * 1000, llamadas))
+        filas.sort(key=lambda f: f[1], reverse=True)
+        return filas[:top]
+
+    @staticmethod
+    def formatear_cabecera(resumen) -> str:
+        """Formato compacto y ASCII para la cabecera X-Perfil-Top."""
+        partes = [f"{funcion} {propio:.2f}ms/{acumulado:.2f}ms x{llamadas}" for funcion, propio, acumulado, llamadas in resumen]
+        return "; ".join(partes).encode("ascii", "replace").decode("ascii")
+
+    # --- Muestreo de todos los hilos ----------------------------------------
+    def iniciar_muestreo(self, segundos: float, intervalo_ms: float = 5.0):
+        """Lanza un hilo que muestrea las pilas de todos los hilos durante `segundos`."""
+        if self._muestreo_activo is not None and self._muestreo_activo.is_alive():
+            return None
+        nombre = f"{time.strftime('%Y%m%d-%H%M%S')}_muestreo_{os.getpid()}.folded"
+        hilo = threading.Thread(
+            target=self._muestrear,
+            args=(segundos, intervalo_ms / 1000, os.path.join(self.directorio, nombre)),
+            name="agrilink-muestreo",
+            daemon=True,
+        )
+        self._muestreo_activo = hilo
+        hilo.start()
+        return nombre
+
+    def _muestrear(self, segundos, intervalo, ruta_salida):
+        propio = threading.get_ident()
+        pilas = Counter()
+        fin = time.monotonic() + segundos
+        while time.monotonic() < fin:
+            for id_hilo, frame in sys._current_frames().items():
+                if id_hilo == propio:
+                    continue
+                marcos = []
+                while frame is not None:
+                    codigo = frame.f_code
+                    marcos.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}")
+                    frame = frame.f_back
+                pilas[";".join(reversed(marcos))] += 1
+            time.sleep(intervalo)
+
+        os.makedirs(os.path.dirname(ruta_salida), exist_ok=True)
+        with open(ruta_salida, "w", encoding="utf-8") as f:
+            for pila, conteo in pilas.most_common():
+                f.write(f"{pila} {conteo}\n")
+
+    # --- Listado ------------------------------------------------------------
+    def listar(self):
+        if not os.path.isdir(self.directorio):
+            return []
+        perfiles = []
+        for nombre in sorted(os.listdir(self.directorio), reverse=True):
+            if not nombre.endswith((".pstats", ".folded")):
+                continue
+            info = os.stat(os.path.join(self.directorio, nombre))
+            perfiles.append({
+                "archivo": nombre,
+                "tipo": "determinista" if nombre.endswith(".pstats") else "muestreo",
+                "bytes": info.st_size,
+                "fecha": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(info.st_mtime)),
+            })
+        return perfiles
+
+
+def _limpiar_nombre(texto: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "-", texto).strip("-") or "peticion"
+
+
+perfilador = Perfilador(config.PERFILADO_HABILITADO, config.DIRECTORIO_PERFILES)
@@ -0,0 +1,393 @@
+import heapq
+import time
+from collections import defaultdict, deque
+
+INF = float('inf')
+EPS = 1e-9
+
+FUENTE, SUMIDERO, FICTICIO = "__fuente__", "__sumidero__", "__ficticio__"
+
+
+class RedFlujo:
+    """
+    Red residual para flujo de costo mínimo. Cada arista e tiene su retorno en
+    e ^ 1; `capacidad` guarda la capacidad residual, así que el flujo de una
+    arista directa es la capacidad residual de su retorno.
+    """
+
+    def __init__(self):
+        self.indice = {}
+        self.nombres = []
+        self.salientes = []
+        self.destino = []
+        self.capacidad = []
+        self.costo = []
+        self.claves = []
+        self.por_clave = {}
+
+    def nodo(self, nombre):
+        if nombre not in self.indice:
+            self.indice[nombre] = len(self.nombres)
+            self.nombres.append(nombre)
+            self.salientes.append([])
+        return self.indice[nombre]
+
+    def agregar_arista(self, u, v, capacidad, costo, clave):
+        u, v = self.nodo(u), self.nodo(v)
+        e = len(self.destino)
+        self.destino += [v, u]
+        self.capacidad += [capacidad, 0.0]
+        self.costo += [costo, -costo]
+        self.claves += [clave, None]
+        self.salientes[u].append(e)
+        self.salientes[v].append(e + 1)
+        self.por_clave[clave] = e
+        return e
+
+    def origen(self, e):
+        return self.destino[e ^ 1]
+
+    def flujo(self, e):
+        return self.capacidad[e ^ 1]
+
+    def empujar(self, aristas, cantidad):
+        for e in aristas:
+            self.capacidad[e] -= cantidad
+            self.capacidad[e ^ 1] += cantidad
+
+    # ---------------------------------------------------------------------
+    # Caminos mínimos sucesivos con potenciales (Dijkstra sobre costos reducidos)
+    # ---------------------------------------------------------------------
+    def equilibrar(self, exceso, potencial):
+        """
+        Lleva el exceso de cada nodo a cero enviándolo por caminos de costo
+        reducido mínimo desde los nodos con exceso hasta el déficit más cercano.
+        Requiere costos reducidos >= 0 en la red residual. Devuelve los aumentos.
+        """
+        n = len(self.nombres)
+        aumentos = 0
+        while True:
+            fuentes = [v for v in range(n) if exceso[v] > EPS]
+            if not fuentes:
+                return aumentos
+            distancia = [INF] * n
+            previa = [-1] * n
+            cola = []
+            for v in fuentes:
+                distancia[v] = 0.0
+                cola.append((0.0, v))
+            heapq.heapify(cola)
+            deficit = -1
+            while cola:
+                d, u = heapq.heappop(cola)
+                if d > distancia[u]:
+                    continue
+                if exceso[u] < -EPS:
+                    deficit = u
+                    break
+                for e in self.salientes[u]:
+                    if self.capacidad[e] <= EPS:
+                        continue
+                    v = self.destino[e]
+                    nueva = d + self.costo[e] + potencial[u] - potencial[v]
+                    if nueva < distancia[v] - 1e-12:
+                        distancia[v] = nueva
+                        previa[v] = e
+                        heapq.heappush(cola, (nueva, v))
+            if deficit == -1:
+                return aumentos
+            tope = distancia[deficit]
+            for v in range(n):
+                potencial[v] += min(distancia[v], tope)
+            camino, v = [], deficit
+            while previa[v] != -1:
+                camino.append(previa[v])
+                v = self.origen(previa[v])
+            f = min([exceso[v], -exceso[deficit]] + [self.capacidad[e] for e in camino])
+            self.empujar(camino, f)
+            exceso[v] -= f
+            exceso[deficit] += f
+            aumentos += 1
+
+    # ---------------------------------------------------------------------
+    # Arranque en caliente: flujo y potenciales del plan anterior
+    # ---------------------------------------------------------------------
+    def ajustar_potenciales(self, potencial):
+        """Las aristas de capacidad infinita no se pueden saturar: se bajan potenciales hasta que su costo reducido sea >= 0."""
+        for _ in range(len(self.nombres)):
+            cambio = False
+            for e in range(0, len(self.destino), 2):
+                if self.capacidad[e] == INF:
+                    u, v = self.origen(e), self.destino[e]
+                    if self.costo[e] + potencial[u] - potencial[v] < -1e-12:
+                        potencial[v] = potencial[u] + self.costo[e]
+                        cambio = True
+            if not cambio:
+                return
+
+    def saturar_negativas(self, potencial):
+        """Satura las aristas residuales de costo reducido negativo. Devuelve cuántas saturó."""
+        saturadas = 0
+        for e, v in enumerate(self.destino):
+            u = self.destino[e ^ 1]
+            if self.capacidad[e] > EPS and self.costo[e] + potencial[u] - potencial[v] < -1e-12:
+                self.empujar([e], self.capacidad[e])
+                saturadas += 1
+        return saturadas
+
+    def descomponer(self, fuente, sumidero):
+        """Descompone el flujo en caminos fuente -> sumidero: [(aristas, cantidad)]."""
+        fuente, sumidero = self.indice[fuente], self.indice[sumidero]
+        restante = {e: self.flujo(e) for e in range(0, len(self.destino), 2) if self.flujo(e) > EPS}
+        # Por nodo, sus aristas con flujo; las agotadas se descartan del frente una sola vez
+        pendientes = [[e for e in salientes if e in restante] for salientes in self.salientes]
+        caminos = []
+        while True:
+            camino, v = [], fuente
+            while v != sumidero and len(camino) <= len(self.nombres):
+                cola = pendientes[v]
+                while cola and restante[cola[-1]] <= EPS:
+                    cola.pop()
+                if not cola:
+                    break
+                camino.append(cola[-1])
+                v = self.destino[cola[-1]]
+            if v != sumidero or not camino:
+                return caminos
+            f = min(restante[e] for e in camino)
+            for e in camino:
+                restante[e] -= f
+            caminos.append((camino, f))
+
+
+def _leer_cantidades(datos, nombre):
+    if not isinstance(datos, dict):
+        raise ValueError(f"'{nombre}' debe ser un objeto {{nodo: cantidad}}")
+    cantidades = {}
+    for nodo, cantidad in datos.items():
+        cantidad = float(cantidad)
+        if not cantidad >= 0 or cantidad == INF:
+            raise ValueError(f"Cantidad inválida en '{nombre}' para {nodo}")
+        if cantidad > 0:
+            cantidades[nodo] = cantidad
+    return cantidades
+
+
+def planificar_distribucion(grafo, descuentos, ofertas, demandas, capacidades=(), base=None, limite_envios=1000):
+    """
+    Plan de distribución Asociaciones -> Mercados como un único flujo de costo
+    mínimo sobre la red troncal (transporte_interdepartamental). El costo por
+    unidad es el de Dijkstra en comparar_rutas_optimas: precio final con
+    descuento en la capital legítima + transporte troncal + distribución final.
+
+    La red se agrega por capital: una arista fuente -> capital por producto
+    ofertado allí y una arista capital -> sumidero por costo de distribución,
+    así que tiene decenas de nodos aunque haya miles de Asociaciones. La
+    demanda que no se puede cubrir (oferta insuficiente o tramos saturados) sale
+    de un nodo ficticio con una penalización mayor que cualquier ruta real.
+
+    Se resuelve con caminos mínimos sucesivos y potenciales (Dijkstra sobre
+    costos reducidos). `base` es el estado de un plan anterior: su flujo por
+    arista (recortado a las capacidades nuevas) y sus potenciales; las aristas
+    que los cambios de costo dejaron con costo reducido negativo se saturan y
+    solo se reequilibra la diferencia.
+    Devuelve (resultado, estado).
+    """
+    inicio = time.perf_counter()
+    try:
+        ofertas = _leer_cantidades(ofertas, "ofertas")
+        demandas = _leer_cantidades(demandas, "demandas")
+        capacidad_troncal = {}
+        for u, v, capacidad in capacidades or ():
+            capacidad = float(capacidad)
+            if not capacidad >= 0:
+                raise ValueError(f"Capacidad inválida para {u} -> {v}")
+            capacidad_troncal[(u, v)] = capacidad
+    except (TypeError, ValueError) as e:
+        return {"error": str(e)}, None
+
+    tipo = lambda n: grafo.nodes[n].get('tipo') if n in grafo else None
+    invalidos = ([a for a in ofertas if tipo(a) != 'Asociacion'] + [m for m in demandas if tipo(m) != 'Mercado'])
+    if invalidos:
+        return {"error": "Las ofertas deben ser de Asociaciones y las demandas de Mercados", "nodos": invalidos[:20]}, None
+    troncales = {(u, v): data.get('peso', 0) for u, v, data in grafo.edges(data=True)
+                 if data.get('relacion') == 'transporte_interdepartamental'}
+    fuera = [[u, v] for u, v in capacidad_troncal if (u, v) not in troncales]
+    if fuera:
+        return {"error": "Las capacidades solo aplican a tramos troncales existentes", "aristas": fuera}, None
+    if not demandas:
+        return {"error": "No hay demanda que cubrir"}, None
+
+    # Oferta agregada por (capital legítima, producto) y demanda por (capital, costo de distribución)
+    oferta_por_nivel = defaultdict(list)
+    costo_oferta = {}
+    sin_ruta = []
+    for asociacion in sorted(ofertas):
+        producto = next((v for v in grafo.successors(asociacion) if tipo(v) == 'Producto'), None)
+        capital = grafo.nodes[asociacion].get('departamento')
+        precio_final = (descuentos.get(producto) or {}).get('precio_final')
+        if producto is None or tipo(capital) != 'Capital' or not grafo.has_edge(producto, capital) or precio_final is None:
+            sin_ruta.append(asociacion)
+            continue
+        clave = ("oferta", capital, producto)
+        oferta_por_nivel[clave].append(asociacion)
+        costo_oferta[clave] = grafo[asociacion][producto].get('peso', 0) + precio_final
+    demanda_por_nivel = defaultdict(list)
+    demandas_sin_ruta = []
+    for mercado in sorted(demandas):
+        # Un Mercado ingerido en un ubigeo sin Capital no tiene arista de distribución final
+        capital = next((u for u in grafo.predecessors(mercado) if tipo(u) == 'Capital'), None)
+        if capital is None:
+            demandas_sin_ruta.append(mercado)
+            continue
+        demanda_por_nivel[("demanda", capital, grafo[capital][mercado].get('peso', 0))].append(mercado)
+
+    red = RedFlujo()
+    for clave, miembros in sorted(oferta_por_nivel.items()):
+        red.agregar_arista(FUENTE, clave[1], sum(ofertas[a] for a in miembros), costo_oferta[clave], clave)
+    for (u, v), peso in sorted(troncales.items()):
+        red.agregar_arista(u, v, capacidad_troncal.get((u, v), INF), peso, ("troncal", u, v))
+    for clave, miembros in sorted(demanda_por_nivel.items()):
+        red.agregar_arista(clave[1], SUMIDERO, sum(demandas[m] for m in miembros), clave[2], clave)
+    demanda_total = sum(demandas.values())
+    demanda_sin_ruta = sum(demandas[m] for m in demandas_sin_ruta)
+    demanda_con_ruta = demanda_total - demanda_sin_ruta
+    penalizacion = 1 + max(costo_oferta.values(), default=0) + sum(troncales.values()) + max(
+        (clave[2] for clave in demanda_por_nivel), default=0)
+    red.agregar_arista(FUENTE, FICTICIO, demanda_con_ruta, penalizacion, ("ficticio",))
+    for capital in sorted({clave[1] for clave in demanda_por_nivel}):
+        red.agregar_arista(FICTICIO, capital, INF, 0.0, ("ficticio", capital))
+
+    # Arranque en caliente: el flujo anterior de cada arista (recortado a la
+    # capacidad nueva) y sus potenciales; solo se corrige lo que cambió
+    potencial = [0.0] * len(red.nombres)
+    reutilizado, saturadas = 0.0, 0
+    if base is not None:
+        for e in range(0, len(red.destino), 2):
+            f = min(base["flujos"].get(red.claves[e], 0.0), red.capacidad[e])
+            if f > EPS:
+                red.empujar([e], f)
+                if red.origen(e) == red.indice[FUENTE]:
+                    reutilizado += f
+        potencial = [base["potencial"].get(nombre, 0.0) for nombre in red.nombres]
+        red.ajustar_potenciales(potencial)
+        saturadas = red.saturar_negativas(potencial)
+    exceso = [0.0] * len(red.nombres)
+    exceso[red.indice[FUENTE]] = demanda_con_ruta
+    exceso[red.indice[SUMIDERO]] = -demanda_con_ruta
+    for e in range(0, len(red.destino), 2):
+        f = red.flujo(e)
+        if f > EPS:
+            exceso[red.origen(e)] -= f
+            exceso[red.destino[e]] += f
+    aumentos = red.equilibrar(exceso, potencial)
+
+    # Resultado: caminos agregados por ruta troncal y repartidos entre Asociaciones y Mercados
+    caminos = red.descomponer(FUENTE, SUMIDERO)
+    cola_oferta = {clave: deque((a, ofertas[a]) for a in miembros) for clave, miembros in oferta_por_nivel.items()}
+    cola_demanda = {clave: deque((m, demandas[m]) for m in miembros) for clave, miembros in demanda_por_nivel.items()}
+    rutas = {}
+    envios = defaultdict(float)
+    enviado_por_asociacion = defaultdict(float)
+    faltante = defaultdict(float)
+    costo_producto = costo_transporte = 0.0
+
+    def tomar(cola, cantidad):
+        partes = []
+        while cantidad > EPS and cola:
+            nodo, disponible = cola[0]
+            parte = min(cantidad, disponible)
+            partes.append((nodo, parte))
+            cantidad -= parte
+            if disponible - parte > EPS:
+                cola[0] = (nodo, disponible - parte)
+            else:
+                cola.popleft()
+        return partes
+
+    for aristas, cantidad in caminos:
+        claves = [red.claves[e] for e in aristas]
+        nivel_demanda = claves[-1]
+        mercados = tomar(cola_demanda[nivel_demanda], cantidad)
+        if claves[0] == ("ficticio",):
+            for mercado, parte in mercados:
+                faltante[mercado] += parte
+            continue
+        capitales = [red.nombres[red.destino[e]] for e in aristas[:-1]]
+        transporte = sum(red.costo[e] for e in aristas[1:])
+        costo_producto += costo_oferta[claves[0]] * cantidad
+        costo_transporte += transporte * cantidad
+        ruta = rutas.setdefault(tuple(capitales), {"ruta": capitales, "cantidad": 0.0, "costo": 0.0,
+                                                   "transporte_unitario": round(transporte, 4)})
+        ruta["cantidad"] += cantidad
+        ruta["costo"] += (costo_oferta[claves[0]] + transporte) * cantidad
+        # Reparto voraz dentro de cada nivel: todos sus miembros tienen el mismo costo
+        asociaciones = tomar(cola_oferta[claves[0]], cantidad)
+        for mercado, parte_mercado in mercados:
+            while parte_mercado > EPS and asociaciones:
+                asociacion, parte = asociaciones[0]
+                usado = min(parte, parte_mercado)
+                envios[(asociacion, mercado, tuple(capitales))] += usado
+                enviado_por_asociacion[asociacion] += usado
+                parte_mercado -= usado
+                if parte - usado > EPS:
+                    asociaciones[0] = (asociacion, parte - usado)
+                else:
+                    asociaciones.pop(0)
+
+    aristas_troncales = []
+    for e in range(0, len(red.destino), 2):
+        clave = red.claves[e]
+        if clave[0] == "troncal" and red.flujo(e) > EPS:
+            capacidad = capacidad_troncal.get(clave[1:])
+            aristas_troncales.append({
+                "desde": clave[1],
+                "hacia": clave[2],
+                "flujo": round(red.flujo(e), 4),
+                "capacidad": capacidad,
+                "costo_unitario": round(red.costo[e], 4),
+                "saturada": capacidad is not None and red.capacidad[e] <= EPS,
+            })
+
+    lista_envios = [
+        {"asociacion": a, "mercado": m, "ruta": list(capitales), "cantidad": round(q, 4)}
+        for (a, m, capitales), q in sorted(envios.items(), key=lambda x: -x[1])
+    ]
+    oferta_total = sum(ofertas.values())
+    enviado = sum(enviado_por_asociacion.values())
+    resultado = {
+        "resumen": {
+            "oferta_total": round(oferta_total, 4),
+            "demanda_total": round(demanda_total, 4),
+            "enviado": round(enviado, 4),
+            "demanda_insatisfecha": round(sum(faltante.values()) + demanda_sin_ruta, 4),
+            "oferta_sin_usar": round(oferta_total - enviado, 4),
+            "costo_total": round(costo_producto + costo_transporte, 2),
+            "costo_producto": round(costo_producto, 2),
+            "costo_transporte": round(costo_transporte, 2),
+        },
+        "aristas": sorted(aristas_troncales, key=lambda a: -a["flujo"]),
+        "rutas": [
+            {**ruta, "cantidad": round(ruta["cantidad"], 4), "costo": round(ruta["costo"], 2)}
+            for ruta in sorted(rutas.values(), key=lambda r: -r["cantidad"])
+        ],
+        "envios": lista_envios[:limite_envios],
+        "total_envios": len(lista_envios),
+        "mercados_insatisfechos": [{"mercado": m, "faltante": round(q, 4)} for m, q in sorted(faltante.items())],
+        "ofertas_sin_ruta": sin_ruta,
+        "demandas_sin_ruta": demandas_sin_ruta,
+        "solucion": {
+            "arranque": "caliente" if base is not None else "frio",
+            "flujo_reutilizado": round(reutilizado, 4),
+            "aristas_saturadas": saturadas,
+            "aumentos": aumentos,
+            "nodos_red": len(red.nombres),
+            "aristas_red": len(red.destino) // 2,
+            "tiempo_ms": round((time.perf_counter() - inicio) * 1000, 3),
+        },
+    }
+    estado = {
+        "flujos": {red.claves[e]: red.flujo(e) for e in range(0, len(red.destino), 2) if red.flujo(e) > EPS},
+        "potencial": dict(zip(red.nombres, potencial)),
+    }
+    return resultado, estado
@@ -0,0 +1,350 @@
+"""
+Prueba de carga local de la API de AgriLink con una mezcla de consultas realista.
+
+Ejemplos:
+    python prueba_carga.py --modo proceso --concurrencia 8 --duracion 20
+    python prueba_carga.py --modo gunicorn --workers 4 --threads 2 --concurrencia 16 --salida carga.json
+    python prueba_carga.py --modo uvicorn --workers 2 --concurrencia 64
+
+Modo "proceso": llama a la app Flask en este mismo proceso (un test client por
+hilo), sin red ni servidor. Modo "gunicorn": levanta `gunicorn app:app` en un
+puerto local con los workers/hilos pedidos y le envía peticiones HTTP. Modo
+"uvicorn": lo mismo con `uvicorn asgi:app` (modo ASGI, ver asgi.py).
+El reporte JSON (rendimiento, p50/p99, tasa de error y RSS por worker) se
+imprime y opcionalmente se guarda para comparar corridas.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import quote
+
+import networkx as nx
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+GRAPHML = os.path.join(DIRECTORIO, "..", "Panditas", "Proyecto_Grafo_Archivos", "Grafo_Proyecto_Actualizado.graphml")
+
+# Peso relativo de cada tipo de consulta en la mezcla
+MEZCLA = {
+    "ruta_caliente": 35,    # pocos pares asociación -> mercado muy repetidos
+    "ruta_fria": 15,        # pares al azar
+    "explorar_hub": 15,     # explorar-nodo de las capitales con más conexiones (LIMA, ...)
+    "buscar": 5,
+    "agricultor_lectura": 25,
+    "agricultor_escritura": 5,
+}
+
+
+# =========================================================================
+# Mezcla de consultas
+# =========================================================================
+class GeneradorConsultas:
+    """Construye las consultas a partir del grafo: pares factibles calientes/fríos, hubs y CRUD de agricultores."""
+
+    def __init__(self, ruta_graphml: str, semilla: int, pares_calientes: int = 20):
+        self.rng = random.Random(semilla)
+        grafo = nx.read_graphml(ruta_graphml)
+        capitales = {n for n, d in grafo.nodes(data=True) if d.get("tipo") == "Capital"}
+        # Solo asociaciones cuyo departamento es una capital: el par tiene ruta
+        self.asociaciones = sorted(n for n, d in grafo.nodes(data=True)
+                                   if d.get("tipo") == "Asociacion" and d.get("departamento") in capitales)
+        self.mercados = sorted(n for n, d in grafo.nodes(data=True) if d.get("tipo") == "Mercado")
+        self.hubs = sorted(capitales, key=grafo.out_degree, reverse=True)[:5]
+        self.productos = sorted(n for n, d in grafo.nodes(data=True) if d.get("tipo") == "Producto")
+        self.calientes = [(self.rng.choice(self.asociaciones), self.rng.choice(self.mercados))
+                          for _ in range(pares_calientes)]
+        self._tipos = list(MEZCLA)
+        self._pesos = [MEZCLA[t] for t in self._tipos]
+
+    def siguiente(self):
+        """(tipo, método, ruta, cuerpo JSON o None)"""
+        tipo = self.rng.choices(self._tipos, self._pesos)[0]
+        if tipo == "ruta_caliente":
+            origen, destino = self.rng.choice(self.calientes)
+            return tipo, "POST", "/api/algoritmos/ruta-optima", {"origen": origen, "destino": destino}
+        if tipo == "ruta_fria":
+            return tipo, "POST", "/api/algoritmos/ruta-optima", {
+                "origen": self.rng.choice(self.asociaciones), "destino": self.rng.choice(self.mercados)}
+        if tipo == "explorar_hub":
+            return tipo, "GET", f"/api/algoritmos/explorar-nodo/{self.rng.choice(self.hubs)}", None
+        if tipo == "buscar":
+            consulta = self.rng.choice(self.productos)[:self.rng.randint(3, 6)]
+            return tipo, "GET", f"/api/algoritmos/buscar?q={quote(consulta)}", None
+        if tipo == "agricultor_lectura":
+            ruta = self.rng.choice(["/api/agricultores", "/api/agricultores/1", "/api/agricultores/1/resumen",
+                                    "/api/productos?agricultor_id=1", "/api/pedidos/agricultor/1"])
+            return tipo, "GET", ruta, None
+        if self.rng.random() < 0.5:
+            return tipo, "POST", "/api/resenas", {
+                "agricultor_id": 1, "cliente": "Carga", "rating": self.rng.randint(1, 5), "comentario": "prueba de carga"}
+        return tipo, "PUT", "/api/agricultores/1", {"ubicacion": self.rng.choice(["Valle del Mantaro", "Huancayo"])}
+
+
+# =========================================================================
+# Clientes
+# =========================================================================
+class ClienteProceso:
+    def __init__(self, app):
+        self._cliente = app.test_client()
+
+    def enviar(self, metodo, ruta, cuerpo):
+        respuesta = self._cliente.open(ruta, method=metodo, json=cuerpo)
+        respuesta.get_data()
+        return respuesta.status_code
+
+
+class ClienteHTTP:
+    def __init__(self, puerto):
+        self._puerto = puerto
+        self._conexion = None
+
+    def enviar(self, metodo, ruta, cuerpo):
+        datos = json.dumps(cuerpo).encode() if cuerpo is not None else None
+        cabeceras = {"Content-Type": "application/json"} if datos is not None else {}
+        for intento in range(2):
+            if self._conexion is None:
+                self._conexion = http.client.HTTPConnection("127.0.0.1", self._puerto, timeout=60)
+            try:
+                self._conexion.request(metodo, ruta, body=datos, headers=cabeceras)
+                respuesta = self._conexion.getresponse()
+                respuesta.read()
+                if respuesta.getheader("Connection", "").lower() == "close":
+                    self._conexion.close()
+                    self._conexion = None
+                return respuesta.status
+            except (http.client.HTTPException, ConnectionError):
+                # Los workers sync de gunicorn cierran la conexión: se reintenta con una nueva
+                self._conexion.close()
+                self._conexion = None
+                if intento:
+                    raise
+
+
+# =========================================================================
+# Memoria (RSS) por proceso desde /proc
+# =========================================================================
+def rss_mb(pid: int):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return round(int(linea.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+
+def hijos(pid: int):
+    resultado = []
+    for entrada in os.listdir("/proc"):
+        if entrada.isdigit():
+            try:
+                with open(f"/proc/{entrada}/stat") as f:
+                    campos = f.read().rsplit(")", 1)[1].split()
+                if int(campos[1]) == pid:
+                    resultado.append(int(entrada))
+            except (OSError, IndexError, ValueError):
+                continue
+    return sorted(resultado)
+
+
+class MuestreoRSS(threading.Thread):
+    """Guarda el RSS máximo observado del proceso principal y de cada worker."""
+
+    def __init__(self, pid: int, con_workers: bool, intervalo: float = 0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.con_workers = con_workers
+        self.intervalo = intervalo
+        self.maximos = {}
+        self._detener = threading.Event()
+
+    def muestrear(self):
+        pids = [self.pid] + (hijos(self.pid) if self.con_workers else [])
+        for pid in pids:
+            valor = rss_mb(pid)
+            if valor is not None:
+                self.maximos[pid] = max(self.maximos.get(pid, 0), valor)
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            self.muestrear()
+
+    def detener(self):
+        self._detener.set()
+        self.muestrear()
+
+    def reporte(self):
+        workers = [v for pid, v in sorted(self.maximos.items()) if pid != self.pid]
+        return {
+            "principal": self.maximos.get(self.pid),
+            "workers": workers,
+            "total": round(sum(self.maximos.values()), 1),
+        }
+
+
+# =========================================================================
+# Ejecución
+# =========================================================================
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def resumen_latencias(muestras):
+    ms = [m * 1000 for m in muestras]
+    return {
+        "p50": round(percentil(ms, 50), 3) if ms else None,
+        "p90": round(percentil(ms, 90), 3) if ms else None,
+        "p99": round(percentil(ms, 99), 3) if ms else None,
+        "max": round(max(ms), 3) if ms else None,
+        "media": round(sum(ms) / len(ms), 3) if ms else None,
+    }
+
+
+def ejecutar_carga(crear_cliente, generador, concurrencia: int, duracion: float, calentamiento: float):
+    lock = threading.Lock()
+    registros = []      # (tipo, segundos, codigo o None si hubo excepción)
+    inicio_medicion = time.perf_counter() + calentamiento
+    fin = inicio_medicion + duracion
+
+    def trabajador():
+        cliente = crear_cliente()
+        locales = []
+        while time.perf_counter() < fin:
+            with lock:
+                tipo, metodo, ruta, cuerpo = generador.siguiente()
+            t0 = time.perf_counter()
+            try:
+                codigo = cliente.enviar(metodo, ruta, cuerpo)
+            except Exception:
+                codigo = None
+            if t0 >= inicio_medicion:
+                locales.append((tipo, time.perf_counter() - t0, codigo))
+        with lock:
+            registros.extend(locales)
+
+    hilos = [threading.Thread(target=trabajador) for _ in range(concurrencia)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return registros
+
+
+def armar_reporte(registros, duracion, configuracion, memoria):
+    errores = [r for r in registros if r[2] is None or r[2] >= 500]
+    por_tipo = {}
+    for tipo in sorted({r[0] for r in registros}):
+        del_tipo = [r for r in registros if r[0] == tipo]
+        por_tipo[tipo] = {
+            "peticiones": len(del_tipo),
+            "errores": sum(1 for r in del_tipo if r[2] is None or r[2] >= 500),
+            "latencia_ms": resumen_latencias([r[1] for r in del_tipo]),
+        }
+    return {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "configuracion": configuracion,
+        "peticiones": len(registros),
+        "errores": len(errores),
+        "respuestas_4xx": sum(1 for r in registros if r[2] is not None and 400 <= r[2] < 500),
+        "tasa_error": round(len(errores) / len(registros), 5) if registros else None,
+        "rendimiento_rps": round(len(registros) / duracion, 2),
+        "latencia_ms": resumen_latencias([r[1] for r in registros]),
+        "por_tipo": por_tipo,
+        "rss_mb": memoria,
+    }
+
+
+def esperar_servidor(puerto: int, proceso, limite: float = 120.0):
+    fin = time.time() + limite
+    while time.time() < fin:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"el servidor terminó con código {proceso.returncode}")
+        try:
+            conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=2)
+            conexion.request("GET", "/api/health")
+            if conexion.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("el servidor no respondió a /api/health a tiempo")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga local de la API de AgriLink")
+    parser.add_argument("--modo", choices=("proceso", "gunicorn", "uvicorn"), default="proceso")
+    parser.add_argument("--concurrencia", type=int, default=8, help="hilos cliente simultáneos")
+    parser.add_argument("--duracion", type=float, default=10.0, help="segundos medidos")
+    parser.add_argument("--calentamiento", type=float, default=2.0, help="segundos iniciales que no se miden")
+    parser.add_argument("--workers", type=int, default=2, help="workers de gunicorn o uvicorn")
+    parser.add_argument("--threads", type=int, default=1, help="hilos por worker de gunicorn (gthread si > 1)")
+    parser.add_argument("--preload", action="store_true", help="gunicorn --preload (grafo compartido copy-on-write)")
+    parser.add_argument("--puerto", type=int, default=5055)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--graphml", default=GRAPHML)
+    parser.add_argument("--salida", help="archivo JSON donde guardar el reporte")
+    args = parser.parse_args(argv)
+
+    generador = GeneradorConsultas(args.graphml, args.semilla)
+    configuracion = {
+        "modo": args.modo,
+        "concurrencia": args.concurrencia,
+        "duracion_s": args.duracion,
+        "mezcla": MEZCLA,
+        "semilla": args.semilla,
+    }
+
+    proceso = None
+    if args.modo == "proceso":
+        sys.path.insert(0, DIRECTORIO)
+        from app import app
+        crear_cliente = lambda: ClienteProceso(app)
+        muestreo = MuestreoRSS(os.getpid(), con_workers=False)
+    else:
+        if args.modo == "uvicorn":
+            configuracion.update(workers=args.workers)
+            comando = [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(args.puerto),
+                       "--workers", str(args.workers), "--log-level", "warning"]
+        else:
+            configuracion.update(workers=args.workers, threads=args.threads, preload=args.preload)
+            comando = [sys.executable, "-m", "gunicorn", "app:app", "-b", f"127.0.0.1:{args.puerto}",
+                       "-w", str(args.workers), "--threads", str(args.threads), "--log-level", "warning"]
+            if args.preload:
+                comando.append("--preload")
+        proceso = subprocess.Popen(comando, cwd=DIRECTORIO, stdout=subprocess.DEVNULL)
+        esperar_servidor(args.puerto, proceso)
+        # Cada worker carga el grafo por su cuenta: se espera a que todos respondan
+        time.sleep(1.0)
+        crear_cliente = lambda: ClienteHTTP(args.puerto)
+        muestreo = MuestreoRSS(proceso.pid, con_workers=True)
+
+    try:
+        muestreo.start()
+        registros = ejecutar_carga(crear_cliente, generador, args.concurrencia, args.duracion, args.calentamiento)
+        muestreo.detener()
+    finally:
+        if proceso is not None:
+            proceso.send_signal(signal.SIGTERM)
+            proceso.wait(timeout=30)
+
+    reporte = armar_reporte(registros, args.duracion, configuracion, muestreo.reporte())
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+    print(texto)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    return reporte
+
+
+if __name__ == "__main__":
+    main()
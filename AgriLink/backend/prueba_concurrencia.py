@@ -0,0 +1,254 @@
+"""
+Prueba de estrés del modelo de concurrencia (tablas con escrituras en sitio
+bajo candado y filas inmutables + instantáneas inmutables del grafo).
+
+    python prueba_concurrencia.py --hilos 1,2,4,8 --duracion 3
+    python prueba_concurrencia.py --backend sqlite --io-ms 0 --sin-grafo
+
+Cada corrida lanza N hilos con una mezcla de lecturas y escrituras sobre
+AgricultorService y, en paralelo, un escritor que publica versiones nuevas del
+grafo (ingesta de Mercados sobre una copia temporal del GraphML). Comprueba:
+  - lecturas desgarradas: dos campos que siempre se escriben juntos se leen
+    iguales; los filtros por índice devuelven solo filas que cumplen el filtro;
+    en cada instantánea del grafo coinciden grafo, atributos e índice de ubigeo;
+  - actualizaciones perdidas: al final, ids únicos, ningún stock negativo
+    (sin sobreventa en el ingreso de pedidos), stock conservado (por producto,
+    stock + unidades en pedidos no cancelados igual que al empezar) y el
+    resumen incremental de cada agricultor igual al recalculado desde las tablas.
+`--io-ms` simula la espera de E/S de una petición (lo que un worker gthread
+solapa entre hilos); con 0 se mide solo CPU y el GIL limita la escala.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import networkx as nx
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, DIRECTORIO)
+
+from agricultor_service import AgricultorService  # noqa: E402
+from algoritmos_service import AlgoritmosService  # noqa: E402
+
+GRAPHML = os.path.join(DIRECTORIO, "..", "Panditas", "Proyecto_Grafo_Archivos", "Grafo_Proyecto_Actualizado.graphml")
+ESTADOS = ("pendiente", "completado", "cancelado")
+STOCK_PRODUCTO_NUEVO = 10
+
+
+class _ServicioTemporal(AlgoritmosService):
+    """AlgoritmosService sobre una copia del GraphML (la ingesta no toca el registro real)."""
+
+    def __init__(self, ruta):
+        self._ruta_temporal = ruta
+        super().__init__()
+
+    def _ruta_grafo(self):
+        return self._ruta_temporal
+
+    def _cargar_grafo_portable(self):
+        return nx.read_graphml(self._ruta_temporal)
+
+
+class Corrida:
+    def __init__(self, servicio, algoritmos, hilos, duracion, io_ms, semilla):
+        self.servicio = servicio
+        self.algoritmos = algoritmos
+        self.hilos = hilos
+        self.duracion = duracion
+        self.io = io_ms / 1000
+        self.semilla = semilla
+        self.operaciones = [0] * hilos
+        self.errores = []
+        self.versiones_grafo = 0
+        self._fin = threading.Event()
+        self._existencias_iniciales = self._existencias()
+        instantanea = algoritmos.instantanea if algoritmos else None
+        self._base_grafo = (instantanea.grafo.number_of_nodes(),
+                            instantanea.indice_ubigeo.contar("15", "Mercado")) if instantanea else None
+
+    def _existencias(self):
+        """Por producto, stock + unidades en pedidos no cancelados: ninguna operación debe cambiarlo."""
+        s = self.servicio
+        existencias = {p["id"]: p["stock"] for p in s.productos.todos()}
+        for pedido in s.pedidos.todos():
+            if pedido["estado"] != "cancelado":
+                for linea in pedido.get("productos", []):
+                    existencias[linea["producto_id"]] = existencias.get(linea["producto_id"], 0) + linea["cantidad"]
+        return existencias
+
+    def _fallo(self, mensaje):
+        if len(self.errores) < 20:
+            self.errores.append(mensaje)
+
+    # --- Operaciones ----------------------------------------------------------
+    def _leer(self, rng):
+        s = self.servicio
+        agricultor = s.obtener_agricultor(1)
+        if agricultor.get("marca_a") != agricultor.get("marca_b"):
+            self._fallo(f"agricultor desgarrado: {agricultor.get('marca_a')} != {agricultor.get('marca_b')}")
+        agricultor_id = rng.randint(1, 4)
+        for producto in s.obtener_productos(agricultor_id=agricultor_id, activo=True):
+            if producto["agricultor_id"] != agricultor_id or producto["activo"] is not True:
+                self._fallo(f"índice de productos inconsistente: {producto}")
+        estado = rng.choice(ESTADOS)
+        for pedido in s.obtener_pedidos_agricultor(agricultor_id, estado):
+            if pedido["estado"] != estado or pedido["agricultor_id"] != agricultor_id:
+                self._fallo(f"índice de pedidos inconsistente: {pedido}")
+        s.obtener_resumen_agricultor(1)
+        if self.algoritmos is not None:
+            self._leer_grafo()
+
+    def _leer_grafo(self):
+        # Todo desde una sola instantánea: grafo, atributos e índices deben coincidir
+        instantanea = self.algoritmos.instantanea
+        nodos = instantanea.grafo.number_of_nodes()
+        nuevos = nodos - self._base_grafo[0]
+        if len(instantanea.atributos) != nodos:
+            self._fallo(f"v{instantanea.version}: {len(instantanea.atributos)} atributos para {nodos} nodos")
+        if instantanea.indice_ubigeo.contar("15", "Mercado") != self._base_grafo[1] + nuevos:
+            self._fallo(f"v{instantanea.version}: índice de ubigeo no coincide con el grafo")
+
+    def _escribir(self, rng, hilo, contador):
+        s = self.servicio
+        operacion = rng.random()
+        if operacion < 0.3:
+            marca = f"{hilo}-{contador}"
+            s.actualizar_agricultor(1, {"marca_a": marca, "marca_b": marca})
+        elif operacion < 0.55:
+            s.crear_producto({"nombre": f"Producto {hilo}-{contador}", "agricultor_id": rng.randint(1, 4),
+                              "precio": 1.0, "stock": STOCK_PRODUCTO_NUEVO, "categoria": "Prueba", "activo": rng.random() < 0.8})
+        elif operacion < 0.8:
+            s.crear_pedidos([{"cliente": f"Cliente {hilo}", "productos": [
+                {"producto_id": rng.randint(1, len(s.productos)), "cantidad": rng.randint(1, 5)}]}])
+        else:
+            pedidos = s.pedidos.todos()
+            s.actualizar_estado_pedido(rng.choice(pedidos)["id"], rng.choice(ESTADOS))
+
+    def _trabajador(self, hilo, proporcion_escritura):
+        rng = random.Random(self.semilla * 1000 + hilo)
+        contador = 0
+        while not self._fin.is_set():
+            try:
+                if rng.random() < proporcion_escritura:
+                    self._escribir(rng, hilo, contador)
+                else:
+                    self._leer(rng)
+            except Exception as e:  # cualquier excepción de un lector es un fallo de la prueba
+                self._fallo(f"{type(e).__name__}: {e}")
+            if self.io:
+                time.sleep(self.io)
+            contador += 1
+            self.operaciones[hilo] = contador
+
+    def _escritor_grafo(self):
+        k = 0
+        while not self._fin.is_set():
+            k += 1
+            resultado = self.algoritmos.ingerir_filas([{"tipo": "mercado", "fila": {
+                "id_anonimo_cenama": f"ESTRES{k:06d}", "departamento": "LIMA", "provincia": "LIMA",
+                "distrito": "ATE", "ubigeo": "150103"}}])
+            if "error" in resultado:
+                self._fallo(f"ingesta: {resultado}")
+                return
+            self.versiones_grafo += 1
+            time.sleep(0.005)
+
+    def ejecutar(self, proporcion_escritura):
+        hilos = [threading.Thread(target=self._trabajador, args=(i, proporcion_escritura), daemon=True)
+                 for i in range(self.hilos)]
+        if self.algoritmos is not None:
+            hilos.append(threading.Thread(target=self._escritor_grafo, daemon=True))
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        time.sleep(self.duracion)
+        self._fin.set()
+        for hilo in hilos:
+            hilo.join()
+        return time.perf_counter() - inicio
+
+    def verificar_final(self):
+        s = self.servicio
+        ids = [p["id"] for p in s.productos.todos()]
+        if len(ids) != len(set(ids)):
+            self._fallo("ids de producto repetidos")
+        for producto in s.productos.todos():
+            if producto["stock"] < 0:
+                self._fallo(f"sobreventa: producto {producto['id']} con stock {producto['stock']}")
+        for producto_id, existencias in self._existencias().items():
+            esperadas = self._existencias_iniciales.get(producto_id, STOCK_PRODUCTO_NUEVO)
+            if existencias != esperadas:
+                self._fallo(f"stock no conservado: producto {producto_id} con {existencias} unidades "
+                            f"(stock + pedidos no cancelados) != {esperadas}")
+        recalculados = s._agregados_iniciales()
+        for agricultor_id, esperados in recalculados.items():
+            leidos = s.resumenes.leer(agricultor_id)
+            for clave, valor in esperados.items():
+                if abs(leidos.get(clave, 0) - valor) > 1e-6:
+                    self._fallo(f"resumen de {agricultor_id} desviado en {clave}: {leidos.get(clave)} != {valor}")
+                    break
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estrés del modelo de concurrencia de AgriLink")
+    parser.add_argument("--hilos", default="1,2,4,8", help="cantidades de hilos a medir, separadas por comas")
+    parser.add_argument("--duracion", type=float, default=3.0, help="segundos por corrida")
+    parser.add_argument("--escrituras", type=float, default=0.2, help="proporción de operaciones de escritura")
+    parser.add_argument("--io-ms", type=float, default=1.0, help="espera simulada de E/S por operación")
+    parser.add_argument("--backend", choices=("memoria", "sqlite"), default="memoria")
+    parser.add_argument("--sin-grafo", action="store_true", help="no publicar versiones del grafo durante la prueba")
+    parser.add_argument("--graphml", default=GRAPHML)
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    temporal = tempfile.mkdtemp(prefix="agrilink_estres_")
+    try:
+        algoritmos = None
+        if not args.sin_grafo:
+            ruta = os.path.join(temporal, "Grafo_Proyecto_Actualizado.graphml")
+            shutil.copyfile(args.graphml, ruta)
+            algoritmos = _ServicioTemporal(ruta)
+
+        corridas = []
+        base = None
+        for hilos in (int(h) for h in args.hilos.split(",")):
+            servicio = AgricultorService(backend=args.backend,
+                                         ruta_sqlite=os.path.join(temporal, f"estres_{hilos}.db"))
+            corrida = Corrida(servicio, algoritmos, hilos, args.duracion, args.io_ms, args.semilla)
+            segundos = corrida.ejecutar(args.escrituras)
+            corrida.verificar_final()
+            por_segundo = sum(corrida.operaciones) / segundos
+            base = base or por_segundo
+            corridas.append({
+                "hilos": hilos,
+                "operaciones_por_segundo": round(por_segundo, 1),
+                "aceleracion": round(por_segundo / base, 2),
+                "versiones_grafo_publicadas": corrida.versiones_grafo,
+                "errores": corrida.errores,
+            })
+            print(f"🧵 {hilos} hilos: {por_segundo:,.0f} op/s (x{por_segundo / base:.2f}), "
+                  f"{corrida.versiones_grafo} versiones del grafo, {len(corrida.errores)} errores")
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+
+    reporte = {
+        "backend": args.backend,
+        "io_ms": args.io_ms,
+        "proporcion_escrituras": args.escrituras,
+        "corridas": corridas,
+        "sin_errores": all(not c["errores"] for c in corridas),
+    }
+    print(json.dumps(reporte, indent=2, ensure_ascii=False))
+    if not reporte["sin_errores"]:
+        sys.exit(1)
+    return reporte
+
+
+if __name__ == "__main__":
+    main()
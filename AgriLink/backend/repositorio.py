@@ -0,0 +1,252 @@
+import threading
+from contextlib import contextmanager
+
+
+class Tabla:
+    """
+    Tabla en memoria con clave primaria (`id`), secuencia de ids e índices
+    secundarios. Un índice puede ser un campo ("agricultor_id") o una tupla de
+    campos (("agricultor_id", "estado")). Los índices se mantienen en cada
+    inserción/actualización, así que `buscar` cuesta O(tamaño del resultado)
+    cuando los filtros coinciden con un índice.
+
+    Concurrencia: las escrituras modifican filas e índices en sitio bajo un
+    candado corto y cuestan O(filas y cubetas de índice que tocan), no
+    O(tamaño de la tabla). Una fila publicada nunca cambia (actualizar la
+    reemplaza por un dict nuevo), así que `obtener` no toma el candado y las
+    filas devueltas siguen siendo consistentes; no deben modificarse. `todos` y
+    `buscar` copian el resultado a una lista propia del lector sin candado
+    (lectura optimista con número de secuencia, ver `_leer`): solo si una
+    escritura se cruza varias veces seguidas esperan al candado.
+    """
+
+    def __init__(self, nombre: str, indices=()):
+        self.nombre = nombre
+        self._lock = threading.Lock()
+        self._filas = {}              # id -> fila (conserva el orden de inserción)
+        self._indices = {}            # campos (tupla) -> {valores (tupla): {id: None}}
+        for indice in indices:
+            self._indices[(indice,) if isinstance(indice, str) else tuple(indice)] = {}
+        self._siguiente_id = 1
+        self._version = 0
+        # Impar mientras una escritura está en curso (seqlock de los lectores)
+        self._secuencia = 0
+
+    def __len__(self):
+        return len(self._filas)
+
+    @property
+    def version(self) -> int:
+        """Número de escrituras aplicadas (aumenta con cada escritura o lote)."""
+        return self._version
+
+    # --- Escritura ----------------------------------------------------------
+    @contextmanager
+    def _escritura(self):
+        with self._lock:
+            self._secuencia += 1
+            try:
+                yield
+            finally:
+                self._secuencia += 1
+
+    def insertar(self, datos: dict) -> dict:
+        return self.insertar_muchos([datos])[0]
+
+    def insertar_muchos(self, filas) -> list:
+        """Inserta un lote en una sola sección crítica: todo el lote o nada (id duplicado)."""
+        with self._escritura():
+            siguiente_id = self._siguiente_id
+            insertadas, ids = [], set()
+            for datos in filas:
+                fila = dict(datos)
+                if fila.get("id") is None:
+                    fila["id"] = siguiente_id
+                elif fila["id"] in self._filas or fila["id"] in ids:
+                    raise ValueError(f"{self.nombre}: id duplicado {fila['id']}")
+                ids.add(fila["id"])
+                siguiente_id = max(siguiente_id, fila["id"] + 1)
+                insertadas.append(fila)
+            for fila in insertadas:
+                self._filas[fila["id"]] = fila
+                self._indexar(fila, self._indices)
+            self._siguiente_id = siguiente_id
+            self._version += 1
+        return insertadas
+
+    def sembrar(self, filas) -> bool:
+        """Inserta los datos iniciales solo si la tabla está vacía."""
+        if self._filas:
+            return False
+        self.insertar_muchos(filas)
+        return True
+
+    def actualizar(self, id_fila: int, cambios: dict):
+        _, fila = self.actualizar_con_anterior(id_fila, cambios)
+        return fila
+
+    def actualizar_con_anterior(self, id_fila: int, cambios: dict):
+        """(fila anterior, fila nueva) de una actualización atómica; (None, None) si no existe."""
+        cambios = {k: v for k, v in cambios.items() if k != "id"}
+        with self._escritura():
+            anterior = self._filas.get(id_fila)
+            if anterior is None:
+                return None, None
+            fila = {**anterior, **cambios}
+            self._reemplazar(anterior, fila, [campos for campos in self._indices if any(c in cambios for c in campos)])
+            self._version += 1
+        return anterior, fila
+
+    def reservar_lote(self, reservas, campo: str, condiciones: dict = None) -> list:
+        """
+        Descuenta `campo` (p. ej. stock) por reservas, cada una {id: cantidad} y
+        todo o nada: se aplica solo si todas sus filas existen, cumplen las
+        `condiciones` de igualdad y tienen saldo suficiente. El lote entero se
+        resuelve en una sección crítica. Devuelve por reserva ({id: fila
+        actualizada}, None) o (None, {id: disponible}), con disponible None si la
+        fila no existe o no cumple las condiciones.
+        """
+        condiciones = condiciones or {}
+        resultados = []
+        with self._escritura():
+            afectados = [campos for campos in self._indices if campo in campos]
+            for reserva in reservas:
+                faltantes = {}
+                for id_fila, cantidad in reserva.items():
+                    fila = self._filas.get(id_fila)
+                    if fila is None or any(fila.get(c) != v for c, v in condiciones.items()):
+                        faltantes[id_fila] = None
+                    elif (fila.get(campo) or 0) < cantidad:
+                        faltantes[id_fila] = fila.get(campo) or 0
+                if faltantes:
+                    resultados.append((None, faltantes))
+                    continue
+                actualizadas = {}
+                for id_fila, cantidad in reserva.items():
+                    anterior = self._filas[id_fila]
+                    fila = actualizadas[id_fila] = {**anterior, campo: anterior[campo] - cantidad}
+                    self._reemplazar(anterior, fila, afectados)
+                resultados.append((actualizadas, None))
+            if any(actualizadas for actualizadas, _ in resultados):
+                self._version += 1
+        return resultados
+
+    def liberar_lote(self, reservas, campo: str):
+        """Devuelve a `campo` lo descontado por reservas aplicadas (compensación de reservar_lote)."""
+        with self._escritura():
+            afectados = [campos for campos in self._indices if campo in campos]
+            for reserva in reservas:
+                for id_fila, cantidad in reserva.items():
+                    anterior = self._filas.get(id_fila)
+                    if anterior is not None:
+                        self._reemplazar(anterior, {**anterior, campo: (anterior.get(campo) or 0) + cantidad}, afectados)
+            self._version += 1
+
+    def _reemplazar(self, anterior, fila, campos_afectados):
+        """Se llama con `_lock` tomado."""
+        self._desindexar(anterior, campos_afectados)
+        self._filas[fila["id"]] = fila
+        self._indexar(fila, campos_afectados)
+
+    def _indexar(self, fila, campos_afectados):
+        for campos in campos_afectados:
+            self._indices[campos].setdefault(_valores(fila, campos), {})[fila["id"]] = None
+
+    def _desindexar(self, fila, campos_afectados):
+        for campos in campos_afectados:
+            clave = _valores(fila, campos)
+            cubeta = self._indices[campos].get(clave)
+            if cubeta is not None:
+                cubeta.pop(fila["id"], None)
+                if not cubeta:
+                    del self._indices[campos][clave]
+
+    # --- Lectura ------------------------------------------------------------
+    def obtener(self, id_fila: int):
+        return self._filas.get(id_fila)
+
+    def todos(self) -> list:
+        return self._leer(lambda: list(self._filas.values()))
+
+    def buscar(self, **filtros) -> list:
+        """Filas que cumplen todos los filtros de igualdad (se ignoran los filtros None)."""
+        filtros = {campo: valor for campo, valor in filtros.items() if valor is not None}
+        if not filtros:
+            return self.todos()
+
+        indice = self._indice_para(tuple(sorted(filtros)))
+        if indice is not None:
+            clave = tuple(filtros[c] for c in indice)
+            resto = {c: v for c, v in filtros.items() if c not in indice}
+        else:
+            resto = filtros
+
+        def leer():
+            ids = self._indices[indice].get(clave, {}) if indice is not None else self._filas
+            filas = [self._filas[i] for i in list(ids)]
+            return [fila for fila in filas if all(fila.get(c) == v for c, v in resto.items())]
+        return self._leer(leer)
+
+    def _leer(self, leer, intentos: int = 3):
+        """
+        Lectura sin candado: se copia con `leer()` y la copia vale si ninguna
+        escritura empezó ni terminó mientras tanto (`_secuencia` par e igual
+        antes y después). Si no, se repite; tras `intentos` se lee con el candado.
+        """
+        for _ in range(intentos):
+            secuencia = self._secuencia
+            if secuencia % 2:
+                continue
+            try:
+                resultado = leer()
+            except (RuntimeError, KeyError):
+                # Un dict cambió de tamaño durante la copia o una fila se quitó de él
+                continue
+            if self._secuencia == secuencia:
+                return resultado
+        with self._lock:
+            return leer()
+
+    def _indice_para(self, campos):
+        """Índice exacto para los campos, o el de más campos que los cubra parcialmente."""
+        for indice in self._indices:
+            if set(indice) == set(campos):
+                return indice
+        parciales = [indice for indice in self._indices if set(indice) <= set(campos)]
+        return max(parciales, key=len) if parciales else None
+
+
+def _valores(fila: dict, campos: tuple) -> tuple:
+    return tuple(fila.get(campo) for campo in campos)
+
+
+class Contadores:
+    """
+    Agregados en memoria por grupo (p. ej. agricultor_id): cada grupo es un
+    diccionario clave -> valor que se actualiza con incrementos. Un incremento
+    reemplaza, bajo un candado corto, solo el dict de su grupo (O(claves del
+    grupo)); leer toma ese dict, que nunca se modifica, sin candados.
+    """
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self._lock = threading.Lock()
+        self._grupos = {}
+
+    def incrementar(self, grupo, deltas: dict):
+        with self._lock:
+            valores = dict(self._grupos.get(grupo, {}))
+            for clave, delta in deltas.items():
+                valores[clave] = valores.get(clave, 0) + delta
+            self._grupos[grupo] = valores
+
+    def leer(self, grupo) -> dict:
+        return dict(self._grupos.get(grupo, {}))
+
+    def sembrar(self, calcular_iniciales) -> bool:
+        """Carga los agregados iniciales ({grupo: deltas}) solo si aún no hay ninguno."""
+        if self._grupos:
+            return False
+        for grupo, deltas in calcular_iniciales().items():
+            self.incrementar(grupo, deltas)
+        return True
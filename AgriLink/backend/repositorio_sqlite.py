@@ -0,0 +1,280 @@
+import json
+import os
+import sqlite3
+import threading
+
+
+class BaseSQLite:
+    """
+    Archivo SQLite compartido por todos los procesos (workers de gunicorn) con
+    una conexión por hilo. Usa WAL para que las lecturas no bloqueen a la
+    escritura y todas las sentencias son SQL constante, así que quedan
+    preparadas en la caché de sentencias de cada conexión.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        directorio = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(directorio, exist_ok=True)
+        self._local = threading.local()
+        self._conexiones = []
+        self._lock = threading.Lock()
+
+    def conexion(self) -> sqlite3.Connection:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None, cached_statements=256)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            conexion.execute("PRAGMA busy_timeout=30000")
+            conexion.execute("PRAGMA cache_size=-16000")
+            conexion.execute("PRAGMA mmap_size=268435456")
+            self._local.conexion = conexion
+            with self._lock:
+                self._conexiones.append(conexion)
+        return conexion
+
+    def transaccion(self):
+        """
+        Transacción de escritura (BEGIN IMMEDIATE): serializa a los escritores de
+        todos los procesos. Si el hilo ya está dentro de una, se une a ella y el
+        COMMIT/ROLLBACK lo decide la exterior (así varias tablas confirman juntas).
+        """
+        return _Transaccion(self.conexion())
+
+    def cerrar(self):
+        with self._lock:
+            for conexion in self._conexiones:
+                try:
+                    conexion.close()
+                except sqlite3.ProgrammingError:
+                    pass  # Conexión de otro hilo ya terminado
+            self._conexiones.clear()
+        self._local = threading.local()
+
+
+class _Transaccion:
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.anidada = False
+
+    def __enter__(self):
+        self.anidada = self.conexion.in_transaction
+        if not self.anidada:
+            self.conexion.execute("BEGIN IMMEDIATE")
+        return self.conexion
+
+    def __exit__(self, tipo, *_):
+        if not self.anidada:
+            self.conexion.execute("COMMIT" if tipo is None else "ROLLBACK")
+        return False
+
+
+class TablaSQLite:
+    """
+    Misma interfaz que `repositorio.Tabla`, persistida en SQLite. Cada fila se
+    guarda como JSON en `datos` y los campos indexados se copian a columnas con
+    índice para que las búsquedas usen el índice y no recorran la tabla.
+    """
+
+    def __init__(self, base: BaseSQLite, nombre: str, indices=()):
+        self.base = base
+        self.nombre = nombre
+        self._indices = [(indice,) if isinstance(indice, str) else tuple(indice) for indice in indices]
+        self._columnas = sorted({campo for indice in self._indices for campo in indice})
+
+        columnas = "".join(f", {c}" for c in self._columnas)
+        marcadores = "".join(", ?" for _ in self._columnas)
+        self._sql_insertar = f"INSERT INTO {nombre} (id, datos{columnas}) VALUES (?, ?{marcadores})"
+        self._sql_actualizar = (f"UPDATE {nombre} SET datos = ?"
+                                + "".join(f", {c} = ?" for c in self._columnas) + " WHERE id = ?")
+        self._sql_obtener = f"SELECT id, datos FROM {nombre} WHERE id = ?"
+        self._sql_todos = f"SELECT id, datos FROM {nombre} ORDER BY id"
+        self._sql_contar = f"SELECT COUNT(*) FROM {nombre}"
+        self._sql_buscar = {}
+        self._sql_reservar = {}
+
+        with base.transaccion() as conexion:
+            definicion = "".join(f", {c}" for c in self._columnas)
+            conexion.execute(f"CREATE TABLE IF NOT EXISTS {nombre} "
+                             f"(id INTEGER PRIMARY KEY AUTOINCREMENT, datos TEXT NOT NULL{definicion})")
+            existentes = {registro[1] for registro in conexion.execute(f"PRAGMA table_info({nombre})")}
+            for columna in self._columnas:
+                if columna not in existentes:
+                    # Índice agregado a una tabla ya creada: la columna se rellena desde el JSON
+                    conexion.execute(f"ALTER TABLE {nombre} ADD COLUMN {columna}")
+                    conexion.execute(f"UPDATE {nombre} SET {columna} = json_extract(datos, ?)", (f"$.{columna}",))
+            for indice in self._indices:
+                conexion.execute(f"CREATE INDEX IF NOT EXISTS ix_{nombre}_{'_'.join(indice)} "
+                                 f"ON {nombre} ({', '.join(indice)})")
+
+    def __len__(self):
+        return self.base.conexion().execute(self._sql_contar).fetchone()[0]
+
+    # --- Escritura ----------------------------------------------------------
+    def _parametros(self, fila: dict):
+        datos = {k: v for k, v in fila.items() if k != "id"}
+        return [fila.get("id"), json.dumps(datos, ensure_ascii=False)] + [fila.get(c) for c in self._columnas]
+
+    def insertar(self, datos: dict) -> dict:
+        with self.base.transaccion() as conexion:
+            cursor = conexion.execute(self._sql_insertar, self._parametros(datos))
+        return {**datos, "id": cursor.lastrowid if datos.get("id") is None else datos["id"]}
+
+    def insertar_muchos(self, filas) -> list:
+        """Inserción masiva en una sola transacción; devuelve las filas con su id asignado."""
+        insertadas = []
+        with self.base.transaccion() as conexion:
+            for datos in filas:
+                cursor = conexion.execute(self._sql_insertar, self._parametros(datos))
+                insertadas.append({**datos, "id": cursor.lastrowid if datos.get("id") is None else datos["id"]})
+        return insertadas
+
+    def sembrar(self, filas) -> bool:
+        """Inserta los datos iniciales solo si la tabla está vacía (seguro entre procesos)."""
+        filas = list(filas)
+        with self.base.transaccion() as conexion:
+            if conexion.execute(self._sql_contar).fetchone()[0]:
+                return False
+            conexion.executemany(self._sql_insertar, [self._parametros(fila) for fila in filas])
+        return True
+
+    def actualizar(self, id_fila: int, cambios: dict):
+        _, fila = self.actualizar_con_anterior(id_fila, cambios)
+        return fila
+
+    def actualizar_con_anterior(self, id_fila: int, cambios: dict):
+        """(fila anterior, fila nueva) leídas y escritas en la misma transacción."""
+        cambios = {k: v for k, v in cambios.items() if k != "id"}
+        with self.base.transaccion() as conexion:
+            registro = conexion.execute(self._sql_obtener, (id_fila,)).fetchone()
+            if registro is None:
+                return None, None
+            anterior = _fila(registro)
+            fila = {**anterior, **cambios}
+            parametros = self._parametros(fila)
+            conexion.execute(self._sql_actualizar, parametros[1:] + [id_fila])
+        return anterior, fila
+
+    def reservar_lote(self, reservas, campo: str, condiciones: dict = None) -> list:
+        """
+        Igual que `Tabla.reservar_lote`: cada línea es un UPDATE condicional
+        (saldo suficiente y condiciones) y cada reserva va en un SAVEPOINT que se
+        deshace entero si alguna línea no alcanza. Todo el lote es una transacción.
+        """
+        condiciones = condiciones or {}
+        sql, parametros_fijos = self._sentencia_reservar(campo, condiciones)
+        resultados = []
+        with self.base.transaccion() as conexion:
+            for reserva in reservas:
+                conexion.execute("SAVEPOINT reserva")
+                actualizadas = {}
+                for id_fila, cantidad in reserva.items():
+                    registro = conexion.execute(sql, [cantidad] * (2 if campo in self._columnas else 1)
+                                                + [id_fila, cantidad] + parametros_fijos).fetchone()
+                    if registro is None:
+                        break
+                    actualizadas[id_fila] = _fila(registro)
+                if len(actualizadas) == len(reserva):
+                    conexion.execute("RELEASE reserva")
+                    resultados.append((actualizadas, None))
+                    continue
+                conexion.execute("ROLLBACK TO reserva")
+                conexion.execute("RELEASE reserva")
+                faltantes = {}
+                for id_fila, cantidad in reserva.items():
+                    registro = conexion.execute(self._sql_obtener, (id_fila,)).fetchone()
+                    fila = _fila(registro) if registro else None
+                    if fila is None or any(fila.get(c) != v for c, v in condiciones.items()):
+                        faltantes[id_fila] = None
+                    elif (fila.get(campo) or 0) < cantidad:
+                        faltantes[id_fila] = fila.get(campo) or 0
+                resultados.append((None, faltantes))
+        return resultados
+
+    def _sentencia_reservar(self, campo, condiciones):
+        campos = tuple(sorted(condiciones))
+        sql = self._sql_reservar.get((campo, campos))
+        if sql is None:
+            asignaciones = [f"datos = json_set(datos, '$.{campo}', json_extract(datos, '$.{campo}') - ?)"]
+            if campo in self._columnas:
+                asignaciones.append(f"{campo} = {campo} - ?")
+            filtros = [f"json_extract(datos, '$.{campo}') >= ?"]
+            filtros += [f"{c} = ?" if c in self._columnas else f"json_extract(datos, '$.{c}') = ?" for c in campos]
+            sql = self._sql_reservar[(campo, campos)] = (
+                f"UPDATE {self.nombre} SET {', '.join(asignaciones)} WHERE id = ? AND "
+                + " AND ".join(filtros) + " RETURNING id, datos")
+        return sql, [condiciones[c] for c in campos]
+
+    def liberar_lote(self, reservas, campo: str):
+        """Igual que `Tabla.liberar_lote`: un UPDATE que suma por línea, todo en una transacción."""
+        asignaciones = [f"datos = json_set(datos, '$.{campo}', COALESCE(json_extract(datos, '$.{campo}'), 0) + ?)"]
+        if campo in self._columnas:
+            asignaciones.append(f"{campo} = COALESCE({campo}, 0) + ?")
+        sql = f"UPDATE {self.nombre} SET {', '.join(asignaciones)} WHERE id = ?"
+        with self.base.transaccion() as conexion:
+            for reserva in reservas:
+                for id_fila, cantidad in reserva.items():
+                    conexion.execute(sql, [cantidad] * len(asignaciones) + [id_fila])
+
+    # --- Lectura ------------------------------------------------------------
+    def obtener(self, id_fila: int):
+        registro = self.base.conexion().execute(self._sql_obtener, (id_fila,)).fetchone()
+        return _fila(registro) if registro else None
+
+    def todos(self) -> list:
+        return [_fila(r) for r in self.base.conexion().execute(self._sql_todos)]
+
+    def buscar(self, **filtros) -> list:
+        filtros = {campo: valor for campo, valor in filtros.items() if valor is not None}
+        if not filtros:
+            return self.todos()
+        campos = tuple(sorted(filtros))
+        sql = self._sql_buscar.get(campos)
+        if sql is None:
+            condiciones = [f"{c} = ?" if c in self._columnas else "json_extract(datos, ?) = ?" for c in campos]
+            sql = self._sql_buscar[campos] = (f"SELECT id, datos FROM {self.nombre} WHERE "
+                                              + " AND ".join(condiciones) + " ORDER BY id")
+        parametros = []
+        for c in campos:
+            if c not in self._columnas:
+                parametros.append(f"$.{c}")
+            parametros.append(filtros[c])
+        return [_fila(r) for r in self.base.conexion().execute(sql, parametros)]
+
+
+class ContadoresSQLite:
+    """Misma interfaz que `repositorio.Contadores`; cada incremento es un UPSERT atómico."""
+
+    def __init__(self, base: BaseSQLite, nombre: str):
+        self.base = base
+        self.nombre = nombre
+        self._sql_incrementar = (f"INSERT INTO {nombre} (grupo, clave, valor) VALUES (?, ?, ?) "
+                                 "ON CONFLICT (grupo, clave) DO UPDATE SET valor = valor + excluded.valor")
+        self._sql_leer = f"SELECT clave, valor FROM {nombre} WHERE grupo = ?"
+        self._sql_contar = f"SELECT COUNT(*) FROM {nombre}"
+        with base.transaccion() as conexion:
+            conexion.execute(f"CREATE TABLE IF NOT EXISTS {nombre} "
+                             "(grupo, clave TEXT NOT NULL, valor REAL NOT NULL, PRIMARY KEY (grupo, clave)) WITHOUT ROWID")
+
+    def incrementar(self, grupo, deltas: dict):
+        with self.base.transaccion() as conexion:
+            conexion.executemany(self._sql_incrementar, [(grupo, clave, delta) for clave, delta in deltas.items()])
+
+    def leer(self, grupo) -> dict:
+        return {clave: valor for clave, valor in self.base.conexion().execute(self._sql_leer, (grupo,))}
+
+    def sembrar(self, calcular_iniciales) -> bool:
+        with self.base.transaccion() as conexion:
+            if conexion.execute(self._sql_contar).fetchone()[0]:
+                return False
+            conexion.executemany(self._sql_incrementar, [
+                (grupo, clave, delta)
+                for grupo, deltas in calcular_iniciales().items()
+                for clave, delta in deltas.items()
+            ])
+        return True
+
+
+def _fila(registro) -> dict:
+    return {"id": registro[0], **json.loads(registro[1])}
@@ -0,0 +1,113 @@
+import heapq
+
+
+def construir_adyacencia(grafo, nodos, peso_arista):
+    """
+    Adyacencia compacta {u: [(v, peso)]} restringida a `nodos`, con los pesos
+    de la consulta ya resueltos. `peso_arista(u, v, data)` devuelve el peso o
+    None si la arista no existe para esta consulta (ilegítima, cerrada, ...).
+    Se recorre el grafo una sola vez y todas las búsquedas de Yen la comparten.
+    """
+    adyacencia = {}
+    for u in nodos:
+        salidas = []
+        for v, data in grafo[u].items():
+            if v in nodos:
+                peso = peso_arista(u, v, data)
+                if peso is not None:
+                    salidas.append((v, peso))
+        adyacencia[u] = salidas
+    return adyacencia
+
+
+def _distancias_hasta(adyacencia, destino):
+    """Árbol de caminos mínimos hacia `destino` (Dijkstra sobre las aristas invertidas)."""
+    entrantes = {}
+    for u, salidas in adyacencia.items():
+        for v, peso in salidas:
+            entrantes.setdefault(v, []).append((u, peso))
+    distancia = {destino: 0.0}
+    cola = [(0.0, destino)]
+    while cola:
+        d, v = heapq.heappop(cola)
+        if d > distancia[v]:
+            continue
+        for u, peso in entrantes.get(v, ()):
+            nueva = d + peso
+            if nueva < distancia.get(u, float('inf')):
+                distancia[u] = nueva
+                heapq.heappush(cola, (nueva, u))
+    return distancia
+
+
+def _a_estrella(adyacencia, origen, destino, restante, ocultas, nodos_ocultos):
+    """A* guiado por `restante`; ignora las aristas `ocultas` y los `nodos_ocultos`. Devuelve (costo, ruta)."""
+    mejor = {origen: 0.0}
+    previo = {origen: None}
+    cola = [(restante[origen], 0.0, origen)]
+    cerrados = set()
+    while cola:
+        _, g, u = heapq.heappop(cola)
+        if u in cerrados:
+            continue
+        if u == destino:
+            ruta = []
+            while u is not None:
+                ruta.append(u)
+                u = previo[u]
+            return g, ruta[::-1]
+        cerrados.add(u)
+        for v, peso in adyacencia[u]:
+            if v in nodos_ocultos or v not in restante or (u, v) in ocultas:
+                continue
+            nuevo = g + peso
+            if nuevo < mejor.get(v, float('inf')):
+                mejor[v] = nuevo
+                previo[v] = u
+                heapq.heappush(cola, (nuevo + restante[v], nuevo, v))
+    return None
+
+
+def k_rutas_mas_cortas(adyacencia, origen, destino, k: int):
+    """
+    Las k rutas simples más baratas origen -> destino (algoritmo de Yen).
+
+    Las aristas y nodos que Yen excluye en cada desvío solo se ocultan durante
+    la búsqueda, sin copiar el grafo. El árbol de caminos mínimos hacia el
+    destino se calcula una sola vez: su distancia es una cota inferior exacta
+    del costo restante aunque se oculten aristas, así que cada desvío se
+    resuelve con A* guiado por ella y los nodos que no alcanzan el destino no
+    se exploran.
+
+    Devuelve [(costo, ruta)] de menor a mayor costo.
+    """
+    restante = _distancias_hasta(adyacencia, destino)
+    if origen not in restante:
+        return []
+    peso = {(u, v): p for u, salidas in adyacencia.items() for v, p in salidas}
+
+    rutas = [_a_estrella(adyacencia, origen, destino, restante, (), ())]
+    candidatas = []
+    vistas = {tuple(rutas[0][1])}
+
+    while len(rutas) < k:
+        anterior = rutas[-1][1]
+        costo_raiz = 0.0
+        for i in range(len(anterior) - 1):
+            raiz = anterior[:i + 1]
+            if i > 0:
+                costo_raiz += peso[(anterior[i - 1], anterior[i])]
+            ocultas = {(ruta[i], ruta[i + 1]) for _, ruta in rutas if len(ruta) > i + 1 and ruta[:i + 1] == raiz}
+            desvio = _a_estrella(adyacencia, anterior[i], destino, restante, ocultas, set(raiz[:-1]))
+            if desvio is None:
+                continue
+            ruta = raiz[:-1] + desvio[1]
+            if tuple(ruta) not in vistas:
+                vistas.add(tuple(ruta))
+                heapq.heappush(candidatas, (costo_raiz + desvio[0], len(ruta), ruta))
+
+        if not candidatas:
+            break
+        costo, _, ruta = heapq.heappop(candidatas)
+        rutas.append((costo, ruta))
+    return rutas
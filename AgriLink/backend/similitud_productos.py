@@ -0,0 +1,159 @@
+import threading
+import time
+
+import numpy as np
+from scipy import sparse
+
+# Peso de cada familia de rasgos en el puntaje combinado
+PESOS_FAMILIAS = {"capitales": 0.5, "departamentos": 0.3, "asociaciones": 0.2}
+
+
+class IndiceSimilitudProductos:
+    """
+    Vecinos más similares de cada Producto, precalculados una vez por versión
+    del grafo. Cada familia de rasgos es una matriz dispersa de incidencia
+    producto x rasgo (capitales donde se adquiere, departamentos y asociaciones
+    que lo venden); la co-ocurrencia es A @ A.T y de ella salen Jaccard (binaria)
+    y coseno (por conteos). El puntaje es la suma ponderada de los Jaccard y se
+    guardan los top-k vecinos de cada producto, así la consulta es una búsqueda.
+    """
+
+    def __init__(self, grafo, top_k: int = 20):
+        inicio = time.perf_counter()
+        self.top_k = top_k
+        self.productos = sorted(n for n, data in grafo.nodes(data=True) if data.get("tipo") == "Producto")
+        self._indice = {producto: i for i, producto in enumerate(self.productos)}
+
+        familias = {
+            "capitales": self._incidencia(grafo, self._capitales_de),
+            "departamentos": self._incidencia(grafo, self._departamentos_de),
+            "asociaciones": self._incidencia(grafo, self._asociaciones_de),
+        }
+        n = len(self.productos)
+        puntaje = sparse.csr_matrix((n, n))
+        self._jaccard = {}
+        self._coseno = {}
+        for familia, conteos in familias.items():
+            jaccard, coseno = _similitudes(conteos)
+            self._jaccard[familia] = jaccard
+            self._coseno[familia] = coseno
+            puntaje = puntaje + PESOS_FAMILIAS[familia] * jaccard
+        puntaje = puntaje.tocsr()
+        puntaje.setdiag(0)
+        puntaje.eliminate_zeros()
+        self._total = np.diff(puntaje.indptr)
+        self._vecinos = self._top_k(puntaje)
+        print(f"🧩 Similitud de productos: {n} productos, {puntaje.nnz} pares relacionados "
+              f"({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+
+    # --- Rasgos por producto --------------------------------------------------
+    @staticmethod
+    def _capitales_de(grafo, producto):
+        return [v for v in grafo.successors(producto) if grafo.nodes[v].get("tipo") == "Capital"]
+
+    @staticmethod
+    def _asociaciones_de(grafo, producto):
+        return [u for u in grafo.predecessors(producto) if grafo.nodes[u].get("tipo") == "Asociacion"]
+
+    @classmethod
+    def _departamentos_de(cls, grafo, producto):
+        return [grafo.nodes[u].get("departamento") for u in cls._asociaciones_de(grafo, producto)
+                if grafo.nodes[u].get("departamento")]
+
+    def _incidencia(self, grafo, rasgos_de):
+        """Matriz dispersa producto x rasgo con el número de veces que aparece cada rasgo."""
+        columnas = {}
+        filas, cols = [], []
+        for i, producto in enumerate(self.productos):
+            for rasgo in rasgos_de(grafo, producto):
+                filas.append(i)
+                cols.append(columnas.setdefault(rasgo, len(columnas)))
+        datos = np.ones(len(filas), dtype=np.float64)
+        # Las entradas repetidas (i, j) se suman al convertir a CSR
+        return sparse.csr_matrix((datos, (filas, cols)), shape=(len(self.productos), max(len(columnas), 1)))
+
+    def _top_k(self, puntaje):
+        """Por producto, los top-k vecinos ya formateados (con el detalle por familia)."""
+        jaccard = {f: m.tocsr() for f, m in self._jaccard.items()}
+        coseno = {f: m.tocsr() for f, m in self._coseno.items()}
+        vecinos = []
+        for i in range(puntaje.shape[0]):
+            inicio, fin = puntaje.indptr[i], puntaje.indptr[i + 1]
+            columnas, valores = puntaje.indices[inicio:fin], puntaje.data[inicio:fin]
+            if len(valores) > self.top_k:
+                mejores = np.argpartition(-valores, self.top_k)[:self.top_k]
+                columnas, valores = columnas[mejores], valores[mejores]
+            orden = np.argsort(-valores, kind="stable")
+            columnas, valores = columnas[orden], valores[orden]
+            fila_jaccard = {f: m[i].toarray().ravel()[columnas] for f, m in jaccard.items()}
+            fila_coseno = {f: m[i].toarray().ravel()[columnas] for f, m in coseno.items()}
+            vecinos.append([
+                {
+                    "producto": self.productos[j],
+                    "puntaje": round(float(valores[n]), 4),
+                    "jaccard": {f: round(float(v[n]), 4) for f, v in fila_jaccard.items()},
+                    "coseno": {f: round(float(v[n]), 4) for f, v in fila_coseno.items()},
+                }
+                for n, j in enumerate(columnas)
+            ])
+        return vecinos
+
+    # --- Consulta -------------------------------------------------------------
+    def __contains__(self, producto):
+        return producto in self._indice
+
+    def relacionados(self, producto: str, k: int = 10):
+        return self._vecinos[self._indice[producto]][:k]
+
+    def total_relacionados(self, producto: str) -> int:
+        return int(self._total[self._indice[producto]])
+
+
+class SimilitudDiferida:
+    """
+    IndiceSimilitudProductos que se construye en la primera consulta. Lo usan
+    las versiones publicadas por una ingesta de deltas, para que ingerir unas
+    filas no pague la reconstrucción de las matrices de todos los productos.
+    """
+
+    def __init__(self, grafo, top_k: int = 20):
+        self._grafo = grafo
+        self._top_k = top_k
+        self._indice = None
+        self._lock = threading.Lock()
+
+    def _construido(self):
+        if self._indice is None:
+            with self._lock:
+                if self._indice is None:
+                    self._indice = IndiceSimilitudProductos(self._grafo, self._top_k)
+        return self._indice
+
+    def __contains__(self, producto):
+        return producto in self._construido()
+
+    def relacionados(self, producto: str, k: int = 10):
+        return self._construido().relacionados(producto, k)
+
+    def total_relacionados(self, producto: str) -> int:
+        return self._construido().total_relacionados(producto)
+
+
+def _similitudes(conteos):
+    """Jaccard (sobre la incidencia binaria) y coseno (sobre conteos) como matrices dispersas."""
+    binaria = conteos.copy()
+    binaria.data[:] = 1.0
+    interseccion = (binaria @ binaria.T).tocoo()
+    tamanos = np.asarray(binaria.sum(axis=1)).ravel()
+    union = tamanos[interseccion.row] + tamanos[interseccion.col] - interseccion.data
+    jaccard = sparse.csr_matrix((interseccion.data / union, (interseccion.row, interseccion.col)),
+                                shape=interseccion.shape)
+
+    producto_punto = (conteos @ conteos.T).tocoo()
+    normas = np.sqrt(np.asarray(conteos.multiply(conteos).sum(axis=1)).ravel())
+    coseno = sparse.csr_matrix(
+        (producto_punto.data / (normas[producto_punto.row] * normas[producto_punto.col]),
+         (producto_punto.row, producto_punto.col)),
+        shape=producto_punto.shape,
+    )
+    return jaccard, coseno